@@ -0,0 +1,183 @@
+"""
+Compare concurrent throughput and latency of the catalog read path under
+WSGI (sync views, one thread per request) and ASGI (async views on one
+event loop, and the sync views for reference).
+
+By default the requests are driven in-process through Django's WSGI and
+ASGI request handlers against a throwaway test database, so the numbers
+isolate the views and handlers from any particular server:
+
+    python benchmarks/asgi_vs_wsgi.py --requests 400 --concurrency 1 8 32
+
+With `--url`, the public pages (index, genres and languages) are fetched
+over HTTP from a running server instead, e.g. one started with
+`gunicorn demosite.wsgi --threads 8` and then with
+`uvicorn demosite.asgi:application`.
+"""
+import argparse
+import asyncio
+import http.client
+import os
+import statistics
+import sys
+import tempfile
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path
+from urllib.parse import urlsplit
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'demosite.settings')
+
+import django  # noqa: E402
+
+ROUTES = ['index', 'genres', 'languages', 'books', 'authors', 'book-detail-view', 'author-detail-view']
+PUBLIC_ROUTES = ['index', 'genres', 'languages']
+
+
+def summarize(label, latencies, elapsed):
+    latencies = sorted(latencies)
+    p95 = latencies[max(0, int(len(latencies) * 0.95) - 1)]
+    print(
+        f'{label:<28} {len(latencies) / elapsed:9.1f} req/s   '
+        f'p50 {statistics.median(latencies) * 1000:7.1f} ms   p95 {p95 * 1000:7.1f} ms'
+    )
+
+
+def create_library(size):
+    from catalog.models import Author, Book, BookInstance, Genre, Language, User
+
+    language = Language.objects.create(name='English')
+    genre = Genre.objects.create(name='Fiction')
+    authors = Author.objects.bulk_create(
+        Author(first_name='Author', last_name=f'{num:05}') for num in range(size)
+    )
+    for num, author in enumerate(authors, start=1):
+        book = Book.objects.create(title=f'Book {num:05}', isbn=num, language=language, summary='A book.')
+        book.authors.add(author)
+        book.genre.add(genre)
+        BookInstance.objects.create(book=book, status='a')
+    return User.objects.create_user(username='bench', password='bench')
+
+
+def route_paths(prefix, names):
+    from django.urls import reverse
+
+    args = {'book-detail-view': [1], 'author-detail-view': [1]}
+    return [reverse(f'catalog:{prefix}{name}', args=args.get(name)) for name in names]
+
+
+def bench_wsgi(paths, user, total, concurrency):
+    from django.test import Client
+
+    local = threading.local()
+
+    def fetch(path):
+        if not hasattr(local, 'client'):
+            local.client = Client()
+            local.client.force_login(user)
+        start = time.perf_counter()
+        response = local.client.get(path)
+        assert response.status_code == 200, (path, response.status_code)
+        return time.perf_counter() - start
+
+    start = time.perf_counter()
+    with ThreadPoolExecutor(concurrency) as pool:
+        latencies = list(pool.map(fetch, [paths[i % len(paths)] for i in range(total)]))
+    return latencies, time.perf_counter() - start
+
+
+def bench_asgi(paths, user, total, concurrency):
+    from django.conf import settings
+    from django.test import AsyncClient, Client
+
+    login = Client()
+    login.force_login(user)
+    client = AsyncClient()
+    client.cookies[settings.SESSION_COOKIE_NAME] = login.cookies[settings.SESSION_COOKIE_NAME].value
+
+    async def run():
+        semaphore = asyncio.Semaphore(concurrency)
+
+        async def fetch(path):
+            async with semaphore:
+                start = time.perf_counter()
+                response = await client.get(path)
+                assert response.status_code == 200, (path, response.status_code)
+                return time.perf_counter() - start
+
+        start = time.perf_counter()
+        latencies = await asyncio.gather(*(fetch(paths[i % len(paths)]) for i in range(total)))
+        return latencies, time.perf_counter() - start
+
+    return asyncio.run(run())
+
+
+def bench_http(url, paths, total, concurrency):
+    parts = urlsplit(url)
+    local = threading.local()
+
+    def fetch(path):
+        if not hasattr(local, 'conn'):
+            local.conn = http.client.HTTPConnection(parts.hostname, parts.port or 80, timeout=30)
+        start = time.perf_counter()
+        local.conn.request('GET', path)
+        response = local.conn.getresponse()
+        response.read()
+        assert response.status == 200, (path, response.status)
+        return time.perf_counter() - start
+
+    start = time.perf_counter()
+    with ThreadPoolExecutor(concurrency) as pool:
+        latencies = list(pool.map(fetch, [paths[i % len(paths)] for i in range(total)]))
+    return latencies, time.perf_counter() - start
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--requests', type=int, default=300, help='Requests per run (default: 300).')
+    parser.add_argument('--concurrency', type=int, nargs='+', default=[1, 8, 32],
+                        help='Concurrent requests to try (default: 1 8 32).')
+    parser.add_argument('--books', type=int, default=200, help='Books in the test library (default: 200).')
+    parser.add_argument('--url', help='Benchmark a running server at this base URL instead.')
+    options = parser.parse_args()
+
+    django.setup()
+
+    if options.url:
+        for prefix in ('', 'async-'):
+            paths = route_paths(prefix, PUBLIC_ROUTES)
+            for concurrency in options.concurrency:
+                latencies, elapsed = bench_http(options.url, paths, options.requests, concurrency)
+                summarize(f'{prefix or "sync-"}views c={concurrency}', latencies, elapsed)
+        return
+
+    from django.conf import settings
+    from django.db import connection
+    from django.test.utils import setup_test_environment
+
+    # A file database: SQLite's shared in-memory test database locks whole
+    # tables between connections, which the concurrent runs would trip over.
+    with tempfile.TemporaryDirectory() as tmpdir:
+        # Keep this run's request metrics out of the host's metrics store,
+        # and the cached pages of the test library out of the host's cache.
+        settings.METRICS_STORE = None
+        settings.CACHES = {'default': {**settings.CACHES['default'], 'LOCATION': str(Path(tmpdir) / 'cache')}}
+        connection.settings_dict['TEST']['NAME'] = str(Path(tmpdir) / 'bench.sqlite3')
+        setup_test_environment()
+        connection.creation.create_test_db(verbosity=0)
+        user = create_library(options.books)
+        runs = [
+            ('WSGI sync views', bench_wsgi, route_paths('', ROUTES)),
+            ('ASGI async views', bench_asgi, route_paths('async-', ROUTES)),
+            ('ASGI sync views', bench_asgi, route_paths('', ROUTES)),
+        ]
+        for concurrency in options.concurrency:
+            for label, bench, paths in runs:
+                latencies, elapsed = bench(paths, user, options.requests, concurrency)
+                summarize(f'{label} c={concurrency}', latencies, elapsed)
+
+
+if __name__ == '__main__':
+    main()
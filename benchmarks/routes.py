@@ -0,0 +1,331 @@
+"""
+Load-test every named route of the catalog, polls and auth URLs, and
+compare the results with a stored baseline.
+
+Each route is requested `--requests` times by `--concurrency` threads,
+in-process through Django's WSGI request handler, against a throwaway
+database filled by `generate_library` with `--scale` books. For every
+route the run reports throughput, p50/p95/p99 latency and database
+queries per request:
+
+    python benchmarks/routes.py --scale 2000 --requests 100 --concurrency 8
+
+and then compares them with `benchmarks/baseline.json`. The baseline keeps
+the `--scale`, `--requests` and `--concurrency` it was recorded with, and
+a run with other ones is refused rather than compared, as its numbers
+don't measure the same thing. The run fails
+(exit status 1) when a route runs more queries per request than in the
+baseline (by more than `QUERY_SLACK`), or when its median latency (by
+more than `LATENCY_SLACK_MS` too) or its throughput is worse by more than
+`--tolerance`. The tail percentiles are
+reported but not compared, as with every client in one process they
+mostly measure thread scheduling. Query counts don't depend on the
+machine; timings do, so record a baseline on the machine that runs the
+comparison with `--update-baseline`. Recording with other parameters
+replaces the whole baseline, so only a full run can do that.
+
+A route added to the URLconfs without an entry in `route_requests()`
+fails the run too, so that the suite keeps covering every route.
+"""
+import argparse
+import json
+import os
+import statistics
+import sys
+import tempfile
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from dataclasses import dataclass, field
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'demosite.settings')
+
+import django  # noqa: E402
+
+BASELINE = Path(__file__).resolve().with_name('baseline.json')
+NAMESPACES = ('catalog', 'polls')
+# Cold caches filled by concurrent requests can add a fraction of a query to
+# a route's average; one more query per request is a real regression.
+QUERY_SLACK = 0.5
+# A few milliseconds either way are scheduling noise on the fastest routes.
+LATENCY_SLACK_MS = 10
+
+
+@dataclass
+class RouteRequest:
+    """How to request a route: as whom, with what, and the status to expect."""
+    args: list = field(default_factory=list)
+    user: str = None
+    method: str = 'get'
+    data: dict = None
+    json: bool = False
+    status: int = 200
+    # Requests that end the session need a fresh login for the next one.
+    logs_out: bool = False
+
+
+def seed_library(scale):
+    """
+    Fill the database with `generate_library()`, with `scale` books, and
+    return the objects the route requests refer to: the reader with the
+    most loans as the member, and a librarian.
+    """
+    from django.db.models import Count
+    from django.utils import timezone
+
+    from catalog.models import Author, Book, BookInstance, User
+    from demosite.dataset import LIBRARIAN_PREFIX, generate_library
+    from polls.models import Question
+
+    generate_library(scale, copies=4)
+    member = (
+        User.objects.filter(bookinstance__status=BookInstance.STATUS_LOANED)
+        .annotate(loans=Count('bookinstance')).order_by('-loans', 'pk').first()
+    )
+    question = (
+        Question.objects.filter(pub_date__lte=timezone.now(), num_choices__gt=0).order_by('-pub_date').first()
+    )
+    return {
+        'book': Book.objects.order_by('isbn').first(),
+        'author': Author.objects.order_by('pk').first(),
+        'member': member,
+        'librarian': User.objects.filter(username__startswith=LIBRARIAN_PREFIX).order_by('pk').first(),
+        'loan': BookInstance.objects.borrowed_by(member).first(),
+        'available': list(BookInstance.objects.filter(status=BookInstance.STATUS_AVAILABLE).order_by('copy_id')[:20]),
+        'question': question,
+        'choice': question.choice_set.first(),
+    }
+
+
+def route_requests(fixtures):
+    """Return `{route name: RouteRequest}` for every route under test."""
+    book, author, question = fixtures['book'].pk, fixtures['author'].pk, fixtures['question'].pk
+    member = fixtures['member'].username
+    available = [str(copy.copy_id) for copy in fixtures['available']]
+    reads = {
+        'index': RouteRequest(),
+        'books': RouteRequest(user='member'),
+        'book-detail-view': RouteRequest(args=[book], user='member'),
+        'authors': RouteRequest(user='member'),
+        'author-detail-view': RouteRequest(args=[author], user='member'),
+        'genres': RouteRequest(),
+        'languages': RouteRequest(),
+    }
+    requests = {f'catalog:{name}': request for name, request in reads.items()}
+    requests.update({f'catalog:async-{name}': request for name, request in reads.items()})
+    requests.update({
+        'catalog:search': RouteRequest(user='member', data={'q': 'book'}),
+        'catalog:my-borrowed': RouteRequest(user='member'),
+        'catalog:books-on-loan': RouteRequest(user='librarian'),
+        # The copies are loaned by the first requests and then reported
+        # unavailable, or returned and then reported not on loan.
+        'catalog:librarian-checkout': RouteRequest(
+            user='librarian', method='post', json=True, data={'copy_ids': available, 'borrower': member},
+        ),
+        'catalog:librarian-checkin': RouteRequest(
+            user='librarian', method='post', json=True, data={'copy_ids': available},
+        ),
+        'catalog:librarian-overdue': RouteRequest(user='librarian'),
+        'catalog:librarian-manage-member': RouteRequest(args=[member], user='librarian'),
+        'catalog:librarian-renew-book': RouteRequest(args=[fixtures['loan'].copy_id], user='librarian'),
+        'catalog:librarian-add-user': RouteRequest(user='librarian'),
+        'catalog:librarian-export': RouteRequest(args=['copies', 'csv'], user='librarian'),
+        'polls:index': RouteRequest(),
+        'polls:detail': RouteRequest(args=[question]),
+        'polls:results': RouteRequest(args=[question]),
+        'polls:vote': RouteRequest(
+            args=[question], method='post', data={'choice': fixtures['choice'].pk}, status=302,
+        ),
+        'login': RouteRequest(),
+        'logout': RouteRequest(user='member', logs_out=True),
+        'password_change': RouteRequest(user='member'),
+        'password_change_done': RouteRequest(user='member'),
+        'password_reset': RouteRequest(),
+        'password_reset_done': RouteRequest(),
+        # An invalid link, which renders the "link is invalid" page.
+        'password_reset_confirm': RouteRequest(args=['MQ', 'set-password']),
+        'password_reset_complete': RouteRequest(),
+    })
+    return requests
+
+
+def routes_under_test():
+    """Return the names of every route in the catalog, polls and auth URLconfs."""
+    from django.contrib.auth import urls as auth_urls
+
+    from catalog.warmup import _route_names
+    from django.urls import get_resolver
+
+    auth_names = {pattern.name for pattern in auth_urls.urlpatterns}
+    return [
+        name for name in _route_names(get_resolver())
+        if name.split(':')[0] in NAMESPACES or name in auth_names
+    ]
+
+
+def bench_route(path, request, fixtures, total, concurrency):
+    from django.db import connections
+    from django.test import Client
+
+    local = threading.local()
+
+    def count_queries(execute, sql, params, many, context):
+        local.queries += 1
+        return execute(sql, params, many, context)
+
+    def client_for(user):
+        clients = local.__dict__.setdefault('clients', {})
+        if user not in clients:
+            clients[user] = Client()
+            if user is not None:
+                clients[user].force_login(fixtures[user])
+        return clients[user]
+
+    def fetch(_):
+        client = client_for(request.user)
+        local.queries = 0
+        kwargs = {'content_type': 'application/json'} if request.json else {}
+        data = json.dumps(request.data) if request.json else request.data
+        with connections['default'].execute_wrapper(count_queries):
+            start = time.perf_counter()
+            response = getattr(client, request.method)(path, data, **kwargs)
+            if response.streaming:
+                b''.join(response.streaming_content)
+            latency = time.perf_counter() - start
+        assert response.status_code == request.status, (path, response.status_code)
+        if request.logs_out:
+            local.clients.pop(request.user)
+        return latency, local.queries
+
+    with ThreadPoolExecutor(concurrency) as pool:
+        # Unmeasured: logs the clients in and fills the caches.
+        list(pool.map(fetch, range(concurrency * 2)))
+        start = time.perf_counter()
+        results = list(pool.map(fetch, range(total)))
+        elapsed = time.perf_counter() - start
+
+    latencies = sorted(latency for latency, _ in results)
+    percentiles = statistics.quantiles(latencies, n=100, method='inclusive')
+    return {
+        'throughput': round(total / elapsed, 1),
+        'p50_ms': round(percentiles[49] * 1000, 2),
+        'p95_ms': round(percentiles[94] * 1000, 2),
+        'p99_ms': round(percentiles[98] * 1000, 2),
+        'queries': round(statistics.mean(queries for _, queries in results), 2),
+    }
+
+
+def load_baseline(path):
+    """Return `(parameters, routes)` from the baseline file at `path`, or None."""
+    if not path.exists():
+        return None
+    baseline = json.loads(path.read_text())
+    return baseline.get('parameters'), baseline.get('routes', {})
+
+
+def describe(parameters):
+    if not parameters:
+        return 'no recorded parameters'
+    return ' '.join(f'--{name} {value}' for name, value in sorted(parameters.items()))
+
+
+def compare(results, baseline, tolerance):
+    """Return a description of every regression of `results` against `baseline`."""
+    regressions = []
+    for name, result in results.items():
+        expected = baseline.get(name)
+        if expected is None:
+            continue
+        if result['queries'] > expected['queries'] + QUERY_SLACK:
+            regressions.append(f'{name}: {result["queries"]} queries per request, baseline {expected["queries"]}')
+        if result['p50_ms'] > expected['p50_ms'] * (1 + tolerance) + LATENCY_SLACK_MS:
+            regressions.append(f'{name}: p50 {result["p50_ms"]} ms, baseline {expected["p50_ms"]} ms')
+        if result['throughput'] < expected['throughput'] / (1 + tolerance):
+            regressions.append(f'{name}: {result["throughput"]} req/s, baseline {expected["throughput"]} req/s')
+    return regressions
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--scale', type=int, default=2000, help='Books in the test database (default: 2000).')
+    parser.add_argument('--requests', type=int, default=100, help='Requests per route (default: 100).')
+    parser.add_argument('--concurrency', type=int, default=8, help='Concurrent clients (default: 8).')
+    parser.add_argument('--routes', nargs='+', help='Only run these routes.')
+    parser.add_argument('--baseline', type=Path, default=BASELINE, help=f'Baseline file (default: {BASELINE.name}).')
+    parser.add_argument('--tolerance', type=float, default=1.0,
+                        help='Allowed slowdown of median latency and throughput, as a fraction (default: 1.0).')
+    parser.add_argument('--update-baseline', action='store_true', help='Write the results to the baseline file.')
+    options = parser.parse_args()
+
+    parameters = {'scale': options.scale, 'requests': options.requests, 'concurrency': options.concurrency}
+    baseline = load_baseline(options.baseline)
+    if baseline is not None and baseline[0] != parameters and (options.routes or not options.update_baseline):
+        # Checked before the run, which takes a while.
+        sys.exit(
+            f'{options.baseline.name} was recorded with {describe(baseline[0])}, and this run '
+            f'uses {describe(parameters)}: run with those, or record a new baseline from a full run.'
+        )
+
+    django.setup()
+
+    from django.conf import settings
+    from django.db import connection
+    from django.test.utils import setup_test_environment
+    from django.urls import reverse
+
+    with tempfile.TemporaryDirectory() as tmpdir:
+        # Keep this run's request metrics out of the host's metrics store,
+        # and its cached pages out of the host's cache.
+        settings.METRICS_STORE = None
+        settings.CACHES = {'default': {**settings.CACHES['default'], 'LOCATION': str(Path(tmpdir) / 'cache')}}
+        # A file database, as SQLite's shared in-memory test database locks
+        # whole tables between the concurrent clients' connections.
+        connection.settings_dict['TEST']['NAME'] = str(Path(tmpdir) / 'bench.sqlite3')
+        setup_test_environment()
+        connection.creation.create_test_db(verbosity=0)
+        fixtures = seed_library(options.scale)
+        requests = route_requests(fixtures)
+
+        names = routes_under_test()
+        missing = [name for name in names if name not in requests]
+        if missing:
+            sys.exit(f'No benchmark request for: {", ".join(missing)}')
+        if options.routes:
+            names = [name for name in names if name in options.routes]
+
+        results = {}
+        print(f'{"route":<36} {"req/s":>8} {"p50 ms":>8} {"p95 ms":>8} {"p99 ms":>8} {"queries":>8}')
+        for name in names:
+            request = requests[name]
+            path = reverse(name, args=request.args)
+            result = results[name] = bench_route(path, request, fixtures, options.requests, options.concurrency)
+            print(
+                f'{name:<36} {result["throughput"]:8.1f} {result["p50_ms"]:8.2f} {result["p95_ms"]:8.2f} '
+                f'{result["p99_ms"]:8.2f} {result["queries"]:8.2f}'
+            )
+
+    if options.update_baseline:
+        routes = baseline[1] if baseline is not None and baseline[0] == parameters else {}
+        routes.update(results)
+        options.baseline.write_text(
+            json.dumps({'parameters': parameters, 'routes': routes}, indent=2, sort_keys=True) + '\n'
+        )
+        print(f'Wrote {len(results)} routes to {options.baseline}.')
+        return
+
+    if baseline is None:
+        print(f'No baseline at {options.baseline}; record one with --update-baseline.')
+        return
+    regressions = compare(results, baseline[1], options.tolerance)
+    if regressions:
+        print(f'\n{len(regressions)} REGRESSION(S) against {options.baseline.name}:')
+        for regression in regressions:
+            print(f'  {regression}')
+        sys.exit(1)
+    print(f'\nNo regressions against {options.baseline.name}.')
+
+
+if __name__ == '__main__':
+    main()
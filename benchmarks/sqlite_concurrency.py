@@ -0,0 +1,124 @@
+"""
+Measure concurrent read/write throughput of the SQLite database with the
+default connection setup and with the tuned one from the settings (WAL and
+the other `SQLITE_PRAGMAS`, plus persistent connections).
+
+Worker threads each run a mix of request-sized units of work against a
+throwaway database file: reads of a page of books, and writes that, like
+votes, renewals and session saves, update a row in a short transaction.
+Every unit is wrapped like a request, so with `CONN_MAX_AGE = 0` the
+connection is closed and reopened around each one.
+
+    python benchmarks/sqlite_concurrency.py --threads 1 4 16 --write-ratio 0.2
+"""
+import argparse
+import os
+import random
+import sys
+import tempfile
+import time
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'demosite.settings')
+
+import django  # noqa: E402
+
+SETUPS = {
+    # SQLite's own defaults: rollback journal, FULL sync, a 2 MB cache, and
+    # Django's 5 s busy timeout; a new connection for every request.
+    'default': {'pragmas': {}, 'conn_max_age': 0},
+    'tuned': {'pragmas': None, 'conn_max_age': 600},
+}
+
+
+def create_data(size):
+    from catalog.models import Book, Language
+    from polls.models import Choice, Question
+    from django.utils import timezone
+
+    language = Language.objects.create(name='English')
+    Book.objects.bulk_create(
+        Book(title=f'Book {num:05}', isbn=num, language=language, summary='A book.')
+        for num in range(1, size + 1)
+    )
+    question = Question.objects.create(question_text='Benchmark?', pub_date=timezone.now())
+    Choice.objects.bulk_create(Choice(question=question, choice_text=f'Choice {num}') for num in range(10))
+    return list(Choice.objects.values_list('pk', flat=True))
+
+
+def run(threads, units, write_ratio, choice_ids):
+    from catalog.models import Book
+    from django.db import close_old_connections, transaction
+    from django.db.models import F
+    from django.db.utils import OperationalError
+    from polls.models import Choice
+
+    def unit(seed):
+        rng = random.Random(seed)
+        close_old_connections()
+        start = time.perf_counter()
+        try:
+            if rng.random() < write_ratio:
+                with transaction.atomic():
+                    Choice.objects.filter(pk=rng.choice(choice_ids)).update(votes=F('votes') + 1)
+                kind = 'write'
+            else:
+                list(Book.objects.order_by('title')[rng.randrange(100):][:10])
+                kind = 'read'
+        except OperationalError:
+            kind = 'error'
+        finally:
+            close_old_connections()
+        return kind, time.perf_counter() - start
+
+    start = time.perf_counter()
+    with ThreadPoolExecutor(threads) as pool:
+        results = list(pool.map(unit, range(units)))
+    elapsed = time.perf_counter() - start
+    counts = {kind: sum(1 for result in results if result[0] == kind) for kind in ('read', 'write', 'error')}
+    return counts, elapsed
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--units', type=int, default=2000, help='Units of work per run (default: 2000).')
+    parser.add_argument('--threads', type=int, nargs='+', default=[1, 4, 16],
+                        help='Worker threads to try (default: 1 4 16).')
+    parser.add_argument('--write-ratio', type=float, default=0.2,
+                        help='Share of the units that write (default: 0.2).')
+    parser.add_argument('--books', type=int, default=1000, help='Books in the test database (default: 1000).')
+    options = parser.parse_args()
+
+    django.setup()
+
+    from django.conf import settings
+    from django.db import connection
+    from django.test.utils import setup_test_environment
+
+    setup_test_environment()
+    # As deployed, with DEBUG off.
+    tuned_pragmas = {**settings.SQLITE_PRAGMAS, 'journal_mode': 'wal'}
+    with tempfile.TemporaryDirectory() as tmpdir:
+        # Keep the invalidations made as the data is created out of the host's cache.
+        settings.CACHES = {'default': {**settings.CACHES['default'], 'LOCATION': str(Path(tmpdir) / 'cache')}}
+        for label, setup in SETUPS.items():
+            # A fresh file per setup, as WAL mode sticks to the file.
+            settings.SQLITE_PRAGMAS = tuned_pragmas if setup['pragmas'] is None else setup['pragmas']
+            connection.settings_dict['CONN_MAX_AGE'] = setup['conn_max_age']
+            connection.settings_dict['TEST']['NAME'] = str(Path(tmpdir) / f'{label}.sqlite3')
+            connection.creation.create_test_db(verbosity=0)
+            choice_ids = create_data(options.books)
+            connection.close()
+
+            for threads in options.threads:
+                counts, elapsed = run(threads, options.units, options.write_ratio, choice_ids)
+                print(
+                    f'{label:<8} threads={threads:<3} {options.units / elapsed:9.1f} units/s   '
+                    f'reads {counts["read"]:5}   writes {counts["write"]:5}   locked {counts["error"]:4}'
+                )
+
+
+if __name__ == '__main__':
+    main()
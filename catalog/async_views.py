@@ -0,0 +1,136 @@
+"""
+Async versions of the read-only catalog views, for serving under ASGI.
+
+The views fetch everything their templates need with Django's async ORM
+API before rendering, so no query runs on the event loop. Rendering itself
+(which may still look up the user's permissions for the navbar) and the
+session and cache helpers are synchronous, and run through
+`sync_to_async` in the shared sync thread.
+
+They cache and validate like the sync views: the genres and languages
+pages through `cached_page`, the detail pages with the conditional GET of
+`ConditionalDetailMixin`.
+"""
+from asgiref.sync import sync_to_async
+from django.contrib.auth.mixins import AccessMixin
+from django.http import Http404
+from django.shortcuts import render
+from django.utils.cache import get_conditional_response
+from django.views import generic
+
+from . import caching
+from .caching import cached_page, cached_rows
+from .conditional import ConditionalDetailMixin
+from .models import Author, Book, Genre, Language
+from .pagination import KeysetPaginationMixin
+from .stats import get_library_stats
+from .visits import visit_counter
+
+arender = sync_to_async(render)
+
+
+@sync_to_async
+def _is_authenticated(request):
+    # Resolves the lazy `request.user`, which reads the session and user rows.
+    return request.user.is_authenticated
+
+
+async def index(request):
+    stats = await sync_to_async(get_library_stats)()
+    num_visits = await sync_to_async(visit_counter.visit)(request.session)
+    return await arender(request, 'catalog/index.html', {
+        **stats,
+        'num_visits': num_visits,
+    })
+
+
+@cached_page(caching.GENRES)
+async def genres(request):
+    return await arender(request, 'catalog/genres.html', {
+        'list_of_all_genres': await sync_to_async(cached_rows)(caching.GENRES, Genre.objects.all()),
+    })
+
+
+@cached_page(caching.LANGUAGES)
+async def languages(request):
+    return await arender(request, 'catalog/languages.html', {
+        'list_of_all_languages': await sync_to_async(cached_rows)(caching.LANGUAGES, Language.objects.all()),
+    })
+
+
+class AsyncLoginRequiredMixin(AccessMixin):
+    """`LoginRequiredMixin` for views whose handlers are coroutines."""
+
+    async def dispatch(self, request, *args, **kwargs):
+        if not await _is_authenticated(request):
+            return self.handle_no_permission()
+        return await super().dispatch(request, *args, **kwargs)
+
+
+class AsyncListView(AsyncLoginRequiredMixin, KeysetPaginationMixin, generic.ListView):
+    paginate_by = 10
+
+    async def get(self, request, *args, **kwargs):
+        queryset = self.get_queryset()
+        paginator, page, object_list, is_paginated = await self.apaginate_queryset(queryset, self.paginate_by)
+        return await arender(request, self.template_name, {
+            'view': self,
+            'paginator': paginator,
+            'page_obj': page,
+            'is_paginated': is_paginated,
+            'object_list': object_list,
+            self.context_object_name: object_list,
+        })
+
+
+class AsyncDetailView(AsyncLoginRequiredMixin, ConditionalDetailMixin, generic.DetailView):
+
+    async def get(self, request, *args, **kwargs):
+        updated_at = await self.updated_at_query().afirst()
+        if updated_at is None:
+            raise Http404(f'No {self.model._meta.verbose_name} found matching the query')
+        # `request.user`, which the ETag is per, was loaded by `dispatch()`.
+        etag, last_modified = self.get_validators(updated_at)
+        response = get_conditional_response(request, etag=etag, last_modified=last_modified)
+        if response is None:
+            try:
+                obj = await self.get_queryset().aget(pk=self.kwargs['pk'])
+            except self.model.DoesNotExist:
+                raise Http404(f'No {self.model._meta.verbose_name} found matching the query')
+            response = await arender(request, self.template_name, {
+                'view': self,
+                'object': obj,
+                self.context_object_name: obj,
+            })
+        return self.add_validators(response, etag, last_modified)
+
+
+class BookListView(AsyncListView):
+    model = Book
+    template_name = 'catalog/books.html'
+    context_object_name = 'list_of_all_books'
+
+
+class AuthorListView(AsyncListView):
+    model = Author
+    template_name = 'catalog/authors.html'
+    context_object_name = 'list_of_all_authors'
+
+
+class BookDetailView(AsyncDetailView):
+    model = Book
+    template_name = 'catalog/book_details.html'
+    context_object_name = 'book_detail_info'
+
+    def get_queryset(self):
+        # `aget()` runs the query and these prefetches together off the event loop.
+        return Book.objects.select_related('language').prefetch_related('authors', 'bookinstance_set')
+
+
+class AuthorDetailView(AsyncDetailView):
+    model = Author
+    template_name = 'catalog/author_details.html'
+    context_object_name = 'author'
+
+    def get_queryset(self):
+        return Author.objects.prefetch_related('books')
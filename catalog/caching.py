@@ -0,0 +1,118 @@
+"""
+Full-page cache for the catalog pages that list a whole, rarely changing
+table: the genres and the languages.
+
+Each page has a version in the cache framework, which the `Genre` and
+`Language` signal handlers in `catalog.signals` bump on every save and
+delete. Anonymous requests get the whole response from the cache under the
+current version, marked public so that proxies in front of the site can
+keep it too. Signed-in users see their own navbar, so their pages are
+rendered per request (from the cached navbar fragment and the table rows
+cached under the same version) and marked private. The async views in
+`catalog.async_views` share the versions and the rows with the sync ones,
+and each URL has its own copy of the page.
+"""
+from functools import wraps
+
+from asgiref.sync import iscoroutinefunction, sync_to_async
+from django.core.cache import cache
+from django.db import DEFAULT_DB_ALIAS
+from django.utils.cache import patch_cache_control, patch_vary_headers
+
+GENRES = 'genres'
+LANGUAGES = 'languages'
+
+# The server-side copies live until their version is bumped; proxies and
+# browsers, which can't be told about the bump, keep them for a short while.
+PAGE_TIMEOUT = 24 * 60 * 60
+MAX_AGE = 10 * 60
+
+
+def _version_key(name):
+    return f'catalog:page:{name}:version'
+
+
+def _page_key(name, version, path):
+    return f'catalog:page:{name}:{version}:{path}'
+
+
+def _rows_key(name, version):
+    return f'catalog:page:{name}:{version}:rows'
+
+
+def page_version(name):
+    return cache.get(_version_key(name), 0)
+
+
+def invalidate_pages(*names):
+    """Make the cached copies of the given pages stale."""
+    for name in names:
+        key = _version_key(name)
+        try:
+            cache.incr(key)
+        except ValueError:
+            cache.set(key, page_version(name) + 1, None)
+
+
+def cached_rows(name, queryset):
+    """Return the rows of `queryset` as a list, cached under the version of `name`."""
+    key = _rows_key(name, page_version(name))
+    rows = cache.get(key)
+    if rows is None:
+        # From the default database, as the copy is kept until the next
+        # change and a replica may not have the last one yet.
+        rows = list(queryset.using(DEFAULT_DB_ALIAS))
+        cache.set(key, rows, PAGE_TIMEOUT)
+    return rows
+
+
+def _cached_response(request, name):
+    """
+    Return `(key, response)`: the key the response to `request` is cached
+    under, or None if it isn't cached, and the cached response, if any.
+    """
+    if request.method not in ('GET', 'HEAD') or request.user.is_authenticated:
+        return None, None
+    # The version is read before the view runs, so a page rendered from
+    # rows that change meanwhile is stored under the old one.
+    key = _page_key(name, page_version(name), request.path)
+    return key, cache.get(key)
+
+
+def _store_response(response, key):
+    """Set `Cache-Control` on a response the view rendered, and cache it under `key`."""
+    if key is None:
+        patch_cache_control(response, private=True, no_cache=True)
+        return response
+    patch_cache_control(response, public=True, max_age=MAX_AGE)
+    patch_vary_headers(response, ['Cookie'])
+    if response.status_code == 200:
+        cache.set(key, response, PAGE_TIMEOUT)
+    return response
+
+
+def cached_page(name):
+    """
+    Serve the decorated view's anonymous GET responses from the cache
+    under the version of `name`, and set `Cache-Control` on every response.
+    The view can be sync or async.
+    """
+    def decorator(view):
+        if iscoroutinefunction(view):
+            @wraps(view)
+            async def async_wrapped(request, *args, **kwargs):
+                key, response = await sync_to_async(_cached_response)(request, name)
+                if response is None:
+                    response = await view(request, *args, **kwargs)
+                    response = await sync_to_async(_store_response)(response, key)
+                return response
+            return async_wrapped
+
+        @wraps(view)
+        def wrapped(request, *args, **kwargs):
+            key, response = _cached_response(request, name)
+            if response is None:
+                response = _store_response(view(request, *args, **kwargs), key)
+            return response
+        return wrapped
+    return decorator
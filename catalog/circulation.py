@@ -0,0 +1,87 @@
+"""
+Batch checkout and check-in for the circulation desk.
+
+A batch of scanned copies is handled in one transaction with a constant
+number of queries, whatever its size: one set-based UPDATE for the copies
+that can change, and one SELECT to report on every copy in the batch.
+"""
+from django.db import transaction
+from django.db.models import F
+
+from .models import BookInstance
+
+MAX_BATCH_SIZE = 500
+MAX_LOAN_DAYS = 60
+
+CHECKED_OUT = 'checked_out'
+CHECKED_IN = 'checked_in'
+UNAVAILABLE = 'unavailable'
+NOT_ON_LOAN = 'not_on_loan'
+NOT_FOUND = 'not_found'
+
+
+def _copy_states(copy_ids, lock=False):
+    queryset = BookInstance.objects.filter(copy_id__in=copy_ids).order_by()
+    if lock:
+        queryset = queryset.select_for_update()
+    return {
+        copy['copy_id']: copy
+        for copy in queryset.values('copy_id', 'status', 'borrower_id', 'loaned_on', 'due_back')
+    }
+
+
+def check_out_copies(copy_ids, borrower, period=None):
+    """
+    Loan the available copies among `copy_ids` to `borrower`.
+
+    Returns one result dict per requested copy, in request order. The UPDATE
+    runs before the copies are read back, so a copy counts as checked out
+    only if this call's UPDATE is the one that loaned it.
+    """
+    copy_ids = list(dict.fromkeys(copy_ids))
+    with transaction.atomic():
+        loaned_on, due_back, _ = BookInstance.objects.filter(copy_id__in=copy_ids).check_out(borrower, period)
+        copies = _copy_states(copy_ids)
+
+    results = []
+    for copy_id in copy_ids:
+        copy = copies.get(copy_id)
+        if copy is None:
+            results.append({'copy_id': copy_id, 'result': NOT_FOUND})
+        elif copy['borrower_id'] == borrower.pk and copy['loaned_on'] == loaned_on:
+            results.append({'copy_id': copy_id, 'result': CHECKED_OUT, 'due_back': due_back})
+        else:
+            results.append({'copy_id': copy_id, 'result': UNAVAILABLE, 'status': copy['status']})
+    return results
+
+
+def check_in_copies(copy_ids):
+    """
+    Return the copies among `copy_ids` that are on loan.
+
+    Returns one result dict per requested copy, in request order.
+    """
+    copy_ids = list(dict.fromkeys(copy_ids))
+    with transaction.atomic():
+        # Lock the copies with a no-op UPDATE before reading them: on SQLite
+        # a transaction that reads first can't wait for a concurrent writer
+        # when it comes to write, and fails with "database is locked".
+        BookInstance.objects.filter(copy_id__in=copy_ids).update(status=F('status'))
+        copies = _copy_states(copy_ids, lock=True)
+        on_loan = [
+            copy_id for copy_id, copy in copies.items()
+            if copy['status'] == BookInstance.STATUS_LOANED
+        ]
+        if on_loan:
+            BookInstance.objects.filter(copy_id__in=on_loan).check_in()
+
+    results = []
+    for copy_id in copy_ids:
+        copy = copies.get(copy_id)
+        if copy is None:
+            results.append({'copy_id': copy_id, 'result': NOT_FOUND})
+        elif copy['status'] == BookInstance.STATUS_LOANED:
+            results.append({'copy_id': copy_id, 'result': CHECKED_IN, 'borrower_id': copy['borrower_id']})
+        else:
+            results.append({'copy_id': copy_id, 'result': NOT_ON_LOAN, 'status': copy['status']})
+    return results
@@ -0,0 +1,57 @@
+"""
+Conditional GET for the catalog detail pages.
+
+`Book`, `Author` and `BookInstance` carry an `updated_at` stamp that is
+bumped whenever anything shown on the page changes (see `catalog.signals`).
+The detail views read that one column first, and answer a request whose
+`If-None-Match` or `If-Modified-Since` header still matches with a bodiless
+304 instead of loading the related rows and rendering the template.
+"""
+import hashlib
+from calendar import timegm
+
+from django.utils.cache import get_conditional_response, patch_cache_control, patch_vary_headers
+from django.utils.http import http_date, quote_etag
+
+
+class ConditionalDetailMixin:
+    """
+    Add `ETag` and `Last-Modified` to a `DetailView` of a model with an
+    `updated_at` field, and serve 304s for requests that match them.
+
+    The pages carry the user's navbar, so the ETag is per user and the
+    response is marked private and to be revalidated on every use.
+    """
+
+    def updated_at_query(self):
+        pk = self.kwargs.get(self.pk_url_kwarg)
+        return self.model._default_manager.filter(pk=pk).values_list('updated_at', flat=True)
+
+    def get_updated_at(self):
+        return self.updated_at_query().first()
+
+    def get_etag(self, updated_at):
+        key = f'{self.model._meta.label}:{self.kwargs.get(self.pk_url_kwarg)}:{updated_at.isoformat()}:{self.request.user.pk}'
+        return quote_etag(hashlib.md5(key.encode()).hexdigest())
+
+    def get_validators(self, updated_at):
+        """Return the `(etag, last_modified)` of the page as of `updated_at`."""
+        return self.get_etag(updated_at), timegm(updated_at.utctimetuple())
+
+    def add_validators(self, response, etag, last_modified):
+        response.headers.setdefault('ETag', etag)
+        response.headers.setdefault('Last-Modified', http_date(last_modified))
+        patch_vary_headers(response, ['Cookie'])
+        patch_cache_control(response, private=True, no_cache=True)
+        return response
+
+    def get(self, request, *args, **kwargs):
+        updated_at = self.get_updated_at()
+        if updated_at is None:
+            # Let `DetailView` raise its 404.
+            return super().get(request, *args, **kwargs)
+        etag, last_modified = self.get_validators(updated_at)
+        response = get_conditional_response(request, etag=etag, last_modified=last_modified)
+        if response is None:
+            response = super().get(request, *args, **kwargs)
+        return self.add_validators(response, etag, last_modified)
@@ -0,0 +1,86 @@
+"""
+Streaming CSV and JSONL exports of the catalog.
+
+Rows are read with `.values()` and `.iterator()`, so no model instances are
+built and only one chunk of rows is held in memory at a time, however big
+the table is. The header goes out as soon as the export starts.
+"""
+import csv
+
+from django.core.serializers.json import DjangoJSONEncoder
+
+from .models import Book, BookInstance
+
+CHUNK_SIZE = 2000
+BUFFER_SIZE = 64 * 1024
+
+DATASETS = {
+    'books': (
+        lambda: Book.objects.order_by(),
+        ['isbn', 'title', 'authors_display', 'genres_display', 'language__name', 'pub_date', 'summary'],
+    ),
+    'copies': (
+        lambda: BookInstance.objects.order_by(),
+        ['copy_id', 'book_id', 'book__title', 'imprint', 'status', 'borrower__username', 'loaned_on', 'due_back'],
+    ),
+    'loans': (
+        lambda: BookInstance.objects.on_loan(),
+        ['copy_id', 'book_id', 'book__title', 'borrower__username', 'loaned_on', 'due_back'],
+    ),
+}
+
+FORMATS = {
+    'csv': 'text/csv',
+    'jsonl': 'application/x-ndjson',
+}
+
+
+def export_rows(dataset):
+    """Return the column names and a row iterator for an export dataset."""
+    queryset, fields = DATASETS[dataset]
+    return fields, queryset().values_list(*fields).iterator(chunk_size=CHUNK_SIZE)
+
+
+class Echo:
+    """A file-like object whose `write` hands back what it is given."""
+
+    def write(self, value):
+        return value
+
+
+def _csv_value(value):
+    if value is None:
+        return ''
+    if hasattr(value, 'isoformat'):
+        return value.isoformat()
+    return value
+
+
+def _buffered(lines):
+    """Join lines into chunks of about `BUFFER_SIZE` characters."""
+    buffer = []
+    size = 0
+    for line in lines:
+        buffer.append(line)
+        size += len(line)
+        if size >= BUFFER_SIZE:
+            yield ''.join(buffer)
+            buffer = []
+            size = 0
+    if buffer:
+        yield ''.join(buffer)
+
+
+def stream_export(dataset, fmt):
+    """Yield an export dataset as CSV or JSONL text, in chunks."""
+    fields, rows = export_rows(dataset)
+    if fmt == 'csv':
+        writer = csv.writer(Echo())
+        yield writer.writerow(fields)
+        lines = (writer.writerow([_csv_value(value) for value in row]) for row in rows)
+    else:
+        encoder = DjangoJSONEncoder(ensure_ascii=False)
+        lines = (encoder.encode(dict(zip(fields, row))) + '\n' for row in rows)
+        # JSONL has no header, so send the first row on its own.
+        yield next(lines, '')
+    yield from _buffered(lines)
@@ -0,0 +1,39 @@
+"""
+Cached template fragments for the catalog pages.
+
+The navbar is cached per user, so its permission checks and URL
+reversals run once per user rather than on every page. Rows of the book
+and author lists are cached per object. The signal handlers in
+`catalog.signals` delete a fragment whenever the rows it was rendered from
+change, once the change is committed: deleted any earlier, a request could
+render the old rows again and cache them for good.
+"""
+from functools import partial
+
+from django.core.cache import InvalidCacheBackendError, caches
+from django.db import transaction
+from django.core.cache.utils import make_template_fragment_key
+
+NAVBAR = 'catalog_navbar'
+BOOK_ROW = 'catalog_book_row'
+AUTHOR_ROW = 'catalog_author_row'
+
+
+def fragment_cache():
+    """Return the cache the `{% cache %}` tag stores fragments in."""
+    try:
+        return caches['template_fragments']
+    except InvalidCacheBackendError:
+        return caches['default']
+
+
+def invalidate(fragment_name, *keys):
+    """Delete the cached `fragment_name` fragments varied on each of `keys`."""
+    if keys:
+        fragment_cache().delete_many([make_template_fragment_key(fragment_name, [key]) for key in keys])
+
+
+def invalidate_on_commit(fragment_name, *keys):
+    """`invalidate()` once the current transaction commits, or now outside of one."""
+    if keys:
+        transaction.on_commit(partial(invalidate, fragment_name, *keys))
@@ -0,0 +1,95 @@
+import uuid
+from datetime import datetime, timezone
+
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection
+
+from catalog.models import Author, Book, BookInstance, Genre, Language
+from catalog.pagination import keyset_ordering, keyset_queryset
+
+# Sample values standing in for request data and page cursors; the plan
+# does not depend on them, only on which columns are compared.
+SAMPLE_USER_ID = 1
+SAMPLE_DUE_BACK = datetime(2023, 1, 1, tzinfo=timezone.utc)
+SAMPLE_COPY_ID = uuid.UUID(int=0)
+
+
+def _keyset_pages(label, queryset, sample_values):
+    """The first page and a later (seek) page of a keyset-paginated view."""
+    keys = keyset_ordering(queryset)
+    return [
+        (f'{label} (first page)', keyset_queryset(queryset, keys)[:11]),
+        (f'{label} (later page)', keyset_queryset(queryset, keys, sample_values)[:11]),
+    ]
+
+
+def catalog_querysets():
+    """
+    Return `(label, queryset, allow_scan)` for every queryset the catalog
+    views run. `allow_scan` marks querysets that read a whole (small)
+    table on purpose, such as the genre and language listings.
+    """
+    on_loan = BookInstance.objects.on_loan().with_overdue().select_related('book', 'borrower')
+    borrowed = BookInstance.objects.borrowed_by(SAMPLE_USER_ID).with_overdue().select_related('book')
+    plans = []
+    plans += _keyset_pages('catalog:books', Book.objects.all(), ['M', 1])
+    plans += _keyset_pages('catalog:authors', Author.objects.all(), ['Doe', 'John', None, 1])
+    plans += _keyset_pages('catalog:my-borrowed', borrowed, [SAMPLE_DUE_BACK, SAMPLE_COPY_ID])
+    plans += _keyset_pages('catalog:books-on-loan', on_loan, [SAMPLE_DUE_BACK, SAMPLE_COPY_ID])
+    plans += [
+        ('catalog:book-detail-view', Book.objects.filter(pk=1), False),
+        ('catalog:book-detail-view (authors)', Author.objects.filter(books=1), False),
+        ('catalog:book-detail-view (copies)', BookInstance.objects.filter(book=1), False),
+        ('catalog:author-detail-view', Author.objects.filter(pk=1), False),
+        ('catalog:author-detail-view (books)', Book.objects.filter(authors=1), False),
+        ('catalog:librarian-manage-member',
+            BookInstance.objects.filter(borrower=SAMPLE_USER_ID).with_overdue().select_related('book')
+            .order_by('status', 'due_back'), False),
+        ('catalog:librarian-overdue', BookInstance.objects.overdue_by_member(), False),
+        ('catalog:librarian-renew-book', BookInstance.objects.filter(pk=SAMPLE_COPY_ID), False),
+        ('catalog:genres', Genre.objects.all(), True),
+        ('catalog:languages', Language.objects.all(), True),
+    ]
+    return [plan if len(plan) == 3 else (*plan, False) for plan in plans]
+
+
+def explain(queryset):
+    """Return the detail lines of SQLite's `EXPLAIN QUERY PLAN` for `queryset`."""
+    sql, params = queryset.query.sql_with_params()
+    with connection.cursor() as cursor:
+        cursor.execute(f'EXPLAIN QUERY PLAN {sql}', params)
+        return [row[-1] for row in cursor.fetchall()]
+
+
+def plan_problems(plan):
+    """
+    Return the steps of a query plan that read a whole table without an
+    index. Sorting the few rows an index lookup returned is not flagged.
+    """
+    return [step for step in plan if step.startswith('SCAN ') and ' USING ' not in step]
+
+
+class Command(BaseCommand):
+    help = (
+        'Run EXPLAIN QUERY PLAN for every queryset the catalog views run and '
+        'fail if any of them falls back to a full table scan.'
+    )
+
+    def handle(self, *args, **options):
+        if connection.vendor != 'sqlite':
+            raise CommandError('check_query_plans only understands SQLite query plans.')
+
+        failures = []
+        for label, queryset, allow_scan in catalog_querysets():
+            plan = explain(queryset)
+            problems = [] if allow_scan else plan_problems(plan)
+            if options['verbosity'] > 1 or problems:
+                self.stdout.write(f'{label}:')
+                for step in plan:
+                    self.stdout.write(f'    {step}')
+            if problems:
+                failures.append(f'{label}: {"; ".join(problems)}')
+
+        if failures:
+            raise CommandError('Full scans found:\n' + '\n'.join(failures))
+        self.stdout.write(self.style.SUCCESS('All catalog query plans use indexes.'))
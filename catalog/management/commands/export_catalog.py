@@ -0,0 +1,25 @@
+from django.core.management.base import BaseCommand
+
+from catalog.export import DATASETS, FORMATS, stream_export
+
+
+class Command(BaseCommand):
+    help = 'Stream books, copies or current loans to a CSV or JSONL file.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('dataset', choices=sorted(DATASETS))
+        parser.add_argument('--format', choices=sorted(FORMATS), default='csv')
+        parser.add_argument(
+            '--output', '-o',
+            help='File to write to (default: standard output).',
+        )
+
+    def handle(self, *args, **options):
+        chunks = stream_export(options['dataset'], options['format'])
+        if options['output']:
+            with open(options['output'], 'w', newline='', encoding='utf-8') as output:
+                output.writelines(chunks)
+        else:
+            self.stdout.ending = ''
+            for chunk in chunks:
+                self.stdout.write(chunk)
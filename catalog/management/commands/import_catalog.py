@@ -0,0 +1,254 @@
+import csv
+import json
+import re
+from itertools import islice
+from pathlib import Path
+
+from django.core.exceptions import ValidationError
+from django.core.management.base import BaseCommand, CommandError
+from django.db import transaction
+
+from catalog import search
+from catalog.caching import GENRES, LANGUAGES, invalidate_pages
+from catalog.models import Author, Book, BookInstance, Genre, Language, touch
+from catalog.stats import invalidate_library_stats
+
+CJK_PATTERN = re.compile(r'[\u4e00-\u9fff]+')
+LIST_SEPARATOR = ';'
+
+
+def read_records(path, fmt):
+    """
+    Yield one dict per record of a CSV or JSONL file, streaming it. A JSONL
+    line that isn't valid JSON is yielded as its `JSONDecodeError`, for the
+    import to report and skip.
+    """
+    with open(path, newline='', encoding='utf-8') as source:
+        if fmt == 'csv':
+            yield from csv.DictReader(source)
+        else:
+            for line in source:
+                if line.strip():
+                    try:
+                        yield json.loads(line)
+                    except json.JSONDecodeError as error:
+                        yield error
+
+
+def split_list(value):
+    """Accept a JSON list or a `;`-separated CSV string, dropping repeats."""
+    if not value:
+        return []
+    if isinstance(value, str):
+        value = value.split(LIST_SEPARATOR)
+    return list(dict.fromkeys(item.strip() for item in value if item and item.strip()))
+
+
+def parse_isbn(value):
+    return int(str(value).replace('-', '').replace(' ', ''))
+
+
+def author_fields(name):
+    """
+    Split a display name into `Author` name fields. Chinese names are
+    written family name first ("鲁 迅" or "鲁迅"), others given name first
+    with any middle names in between ("Robert L Moore").
+    """
+    parts = name.split()
+    if CJK_PATTERN.search(name):
+        if len(parts) == 1:
+            parts = [name[:1], name[1:]]
+        last_name, first_name, middle_names = parts[0], ' '.join(parts[1:]), ''
+    elif len(parts) == 1:
+        first_name, middle_names, last_name = parts[0], '', ''
+    else:
+        first_name, middle_names, last_name = parts[0], ' '.join(parts[1:-1]), parts[-1]
+    return (
+        first_name[:Author._meta.get_field('first_name').max_length],
+        middle_names[:Author._meta.get_field('middle_names').max_length],
+        last_name[:Author._meta.get_field('last_name').max_length],
+    )
+
+
+class Command(BaseCommand):
+    help = (
+        'Stream books from a CSV or JSONL file into the catalog. Each record '
+        'has title, isbn, authors, genres, language and copies, and optionally '
+        'summary and pub_date; in CSV, authors and genres are separated by ";". '
+        'Existing ISBNs are skipped, so an interrupted import can be re-run.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('path', help='CSV or JSONL file to import.')
+        parser.add_argument(
+            '--format', choices=['csv', 'jsonl'],
+            help='File format (default: taken from the file extension).',
+        )
+        parser.add_argument(
+            '--chunk-size', type=int, default=1000,
+            help='Number of records written per transaction (default: 1000).',
+        )
+        parser.add_argument(
+            '--checkpoint',
+            help='File recording progress after each chunk; an import resumes from it.',
+        )
+        parser.add_argument(
+            '--copy-status', default=BookInstance.STATUS_AVAILABLE,
+            choices=[status for status, label in BookInstance.LOAN_STATUS],
+            help='Status given to imported copies (default: available).',
+        )
+
+    def handle(self, *args, **options):
+        path = Path(options['path'])
+        if not path.exists():
+            raise CommandError(f'{path} does not exist.')
+        fmt = options['format'] or path.suffix.lstrip('.').lower()
+        if fmt not in ('csv', 'jsonl'):
+            raise CommandError('Cannot tell the file format; pass --format csv or --format jsonl.')
+
+        self.copy_status = options['copy_status']
+        self.created = self.skipped = self.copies = 0
+        self.errors = []
+        self.load_lookup_maps()
+
+        checkpoint = Path(options['checkpoint']) if options['checkpoint'] else None
+        done = self.read_checkpoint(checkpoint, path)
+        records = enumerate(read_records(path, fmt), start=1)
+        if done:
+            self.stdout.write(f'Resuming after record {done}.')
+            records = islice(records, done, None)
+
+        while True:
+            chunk = list(islice(records, options['chunk_size']))
+            if not chunk:
+                break
+            with transaction.atomic():
+                self.import_chunk(chunk)
+            done = chunk[-1][0]
+            self.write_checkpoint(checkpoint, path, done)
+            invalidate_library_stats()
+            if options['verbosity'] > 1:
+                self.stdout.write(f'{done} records read, {self.created} books created.')
+
+        for error in self.errors[:20]:
+            self.stderr.write(error)
+        self.stdout.write(self.style.SUCCESS(
+            f'Imported {self.created} books and {self.copies} copies; '
+            f'skipped {self.skipped} existing books and {len(self.errors)} bad records.'
+        ))
+
+    def load_lookup_maps(self):
+        """Load every author, genre and language once, keyed by name."""
+        self.authors = {}
+        for author in Author.objects.only('first_name', 'middle_names', 'last_name', 'birth_date'):
+            self.authors[(author.first_name, author.middle_names or '', author.last_name)] = author
+        self.genres = dict(Genre.objects.values_list('name', 'pk'))
+        self.languages = dict(Language.objects.values_list('name', 'pk'))
+
+    def read_checkpoint(self, checkpoint, path):
+        if checkpoint is None or not checkpoint.exists():
+            return 0
+        state = json.loads(checkpoint.read_text())
+        if state.get('source') != str(path.resolve()):
+            raise CommandError(f'{checkpoint} belongs to an import of {state.get("source")}.')
+        return state['records']
+
+    def write_checkpoint(self, checkpoint, path, records):
+        if checkpoint is not None:
+            checkpoint.write_text(json.dumps({'source': str(path.resolve()), 'records': records}))
+
+    def import_chunk(self, chunk):
+        pub_date_field = Book._meta.get_field('pub_date')
+        parsed = []
+        for line, record in chunk:
+            try:
+                if isinstance(record, json.JSONDecodeError):
+                    raise record
+                if not record['title']:
+                    raise ValueError('missing title')
+                record['pub_date'] = pub_date_field.to_python(record.get('pub_date') or None)
+                parsed.append((
+                    parse_isbn(record['isbn']),
+                    record,
+                    split_list(record.get('authors')),
+                    split_list(record.get('genres')),
+                    int(record.get('copies') or 0),
+                ))
+            except (KeyError, TypeError, ValueError, ValidationError) as error:
+                self.errors.append(f'Record {line}: {error!r}')
+
+        existing = set(Book.objects.filter(
+            pk__in=[isbn for isbn, *rest in parsed]
+        ).values_list('pk', flat=True))
+        new = []
+        for entry in parsed:
+            if entry[0] in existing:
+                self.skipped += 1
+            else:
+                existing.add(entry[0])
+                new.append(entry)
+        if not new:
+            return
+
+        self.create_missing_names(new)
+
+        books, author_rows, genre_rows, copies = [], [], [], []
+        for isbn, record, author_names, genre_names, num_copies in new:
+            authors = sorted(
+                {self.authors[author_fields(name)] for name in author_names},
+                key=lambda author: (author.last_name, author.first_name, author.birth_date is not None, author.birth_date),
+            )
+            language = (record.get('language') or '').strip()
+            books.append(Book(
+                isbn=isbn,
+                title=record['title'],
+                summary=record.get('summary') or '',
+                pub_date=record['pub_date'],
+                language_id=self.languages.get(language),
+                authors_display=', '.join(author.full_name for author in authors),
+                authors_links=[[author.pk, author.full_name] for author in authors],
+                genres_display=', '.join(genre_names),
+            ))
+            author_rows += [Book.authors.through(book_id=isbn, author_id=author.pk) for author in authors]
+            genre_rows += [Book.genre.through(book_id=isbn, genre_id=self.genres[name]) for name in genre_names]
+            copies += [BookInstance(book_id=isbn, status=self.copy_status) for _ in range(num_copies)]
+
+        Book.objects.bulk_create(books)
+        Book.authors.through.objects.bulk_create(author_rows, ignore_conflicts=True)
+        touch(Author.objects.filter(pk__in={row.author_id for row in author_rows}))
+        Book.genre.through.objects.bulk_create(genre_rows, ignore_conflicts=True)
+        BookInstance.objects.bulk_create(copies)
+        search.index_new_books(books)
+        self.created += len(books)
+        self.copies += len(copies)
+
+    def create_missing_names(self, entries):
+        """Bulk-create the authors, genres and languages not seen before."""
+        new_authors, new_genres, new_languages = {}, set(), set()
+        for isbn, record, author_names, genre_names, num_copies in entries:
+            for name in author_names:
+                key = author_fields(name)
+                if key not in self.authors and key not in new_authors:
+                    first_name, middle_names, last_name = key
+                    author = Author(first_name=first_name, middle_names=middle_names or None, last_name=last_name)
+                    author.name = author.full_name[:Author._meta.get_field('name').max_length]
+                    new_authors[key] = author
+            new_genres.update(name for name in genre_names if name not in self.genres)
+            language = (record.get('language') or '').strip()
+            if language and language not in self.languages:
+                new_languages.add(language)
+
+        authors = Author.objects.bulk_create(new_authors.values())
+        genres = Genre.objects.bulk_create([Genre(name=name) for name in new_genres])
+        languages = Language.objects.bulk_create([Language(name=name) for name in new_languages])
+        if genres:
+            transaction.on_commit(lambda: invalidate_pages(GENRES))
+        if languages:
+            transaction.on_commit(lambda: invalidate_pages(LANGUAGES))
+        if any(obj.pk is None for obj in [*authors, *genres, *languages]):
+            # The database cannot return ids from bulk inserts.
+            self.load_lookup_maps()
+            return
+        self.authors.update(new_authors)
+        self.genres.update((genre.name, genre.pk) for genre in genres)
+        self.languages.update((language.name, language.pk) for language in languages)
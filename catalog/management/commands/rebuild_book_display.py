@@ -0,0 +1,22 @@
+from django.core.management.base import BaseCommand
+
+from catalog.models import Book
+
+
+class Command(BaseCommand):
+    help = (
+        'Rebuild the cached author and genre display columns on every book. '
+        'Run this after loading data with signals disabled, e.g. raw fixtures.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--batch-size', type=int, default=500,
+            help='Number of books to read and update per batch (default: 500).',
+        )
+
+    def handle(self, *args, **options):
+        updated = Book.objects.all().refresh_display_columns(
+            batch_size=options['batch_size'],
+        )
+        self.stdout.write(self.style.SUCCESS(f'Rebuilt display columns for {updated} books.'))
@@ -0,0 +1,20 @@
+import time
+
+from django.core.management.base import BaseCommand
+
+from catalog.warmup import warm_up
+
+
+class Command(BaseCommand):
+    help = (
+        'Compile every project template and URL pattern, as worker processes do as they '
+        'load the application when WARM_UP_ON_STARTUP is set. Fails on a template that does not compile.'
+    )
+
+    def handle(self, *args, **options):
+        start = time.perf_counter()
+        templates, patterns = warm_up()
+        elapsed = (time.perf_counter() - start) * 1000
+        self.stdout.write(self.style.SUCCESS(
+            f'Compiled {templates} templates and {patterns} URL patterns in {elapsed:.0f} ms.'
+        ))
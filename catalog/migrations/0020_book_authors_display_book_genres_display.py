@@ -0,0 +1,44 @@
+# Generated by Django 4.1.13 on 2026-10-18 11:58
+
+import re
+
+from django.db import migrations, models
+
+
+def full_name(author):
+    """Frozen copy of `Author.full_name`, which historical models lack."""
+    if re.search(r'[\u4e00-\u9fff]+', author.last_name):
+        return ' '.join([author.last_name, author.first_name])
+    if author.middle_names:
+        return ' '.join([author.first_name, author.middle_names, author.last_name])
+    return ' '.join([author.first_name, author.last_name])
+
+
+def populate_display_columns(apps, schema_editor):
+    Book = apps.get_model('catalog', 'Book')
+    books = Book.objects.prefetch_related('authors', 'genre')
+    for book in books.iterator(chunk_size=500):
+        book.authors_display = ', '.join(full_name(author) for author in book.authors.all())
+        book.genres_display = ', '.join(genre.name for genre in book.genre.all())
+        book.save(update_fields=['authors_display', 'genres_display'])
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('catalog', '0019_alter_bookinstance_options'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='book',
+            name='authors_display',
+            field=models.TextField(blank=True, editable=False, verbose_name='author(s)'),
+        ),
+        migrations.AddField(
+            model_name='book',
+            name='genres_display',
+            field=models.TextField(blank=True, editable=False, verbose_name='genre(s)'),
+        ),
+        migrations.RunPython(populate_display_columns, migrations.RunPython.noop),
+    ]
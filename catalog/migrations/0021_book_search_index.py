@@ -0,0 +1,20 @@
+from django.db import migrations
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('catalog', '0020_book_authors_display_book_genres_display'),
+    ]
+
+    operations = [
+        migrations.RunSQL(
+            sql=[
+                "CREATE VIRTUAL TABLE catalog_book_fts USING fts5("
+                "title, summary, authors, tokenize = 'unicode61 remove_diacritics 2')",
+                "INSERT INTO catalog_book_fts (rowid, title, summary, authors) "
+                "SELECT isbn, title, summary, authors_display FROM catalog_book",
+            ],
+            reverse_sql=["DROP TABLE catalog_book_fts"],
+        ),
+    ]
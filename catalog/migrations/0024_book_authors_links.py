@@ -0,0 +1,41 @@
+import re
+
+from django.db import migrations, models
+
+
+def full_name(author):
+    """Frozen copy of `Author.full_name`, which historical models lack."""
+    if re.search(r'[\u4e00-\u9fff]+', author.last_name):
+        return ' '.join([author.last_name, author.first_name])
+    if author.middle_names:
+        return ' '.join([author.first_name, author.middle_names, author.last_name])
+    return ' '.join([author.first_name, author.last_name])
+
+
+def populate_authors_links(apps, schema_editor):
+    Book = apps.get_model('catalog', 'Book')
+    books = Book.objects.prefetch_related('authors')
+    batch = []
+    for book in books.iterator(chunk_size=500):
+        book.authors_links = [[author.pk, full_name(author)] for author in book.authors.all()]
+        batch.append(book)
+        if len(batch) >= 500:
+            Book.objects.bulk_update(batch, ['authors_links'])
+            batch = []
+    Book.objects.bulk_update(batch, ['authors_links'])
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('catalog', '0023_updated_at'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='book',
+            name='authors_links',
+            field=models.JSONField(blank=True, default=list, editable=False),
+        ),
+        migrations.RunPython(populate_authors_links, migrations.RunPython.noop),
+    ]
@@ -5,10 +5,19 @@ from datetime import date, timedelta
 from django.utils import timezone
 
 from django.db import models
+from django.db.models.functions import TruncDate
 from django.urls import reverse
 from django.contrib import admin
 from django.contrib.auth.models import User
 
+def touch(queryset):
+    """
+    Bump `updated_at` on every row of `queryset` with one UPDATE, for
+    changes that don't go through `save()`.
+    """
+    return queryset.update(updated_at=timezone.now())
+
+
 # Create your models here.
 class Author(models.Model):
     """
@@ -27,6 +36,9 @@ class Author(models.Model):
     birth_date = models.DateField('Born', blank=True, null=True)
     death_date = models.DateField('Died', blank=True, null=True)
 
+    # Also bumped when the author's list of books changes (see `catalog.signals`).
+    updated_at = models.DateTimeField(auto_now=True)
+
     @property
     @admin.display(description='full name', ordering='last_name')
     def full_name(self):
@@ -45,6 +57,9 @@ class Author(models.Model):
 
     class Meta:
         ordering = ['last_name', 'first_name', 'birth_date']
+        indexes = [
+            models.Index(fields=['last_name', 'first_name', 'birth_date'], name='author_ordering'),
+        ]
 
     def get_absolute_url(self):
         """Returns the URL to access a detailed record for this author."""
@@ -54,12 +69,35 @@ class Author(models.Model):
         """Human-readable string representation for validation."""
         return self.full_name
 
+class BookQuerySet(models.QuerySet):
+
+    def refresh_display_columns(self, batch_size=500):
+        """
+        Recompute the cached author and genre display columns for every
+        book in the queryset, in batches. Returns the number of books updated.
+        """
+        updated = 0
+        batch = []
+        books = self.only('isbn').prefetch_related('authors', 'genre')
+        for book in books.iterator(chunk_size=batch_size):
+            book.refresh_display_columns(commit=False)
+            batch.append(book)
+            if len(batch) >= batch_size:
+                updated += self.model.objects.bulk_update(batch, self.model.DISPLAY_COLUMNS + ['updated_at'])
+                batch = []
+        if batch:
+            updated += self.model.objects.bulk_update(batch, self.model.DISPLAY_COLUMNS + ['updated_at'])
+        return updated
+
+
 class Book(models.Model):
     """
     Model representation of a book with a unique ISBN,
     but not specific copies of it in stock.
     """
 
+    DISPLAY_COLUMNS = ['authors_display', 'authors_links', 'genres_display']
+
     title = models.CharField(max_length=200, help_text='The title of the book')
     pub_date = models.DateField(help_text='The publication date', blank=True, null=True)
     authors = models.ManyToManyField('Author', related_name='books', help_text='The name(s) of the author(s)')
@@ -68,23 +106,63 @@ class Book(models.Model):
     genre = models.ManyToManyField('Genre', related_name='books', help_text='The genre(s) for this book')
     language = models.ForeignKey('Language', null=True, on_delete=models.SET_NULL)
 
+    # Denormalized copies of the author and genre names, kept in sync by the
+    # signal handlers in `catalog.signals` so that listings need no joins.
+    authors_display = models.TextField('author(s)', blank=True, editable=False)
+    # `[pk, full name]` of each author, in the same order, for links.
+    authors_links = models.JSONField(default=list, blank=True, editable=False)
+    genres_display = models.TextField('genre(s)', blank=True, editable=False)
+
+    # Also bumped when anything shown on the book's page changes: its
+    # authors, genres, language or copies (see `catalog.signals`).
+    updated_at = models.DateTimeField(auto_now=True)
+
+    objects = BookQuerySet.as_manager()
+
     def __str__(self):
         """Human-readable string representation for terminal validation."""
-        names = [author.full_name for author in self.authors.all()]
-        return f"{self.title} by {', '.join(names) if len(names) > 1 else names[0]}"
+        names = self.display_full_names
+        return f"{self.title} by {names}" if names else self.title
 
     @property
     @admin.display(description='author(s)')
     def display_full_names(self):
         """Show full names in the admin console list inline display."""
-        names = [author.full_name for author in self.authors.all()]
-        return ', '.join(names) if len(names) > 1 else names[0]
+        return self.authors_display
+
+    @property
+    def display_authors(self):
+        """`(url, full name)` of each author, for linking to their pages."""
+        return [
+            (reverse('catalog:author-detail-view', kwargs={'pk': pk}), name)
+            for pk, name in self.authors_links
+        ]
 
     @property
     def display_genres(self):
         """Show all genre categories the book covers."""
-        genres = [genre.name for genre in self.genre.all()]
-        return ', '.join(genres) if len(genres) > 1 else genres[0]
+        return self.genres_display
+
+    def refresh_display_columns(self, commit=True):
+        """
+        Recompute the cached author and genre display columns from the
+        related tables. Reads through `self.authors.all()` and
+        `self.genre.all()`, so a prefetched book costs no extra queries.
+
+        Arguments:
+            commit [bool]: also write the new values to the database.
+        """
+        self.authors_links = [[author.pk, author.full_name] for author in self.authors.all()]
+        self.authors_display = ', '.join(name for pk, name in self.authors_links)
+        self.genres_display = ', '.join(genre.name for genre in self.genre.all())
+        self.updated_at = timezone.now()
+        if commit:
+            Book.objects.filter(pk=self.pk).update(
+                authors_display=self.authors_display,
+                authors_links=self.authors_links,
+                genres_display=self.genres_display,
+                updated_at=self.updated_at,
+            )
 
     def get_absolute_url(self):
         """Returns the URL to access a detailed record for this book."""
@@ -92,6 +170,94 @@ class Book(models.Model):
 
     class Meta:
         ordering = ['title']
+        indexes = [
+            models.Index(fields=['title'], name='book_title'),
+        ]
+
+
+def overdue_cutoff():
+    """Start of today in the current time zone; loans due before it are overdue."""
+    return timezone.localtime().replace(hour=0, minute=0, second=0, microsecond=0)
+
+
+class BookInstanceQuerySet(models.QuerySet):
+
+    def on_loan(self):
+        """Copies currently on loan, soonest due first."""
+        return self.filter(status=self.model.STATUS_LOANED).order_by('due_back')
+
+    def borrowed_by(self, user):
+        """Copies currently on loan to `user`, soonest due first."""
+        return self.on_loan().filter(borrower=user)
+
+    def check_out(self, borrower, period=None):
+        """
+        Loan every available copy in the queryset to `borrower` with a single
+        UPDATE. Returns `(loaned_on, due_back, number_of_copies_loaned)`.
+        """
+        loaned_on, due_back = self.model.loan_dates(period)
+        updated = self.filter(status=self.model.STATUS_AVAILABLE).update(
+            status=self.model.STATUS_LOANED,
+            borrower=borrower,
+            loaned_on=loaned_on,
+            due_back=due_back,
+            updated_at=loaned_on,
+        )
+        if updated:
+            touch(Book.objects.filter(pk__in=self.values('book_id')))
+        return loaned_on, due_back, updated
+
+    def check_in(self):
+        """Return every copy on loan in the queryset with a single UPDATE."""
+        updated = self.filter(status=self.model.STATUS_LOANED).update(
+            status=self.model.STATUS_AVAILABLE,
+            borrower=None,
+            loaned_on=None,
+            due_back=None,
+            updated_at=timezone.now(),
+        )
+        if updated:
+            touch(Book.objects.filter(pk__in=self.values('book_id')))
+        return updated
+
+    def overdue(self):
+        """
+        Copies on loan that were due back before today, most overdue first.
+        Compares `due_back` against a constant, so that the search on the
+        (status, due_back) index stops at the cutoff.
+        """
+        return self.on_loan().filter(due_back__lt=overdue_cutoff())
+
+    def overdue_by_member(self):
+        """Overdue copies counted per borrower, members with the most overdue first."""
+        return (
+            self.overdue()
+            .values('borrower__username', 'borrower__first_name', 'borrower__last_name')
+            .annotate(
+                num_overdue=models.Count('copy_id'),
+                oldest_due_back=models.Min('due_back'),
+            )
+            .order_by('-num_overdue', 'oldest_due_back')
+        )
+
+    def with_overdue(self):
+        """
+        Annotate `overdue` (bool) and `overdue_by` (a whole number of days as a
+        timedelta, None when not overdue), computed by the database.
+        """
+        late = models.Q(due_back__lt=overdue_cutoff())
+        return self.annotate(
+            overdue=models.Case(
+                models.When(late, then=models.Value(True)),
+                default=models.Value(False),
+                output_field=models.BooleanField(),
+            ),
+            overdue_by=models.Case(
+                models.When(late, then=models.Value(timezone.localdate()) - TruncDate('due_back')),
+                default=None,
+                output_field=models.DurationField(),
+            ),
+        )
 
 
 class BookInstance(models.Model):
@@ -124,11 +290,25 @@ class BookInstance(models.Model):
         default=STATUS_MAINTENANCE,
         help_text='Book availability status'
     )
+    updated_at = models.DateTimeField(auto_now=True)
+
+    objects = BookInstanceQuerySet.as_manager()
 
     class Meta:
 
         ordering = ['status', 'loaned_on', 'due_back']
         permissions = (('can_mark_returned', 'Set book as returned'),)
+        # The loan views filter on status (and borrower) and page through
+        # due_back with copy_id as the keyset tie-breaker.
+        indexes = [
+            models.Index(fields=['status', 'due_back', 'copy_id'], name='bookinstance_status_due'),
+            models.Index(fields=['borrower', 'status', 'due_back', 'copy_id'], name='bookinstance_borrower_due'),
+            models.Index(
+                fields=['due_back', 'copy_id'],
+                condition=models.Q(status='o'),
+                name='bookinstance_on_loan_due',
+            ),
+        ]
 
     def __str__(self):
         """Human-readable string representation for validation."""
@@ -139,28 +319,48 @@ class BookInstance(models.Model):
         """Helper method to update book status."""
         self.status=status
 
-    def loan(self, period=None):
+    @staticmethod
+    def loan_dates(period=None):
         """
-        Automatically sets the loan out, due back, and status information
-        when a book is being loaned out.
+        Return the `(loaned_on, due_back)` pair for a loan starting now.
 
         Arguments:
-            period [int]: the number of days to loan out.
+            period [int]: the number of days to loan out, 14 by default.
         """
         if period is None:
             period = timedelta(days=14)
         else:
             period = timedelta(int(period))
+        loaned_on = timezone.now()
+        return loaned_on, loaned_on + period
+
+    def loan(self, period=None):
+        """
+        Automatically sets the loan out, due back, and status information
+        when a book is being loaned out.
 
-        self.loaned_on = timezone.now()
-        self.due_back = self.loaned_on + period
+        Arguments:
+            period [int]: the number of days to loan out.
+        """
+        self.loaned_on, self.due_back = self.loan_dates(period)
         self._update_status(self.STATUS_LOANED)
         return f"{self.book.title} {self.copy_id} loaned on {self.loaned_on}"
 
     @property
     def is_overdue(self):
         """Test if the book is overdue based on current date."""
-        return bool(self.due_back.date() < date.today()) if self.due_back else False
+        if 'overdue' in self.__dict__:
+            return self.overdue
+        return bool(self.due_back < overdue_cutoff()) if self.due_back else False
+
+    @property
+    def days_overdue(self):
+        """Number of days past the due date, 0 if the book is not overdue."""
+        if 'overdue_by' in self.__dict__:
+            return self.overdue_by.days if self.overdue_by else 0
+        if not self.is_overdue:
+            return 0
+        return (timezone.localdate() - timezone.localdate(self.due_back)).days
 
 
 class Genre(models.Model):
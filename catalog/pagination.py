@@ -0,0 +1,231 @@
+"""
+Keyset (seek) pagination for the catalog list views.
+
+OFFSET pagination reads and discards every row before the requested page
+and needs a COUNT(*) to number the pages, so deep pages get slower as the
+catalog grows. Keyset pagination instead filters on the ordering columns
+of the last row shown ("everything after this title"), which an index can
+answer directly, so page N costs the same as page 1.
+"""
+import base64
+import binascii
+import json
+import operator
+from functools import reduce
+
+from asgiref.sync import sync_to_async
+from django.core.exceptions import ImproperlyConfigured, ValidationError
+from django.db.models import F, Q
+from django.http import Http404
+
+
+class KeysetPage:
+    """
+    A page of results together with the opaque cursors pointing at its
+    neighbours. Exposes the parts of Django's `Page` API the templates use.
+    """
+
+    paginator = None
+
+    def __init__(self, object_list, next_cursor=None, previous_cursor=None):
+        self.object_list = object_list
+        self.next_cursor = next_cursor
+        self.previous_cursor = previous_cursor
+
+    def __repr__(self):
+        return f'<Keyset page of {len(self.object_list)} objects>'
+
+    def __len__(self):
+        return len(self.object_list)
+
+    def __iter__(self):
+        return iter(self.object_list)
+
+    def __getitem__(self, index):
+        return self.object_list[index]
+
+    def has_next(self):
+        return self.next_cursor is not None
+
+    def has_previous(self):
+        return self.previous_cursor is not None
+
+    def has_other_pages(self):
+        return self.has_next() or self.has_previous()
+
+
+class KeysetPaginationMixin:
+    """
+    Paginate a `ListView` with keyset pagination, addressing pages with
+    `?cursor=` tokens instead of page numbers.
+
+    The sort keys come from `keyset_ordering`, or else the queryset's
+    `order_by()`, or else the model's `Meta.ordering`, with the primary key
+    appended as a tie-breaker. Only concrete fields of the model itself can
+    be used. NULLs sort first in ascending order and last in descending
+    order, whatever the database default is.
+
+    Requests carrying the old `?page=N` parameter still get Django's
+    numbered pagination, so existing links keep working.
+    """
+
+    cursor_kwarg = 'cursor'
+    keyset_ordering = None
+
+    def get_keyset_ordering(self, queryset):
+        """Return the sort keys as a list of `(field, descending)` pairs."""
+        return keyset_ordering(queryset, self.keyset_ordering)
+
+    def uses_page_numbers(self):
+        """Whether the request asks for a numbered page rather than a cursor."""
+        return self.page_kwarg in self.request.GET and self.cursor_kwarg not in self.request.GET
+
+    def paginate_queryset(self, queryset, page_size):
+        if self.uses_page_numbers():
+            return super().paginate_queryset(queryset, page_size)
+        page_queryset, keys, values, backwards = self.seek(queryset, page_size)
+        return self.build_page(list(page_queryset), keys, values, backwards, page_size)
+
+    async def apaginate_queryset(self, queryset, page_size):
+        """Async version of `paginate_queryset`, for async views."""
+        if self.uses_page_numbers():
+            return await sync_to_async(super().paginate_queryset)(queryset, page_size)
+        page_queryset, keys, values, backwards = self.seek(queryset, page_size)
+        rows = [obj async for obj in page_queryset]
+        return self.build_page(rows, keys, values, backwards, page_size)
+
+    def seek(self, queryset, page_size):
+        """
+        Return the unevaluated queryset for the requested page (plus one row
+        to tell whether there is another), with the sort keys, the cursor
+        values and its direction.
+        """
+        keys = self.get_keyset_ordering(queryset)
+        cursor = self.request.GET.get(self.cursor_kwarg)
+        backwards, values = self.decode_cursor(cursor, keys) if cursor else (False, None)
+        if backwards:
+            keys = [(field, not descending) for field, descending in keys]
+        return keyset_queryset(queryset, keys, values)[:page_size + 1], keys, values, backwards
+
+    def build_page(self, rows, keys, values, backwards, page_size):
+        """Turn the rows fetched for `seek()` into the `paginate_queryset` result."""
+        has_more = len(rows) > page_size
+        rows = rows[:page_size]
+        if backwards:
+            rows.reverse()
+            keys = [(field, not descending) for field, descending in keys]
+            has_next, has_previous = True, has_more
+        else:
+            has_next, has_previous = has_more, values is not None
+
+        page = KeysetPage(
+            rows,
+            next_cursor=self.encode_cursor(rows[-1], keys, False) if rows and has_next else None,
+            previous_cursor=self.encode_cursor(rows[0], keys, True) if rows and has_previous else None,
+        )
+        return (None, page, page.object_list, page.has_other_pages())
+
+    def encode_cursor(self, obj, keys, backwards):
+        """Return an opaque token for the rows after (or before) `obj`."""
+        values = []
+        for field, descending in keys:
+            value = getattr(obj, field.attname)
+            values.append(None if value is None else field.value_to_string(obj))
+        payload = json.dumps({'b': backwards, 'v': values}, separators=(',', ':'))
+        return base64.urlsafe_b64encode(payload.encode()).decode().rstrip('=')
+
+    def decode_cursor(self, cursor, keys):
+        """Return `(backwards, values)` for a token from `encode_cursor`."""
+        try:
+            padded = cursor + '=' * (-len(cursor) % 4)
+            payload = json.loads(base64.urlsafe_b64decode(padded.encode()))
+            raw_values = payload['v']
+            if len(raw_values) != len(keys):
+                raise ValueError
+            values = [
+                None if value is None else field.to_python(value)
+                for (field, descending), value in zip(keys, raw_values)
+            ]
+            return bool(payload['b']), values
+        except (binascii.Error, ValueError, KeyError, TypeError, ValidationError):
+            raise Http404('Invalid page cursor.')
+
+
+def keyset_ordering(queryset, ordering=None):
+    """
+    Return the sort keys for keyset pagination over `queryset` as a list of
+    `(field, descending)` pairs, ending with the primary key.
+    """
+    ordering = ordering or queryset.query.order_by or queryset.model._meta.ordering
+    opts = queryset.model._meta
+    keys = []
+    for name in ordering:
+        if not isinstance(name, str) or '__' in name or name == '?':
+            raise ImproperlyConfigured(
+                f'Keyset pagination can only seek on fields of {opts.label}, not {name!r}.'
+            )
+        descending = name.startswith('-')
+        name = name.lstrip('-')
+        field = opts.pk if name == 'pk' else opts.get_field(name)
+        keys.append((field, descending))
+    if not any(field == opts.pk for field, descending in keys):
+        keys.append((opts.pk, False))
+    return keys
+
+
+def keyset_queryset(queryset, keys, values=None):
+    """
+    Order `queryset` by the sort keys and, given the key values of a row,
+    keep only the rows that sort after it.
+    """
+    queryset = queryset.order_by(*[_order_by(field, descending) for field, descending in keys])
+    if values is not None:
+        queryset = queryset.filter(_seek(keys, values))
+    return queryset
+
+
+def _order_by(field, descending):
+    name = 'pk' if field.primary_key else field.name
+    if not field.null:
+        return F(name).desc() if descending else F(name).asc()
+    return F(name).desc(nulls_last=True) if descending else F(name).asc(nulls_first=True)
+
+
+def _after(name, value, descending):
+    """Return a Q for rows sorting strictly after `value`, or None if none can."""
+    if descending:
+        if value is None:
+            return None
+        return Q(**{f'{name}__lt': value}) | Q(**{f'{name}__isnull': True})
+    if value is None:
+        return Q(**{f'{name}__isnull': False})
+    return Q(**{f'{name}__gt': value})
+
+
+def _seek(keys, values):
+    """
+    Build the row-value comparison `(k1, k2, ...) > (v1, v2, ...)` for the
+    given sort keys as `k1 > v1 OR (k1 = v1 AND k2 > v2) OR ...`.
+    """
+    clauses = []
+    equal = Q()
+    for (field, descending), value in zip(keys, values):
+        name = 'pk' if field.primary_key else field.name
+        after = _after(name, value, descending)
+        if after is not None:
+            clauses.append(equal & after)
+        if value is None:
+            equal &= Q(**{f'{name}__isnull': True})
+        else:
+            equal &= Q(**{name: value})
+    if not clauses:
+        return Q(pk__in=[])
+    seek = reduce(operator.or_, clauses)
+
+    # The OR chain alone is opaque to most query planners; a redundant
+    # range on the leading key lets an index on it be used to seek.
+    (field, descending), value = keys[0], values[0]
+    name = 'pk' if field.primary_key else field.name
+    if value is not None and not (descending and field.null):
+        seek &= Q(**{f'{name}__lte' if descending else f'{name}__gte': value})
+    return seek
@@ -0,0 +1,137 @@
+"""
+Full-text search over books, backed by an SQLite FTS5 virtual table.
+
+The `catalog_book_fts` table holds one row per book, keyed by ISBN as the
+rowid, with the title, summary and author names. It is created by a
+migration and kept up to date by the handlers in `catalog.signals`; the
+`rebuild_search_index` command repopulates it from scratch.
+"""
+import re
+
+from django.db import connection, transaction
+
+from .models import Book
+
+FTS_TABLE = 'catalog_book_fts'
+
+# bm25() weights for the title, summary and authors columns.
+RANK = f'bm25({FTS_TABLE}, 10.0, 1.0, 5.0)'
+
+TOKEN_PATTERN = re.compile(r'\w+')
+
+
+def build_match_query(text):
+    """
+    Turn free text from a search box into an FTS5 query that matches rows
+    containing every word, treating the last word as a prefix. Each word
+    is quoted so that FTS5 operators and syntax in user input are inert.
+    """
+    tokens = TOKEN_PATTERN.findall(text)
+    if not tokens:
+        return ''
+    terms = [f'"{token}"' for token in tokens]
+    terms[-1] += '*'
+    return ' '.join(terms)
+
+
+def index_books(book_ids):
+    """Add or replace the search rows for the books with the given ISBNs."""
+    book_ids = list(book_ids)
+    if not book_ids:
+        return
+    rows = Book.objects.filter(pk__in=book_ids).values_list(
+        'isbn', 'title', 'summary', 'authors_display',
+    )
+    with connection.cursor() as cursor:
+        cursor.executemany(
+            f'DELETE FROM {FTS_TABLE} WHERE rowid = %s',
+            [(book_id,) for book_id in book_ids],
+        )
+        cursor.executemany(
+            f'INSERT INTO {FTS_TABLE} (rowid, title, summary, authors) VALUES (%s, %s, %s, %s)',
+            list(rows),
+        )
+
+
+def index_new_books(books):
+    """
+    Add search rows for just-created `Book` instances, without reading
+    them back. Used by bulk loaders, which bypass the model signals.
+    """
+    rows = [(book.isbn, book.title, book.summary, book.authors_display) for book in books]
+    with connection.cursor() as cursor:
+        _insert_rows(cursor, rows)
+
+
+def remove_books(book_ids):
+    """Drop the search rows for the books with the given ISBNs."""
+    with connection.cursor() as cursor:
+        cursor.executemany(
+            f'DELETE FROM {FTS_TABLE} WHERE rowid = %s',
+            [(book_id,) for book_id in book_ids],
+        )
+
+
+def rebuild_index(batch_size=1000):
+    """Repopulate the search table from every book. Returns the row count."""
+    indexed = 0
+    rows = Book.objects.order_by().values_list('isbn', 'title', 'summary', 'authors_display')
+    with transaction.atomic(), connection.cursor() as cursor:
+        cursor.execute(f'DELETE FROM {FTS_TABLE}')
+        batch = []
+        for row in rows.iterator(chunk_size=batch_size):
+            batch.append(row)
+            if len(batch) >= batch_size:
+                indexed += _insert_rows(cursor, batch)
+                batch = []
+        indexed += _insert_rows(cursor, batch)
+        cursor.execute(f"INSERT INTO {FTS_TABLE} ({FTS_TABLE}) VALUES ('optimize')")
+    return indexed
+
+
+def _insert_rows(cursor, rows):
+    cursor.executemany(
+        f'INSERT INTO {FTS_TABLE} (rowid, title, summary, authors) VALUES (%s, %s, %s, %s)',
+        rows,
+    )
+    return len(rows)
+
+
+class BookSearchResults:
+    """
+    The books matching a search, best match first.
+
+    Supports `count()` and slicing so it can be handed to a `Paginator`:
+    each page runs one ranked FTS query for its ISBNs and one primary key
+    lookup for the books themselves.
+    """
+
+    def __init__(self, text):
+        self.text = text
+        self.match = build_match_query(text)
+
+    def count(self):
+        if not self.match:
+            return 0
+        with connection.cursor() as cursor:
+            cursor.execute(f'SELECT COUNT(*) FROM {FTS_TABLE} WHERE {FTS_TABLE} MATCH %s', [self.match])
+            return cursor.fetchone()[0]
+
+    def __len__(self):
+        return self.count()
+
+    def __getitem__(self, key):
+        if not isinstance(key, slice):
+            return self[key:key + 1][0]
+        start = key.start or 0
+        if not self.match or key.stop is None or key.stop <= start:
+            return []
+        with connection.cursor() as cursor:
+            cursor.execute(
+                f'SELECT rowid FROM {FTS_TABLE} WHERE {FTS_TABLE} MATCH %s '
+                f'ORDER BY {RANK} LIMIT %s OFFSET %s',
+                [self.match, key.stop - start, start],
+            )
+            isbns = [row[0] for row in cursor.fetchall()]
+        books = Book.objects.in_bulk(isbns)
+        return [books[isbn] for isbn in isbns if isbn in books]
@@ -0,0 +1,249 @@
+"""
+Signal handlers that keep the denormalized columns on `Book` and the
+full-text search index in sync with the rows they are built from, that
+bump the `updated_at` stamps the detail pages are validated against, and
+that invalidate the cached library statistics, pages and template
+fragments.
+"""
+from functools import partial
+
+from django.contrib.auth.models import Group
+from django.db import transaction
+from django.db.models.signals import m2m_changed, post_delete, post_save, pre_delete
+from django.dispatch import receiver
+
+from . import caching, fragments, search
+from .models import Author, Book, BookInstance, Genre, Language, User, touch
+from .stats import invalidate_library_stats
+
+
+def refresh_books(book_ids):
+    """
+    Recompute the display columns and search rows for the books with the
+    given ISBNs.
+    """
+    if book_ids:
+        Book.objects.filter(pk__in=book_ids).refresh_display_columns()
+        search.index_books(book_ids)
+        fragments.invalidate_on_commit(fragments.BOOK_ROW, *book_ids)
+
+
+@receiver(m2m_changed, sender=Book.authors.through)
+@receiver(m2m_changed, sender=Book.genre.through)
+def book_relations_changed(sender, instance, action, reverse, pk_set, **kwargs):
+    """
+    Refresh the cached columns when authors or genres are added to or
+    removed from a book, from either side of the relation.
+    """
+    if not reverse:
+        if action in ('post_add', 'post_remove', 'post_clear'):
+            instance.refresh_display_columns()
+            search.index_books([instance.pk])
+            fragments.invalidate_on_commit(fragments.BOOK_ROW, instance.pk)
+        return
+
+    # `instance` is an Author or Genre and `pk_set` holds book ISBNs,
+    # except on clear where the affected books must be looked up first.
+    if action == 'pre_clear':
+        instance._cleared_book_ids = list(instance.books.values_list('pk', flat=True))
+    elif action == 'post_clear':
+        refresh_books(getattr(instance, '_cleared_book_ids', []))
+    elif action in ('post_add', 'post_remove'):
+        refresh_books(pk_set)
+
+
+@receiver(post_save, sender=Book)
+def book_saved(sender, instance, created, raw, **kwargs):
+    """
+    Re-sync a book on save, since the instance being saved may hold
+    display columns that went stale while it was in memory, and index its
+    new title and summary.
+    """
+    if raw:
+        return
+    if not created:
+        instance.refresh_display_columns()
+    search.index_books([instance.pk])
+    fragments.invalidate_on_commit(fragments.BOOK_ROW, instance.pk)
+
+
+@receiver(post_delete, sender=Book)
+def book_deleted(sender, instance, **kwargs):
+    """Drop a deleted book from the search index and the fragment cache."""
+    search.remove_books([instance.pk])
+    fragments.invalidate_on_commit(fragments.BOOK_ROW, instance.pk)
+
+
+@receiver(m2m_changed, sender=Book.authors.through)
+def book_authors_changed(sender, instance, action, reverse, pk_set, **kwargs):
+    """Bump `updated_at` on the authors whose list of books changed."""
+    if reverse:
+        if action.startswith('post_'):
+            touch(Author.objects.filter(pk=instance.pk))
+        return
+    # `instance` is a Book and `pk_set` holds author IDs.
+    if action == 'pre_clear':
+        instance._cleared_author_ids = list(instance.authors.values_list('pk', flat=True))
+    elif action == 'post_clear':
+        touch(Author.objects.filter(pk__in=getattr(instance, '_cleared_author_ids', [])))
+    elif action in ('post_add', 'post_remove'):
+        touch(Author.objects.filter(pk__in=pk_set))
+
+
+@receiver(post_save, sender=Book)
+def book_touched(sender, instance, created, raw, **kwargs):
+    """Bump `updated_at` on the authors of a changed book, whose pages list it."""
+    if not created and not raw:
+        touch(Author.objects.filter(books=instance))
+
+
+@receiver(pre_delete, sender=Book)
+def book_deleting(sender, instance, **kwargs):
+    """Remember the authors of a book about to be deleted."""
+    instance._deleted_author_ids = list(instance.authors.values_list('pk', flat=True))
+
+
+@receiver(post_delete, sender=Book)
+def book_untouched(sender, instance, **kwargs):
+    """Bump `updated_at` on the authors of a deleted book."""
+    touch(Author.objects.filter(pk__in=getattr(instance, '_deleted_author_ids', [])))
+
+
+@receiver(post_save, sender=BookInstance)
+@receiver(post_delete, sender=BookInstance)
+def copy_changed(sender, instance, raw=False, **kwargs):
+    """Bump `updated_at` on the book whose page lists a changed copy."""
+    if not raw:
+        touch(Book.objects.filter(pk=instance.book_id))
+
+
+@receiver(post_save, sender=Language)
+def language_saved(sender, instance, created, raw, **kwargs):
+    """Bump `updated_at` on the books in a renamed language."""
+    if not created and not raw:
+        touch(Book.objects.filter(language=instance))
+
+
+@receiver(pre_delete, sender=Language)
+def language_deleting(sender, instance, **kwargs):
+    """
+    Bump `updated_at` on the books in a language about to be deleted, whose
+    `language` is then cleared with an UPDATE that doesn't touch it.
+    """
+    touch(Book.objects.filter(language=instance))
+
+
+@receiver(post_save, sender=Author)
+@receiver(post_save, sender=Genre)
+def name_saved(sender, instance, created, raw, **kwargs):
+    """Refresh every book listing a renamed author or genre."""
+    if created or raw:
+        return
+    refresh_books(list(instance.books.values_list('pk', flat=True)))
+
+
+@receiver(pre_delete, sender=Author)
+@receiver(pre_delete, sender=Genre)
+def name_deleting(sender, instance, **kwargs):
+    """Remember the books of an author or genre about to be deleted."""
+    instance._deleted_book_ids = list(instance.books.values_list('pk', flat=True))
+
+
+@receiver(post_delete, sender=Author)
+@receiver(post_delete, sender=Genre)
+def name_deleted(sender, instance, **kwargs):
+    """
+    Refresh the books of a deleted author or genre. Deleting cascades
+    through the M2M tables without sending `m2m_changed`.
+    """
+    refresh_books(getattr(instance, '_deleted_book_ids', []))
+
+
+@receiver(post_save, sender=Book)
+@receiver(post_save, sender=Author)
+@receiver(post_save, sender=Genre)
+@receiver(post_save, sender=Language)
+def counted_row_created(sender, created, **kwargs):
+    """Invalidate the library statistics when a counted row is added."""
+    if created:
+        # Once committed, or a request could count the old rows and cache
+        # them as the new statistics.
+        transaction.on_commit(invalidate_library_stats)
+
+
+@receiver(post_delete, sender=Book)
+@receiver(post_delete, sender=Author)
+@receiver(post_delete, sender=Genre)
+@receiver(post_delete, sender=Language)
+def counted_row_deleted(sender, **kwargs):
+    """Invalidate the library statistics when a counted row is removed."""
+    transaction.on_commit(invalidate_library_stats)
+
+
+@receiver(post_save, sender=Author)
+@receiver(post_delete, sender=Author)
+def author_changed(sender, instance, **kwargs):
+    """Drop the cached author list row, once the change is committed."""
+    fragments.invalidate_on_commit(fragments.AUTHOR_ROW, instance.pk)
+
+
+@receiver(post_save, sender=User)
+@receiver(post_delete, sender=User)
+def user_changed(sender, instance, **kwargs):
+    """Drop the cached navbar, which shows the username and depends on the user's flags."""
+    fragments.invalidate_on_commit(fragments.NAVBAR, instance.pk)
+
+
+@receiver(m2m_changed, sender=User.user_permissions.through)
+@receiver(m2m_changed, sender=User.groups.through)
+def user_permissions_changed(sender, instance, action, reverse, pk_set, **kwargs):
+    """Drop the cached navbar of users given or denied permissions or groups."""
+    if not reverse:
+        if action.startswith('post_'):
+            fragments.invalidate_on_commit(fragments.NAVBAR, instance.pk)
+        return
+    # `instance` is a Permission or Group and `pk_set` holds user IDs.
+    if action == 'pre_clear':
+        instance._cleared_user_ids = list(instance.user_set.values_list('pk', flat=True))
+    elif action == 'post_clear':
+        fragments.invalidate_on_commit(fragments.NAVBAR, *getattr(instance, '_cleared_user_ids', []))
+    elif action in ('post_add', 'post_remove'):
+        fragments.invalidate_on_commit(fragments.NAVBAR, *pk_set)
+
+
+@receiver(m2m_changed, sender=Group.permissions.through)
+def group_permissions_changed(sender, instance, action, reverse, pk_set, **kwargs):
+    """Drop the cached navbar of every member of a group whose permissions changed."""
+    if not reverse:
+        group_ids = [instance.pk]
+    elif action == 'pre_clear':
+        # `instance` is a Permission and `pk_set` holds group IDs.
+        instance._cleared_group_ids = list(instance.group_set.values_list('pk', flat=True))
+        return
+    elif action == 'post_clear':
+        group_ids = getattr(instance, '_cleared_group_ids', [])
+    else:
+        group_ids = pk_set
+    if action.startswith('post_') and group_ids:
+        members = User.objects.filter(groups__in=group_ids).values_list('pk', flat=True).distinct()
+        fragments.invalidate_on_commit(fragments.NAVBAR, *members)
+
+
+@receiver(pre_delete, sender=Group)
+def group_deleting(sender, instance, **kwargs):
+    """Drop the cached navbar of the members of a deleted group."""
+    fragments.invalidate_on_commit(fragments.NAVBAR, *instance.user_set.values_list('pk', flat=True))
+
+
+@receiver(post_save, sender=Genre)
+@receiver(post_delete, sender=Genre)
+def genre_changed(sender, **kwargs):
+    """Retire the cached genres page, once the change is committed."""
+    transaction.on_commit(partial(caching.invalidate_pages, caching.GENRES))
+
+
+@receiver(post_save, sender=Language)
+@receiver(post_delete, sender=Language)
+def language_changed(sender, **kwargs):
+    """Retire the cached languages page, once the change is committed."""
+    transaction.on_commit(partial(caching.invalidate_pages, caching.LANGUAGES))
@@ -0,0 +1,91 @@
+"""
+Cached library statistics for the catalog index page.
+
+The four counts are computed together in a single query and stored in the
+cache framework under a versioned key. Creating or deleting a counted row
+bumps the version (see `catalog.signals`), and only one request at a time
+recomputes a missing entry; concurrent requests are served the previous
+counts in the meantime.
+"""
+import time
+
+from django.core.cache import cache
+from django.db import connection
+
+from .models import Author, Book, Genre, Language
+
+VERSION_KEY = 'catalog:stats:version'
+STALE_KEY = 'catalog:stats:stale'
+
+STATS_TIMEOUT = 60 * 60
+LOCK_TIMEOUT = 10
+WAIT_INTERVAL = 0.05
+WAIT_ATTEMPTS = 20
+
+COUNTED_MODELS = {
+    'num_books': Book,
+    'num_authors': Author,
+    'num_genres': Genre,
+    'num_language': Language,
+}
+
+
+def _stats_key(version):
+    return f'catalog:stats:{version}'
+
+
+def _lock_key(version):
+    return f'catalog:stats:{version}:lock'
+
+
+def count_library():
+    """Count books, authors, genres and languages in a single query."""
+    subqueries = ', '.join(
+        f'(SELECT COUNT(*) FROM {connection.ops.quote_name(model._meta.db_table)})'
+        for model in COUNTED_MODELS.values()
+    )
+    with connection.cursor() as cursor:
+        cursor.execute(f'SELECT {subqueries}')
+        row = cursor.fetchone()
+    return dict(zip(COUNTED_MODELS, row))
+
+
+def get_library_stats():
+    """
+    Return the library counts, from the cache when possible.
+
+    On a miss, the request that wins the lock recomputes and stores the
+    counts. Other requests get the last known counts if there are any, or
+    else wait briefly for the winner before counting themselves.
+    """
+    version = cache.get(VERSION_KEY, 0)
+    stats = cache.get(_stats_key(version))
+    if stats is not None:
+        return stats
+
+    if cache.add(_lock_key(version), True, LOCK_TIMEOUT):
+        try:
+            stats = count_library()
+            cache.set_many({_stats_key(version): stats, STALE_KEY: stats}, STATS_TIMEOUT)
+        finally:
+            cache.delete(_lock_key(version))
+        return stats
+
+    stats = cache.get(STALE_KEY)
+    if stats is not None:
+        return stats
+
+    for _ in range(WAIT_ATTEMPTS):
+        time.sleep(WAIT_INTERVAL)
+        stats = cache.get(_stats_key(version))
+        if stats is not None:
+            return stats
+    return count_library()
+
+
+def invalidate_library_stats():
+    """Retire the cached counts so the next request recomputes them."""
+    try:
+        cache.incr(VERSION_KEY)
+    except ValueError:
+        cache.set(VERSION_KEY, 1, None)
@@ -0,0 +1,109 @@
+from asgiref.sync import sync_to_async
+from django.core.cache import cache
+from django.test import TestCase
+from django.urls import reverse
+
+from catalog.models import *
+
+
+class TestAsyncViews(TestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = User.objects.create_user(username='test_user', password='fortesting')
+        language = Language.objects.create(name='English')
+        Genre.objects.create(name='Fantasy')
+        for num in range(1, 13):
+            author = Author.objects.create(first_name='Test', last_name=f'Author {num:02}')
+            book = Book.objects.create(title=f'Test Book {num:02}', isbn=num, language=language)
+            book.authors.add(author)
+            BookInstance.objects.create(book=book, status='a')
+        cls.book = Book.objects.get(isbn=1)
+        cls.author = cls.book.authors.get()
+
+    def setUp(self):
+        cache.clear()
+
+    async def login(self):
+        await sync_to_async(self.async_client.force_login)(self.user)
+        await sync_to_async(self.client.force_login)(self.user)
+
+    async def assertSameAsSync(self, name, *args, query=''):
+        sync_path = reverse(f'catalog:{name}', args=args)
+        async_path = reverse(f'catalog:async-{name}', args=args)
+        sync_response = await sync_to_async(self.client.get)(sync_path + query)
+        async_response = await self.async_client.get(async_path + query)
+        self.assertEqual(async_response.status_code, 200)
+        # Only the logout link's `?next=` differs, as it points back at the page itself.
+        self.assertEqual(
+            async_response.content.decode().replace(async_path, sync_path),
+            sync_response.content.decode(),
+        )
+        return async_response
+
+    async def test_pages_match_sync_views(self):
+        await self.login()
+        await self.assertSameAsSync('genres')
+        await self.assertSameAsSync('languages')
+        await self.assertSameAsSync('book-detail-view', self.book.pk)
+        await self.assertSameAsSync('author-detail-view', self.author.pk)
+        response = await self.assertSameAsSync('books')
+        self.assertContains(response, 'Test Book 10')
+        self.assertNotContains(response, 'Test Book 11')
+        await self.assertSameAsSync('authors', query='?page=2')
+
+    async def test_cursor_pages_match_sync_views(self):
+        await self.login()
+        response = await self.async_client.get(reverse('catalog:async-books'))
+        cursor = response.context['page_obj'].next_cursor
+        response = await self.assertSameAsSync('books', query=f'?cursor={cursor}')
+        self.assertContains(response, 'Test Book 12')
+
+    async def test_index(self):
+        response = await self.async_client.get(reverse('catalog:async-index'))
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.context['num_books'], 12)
+        self.assertEqual(response.context['num_visits'], 0)
+
+    async def test_login_required(self):
+        for name in ('async-books', 'async-authors'):
+            response = await self.async_client.get(reverse(f'catalog:{name}'))
+            self.assertEqual(response.status_code, 302)
+            self.assertTrue(response.url.startswith('/accounts/login/'))
+
+    async def test_missing_object_is_404(self):
+        await self.login()
+        response = await self.async_client.get(reverse('catalog:async-book-detail-view', args=[999]))
+        self.assertEqual(response.status_code, 404)
+
+    async def test_detail_pages_serve_conditional_gets(self):
+        await self.login()
+        for name, pk in (('book-detail-view', self.book.pk), ('author-detail-view', self.author.pk)):
+            path = reverse(f'catalog:async-{name}', args=[pk])
+            response = await self.async_client.get(path)
+            sync_response = await sync_to_async(self.client.get)(reverse(f'catalog:{name}', args=[pk]))
+            for header in ('ETag', 'Last-Modified', 'Cache-Control', 'Vary'):
+                self.assertEqual(response[header], sync_response[header])
+
+            response = await self.async_client.get(path, **{'If-None-Match': response['ETag']})
+            self.assertEqual(response.status_code, 304)
+            self.assertEqual(response.content, b'')
+
+    async def test_anonymous_list_pages_are_served_from_cache(self):
+        for name, model in (('genres', Genre), ('languages', Language)):
+            path = reverse(f'catalog:async-{name}')
+            first = await self.async_client.get(path)
+            sync_response = await sync_to_async(self.client.get)(reverse(f'catalog:{name}'))
+            for header in ('Cache-Control', 'Vary'):
+                self.assertEqual(first[header], sync_response[header])
+
+            # Behind the cache's back: the cached page is served as it was.
+            await model.objects.aupdate(name='Renamed')
+            response = await self.async_client.get(path)
+            self.assertEqual(response.content, first.content)
+            self.assertNotContains(response, 'Renamed')
+
+    async def test_signed_in_list_pages_are_private(self):
+        await self.login()
+        response = await self.async_client.get(reverse('catalog:async-genres'))
+        self.assertIn('private', response['Cache-Control'])
@@ -0,0 +1,190 @@
+import importlib
+import json
+import tempfile
+from io import StringIO
+from pathlib import Path
+
+from django.core.management import call_command
+from django.template import engines
+from django.template.loaders.cached import Loader as CachedLoader
+from django.test import TestCase
+from django.urls import clear_url_caches, resolve
+
+from catalog.management.commands.check_query_plans import plan_problems
+from catalog.models import *
+from catalog.search import BookSearchResults
+from catalog.warmup import template_names, warm_up_on_startup
+from demosite import asgi, wsgi
+
+
+class TestCheckQueryPlans(TestCase):
+
+    def test_catalog_querysets_use_indexes(self):
+        out = StringIO()
+        call_command('check_query_plans', stdout=out)
+        self.assertIn('All catalog query plans use indexes.', out.getvalue())
+
+    def test_full_scans_are_flagged(self):
+        plan = [
+            'SCAN catalog_book',
+            'SCAN catalog_author USING INDEX author_ordering',
+            'SEARCH catalog_bookinstance USING INDEX bookinstance_status_due (status=?)',
+            'USE TEMP B-TREE FOR ORDER BY',
+        ]
+        self.assertEqual(plan_problems(plan), ['SCAN catalog_book'])
+
+
+class TestImportCatalog(TestCase):
+
+    CSV = (
+        'title,isbn,authors,genres,language,copies,summary\n'
+        'Blink,978-0316172325,Malcolm Gladwell,Self-help;Psychology,English,2,Thinking fast\n'
+        'Outliers,9780316017923,Malcolm Gladwell,Self-help,English,1,Success\n'
+        'Inferno,9780142437223,Dante Alighieri;Robert L Moore,Poetry,Italian,0,Hell\n'
+        'Broken,not-an-isbn,Nobody,Poetry,English,1,Bad record\n'
+    )
+    JSONL = (
+        '{"title": "呐喊", "isbn": 9787020024759, "authors": ["鲁迅"], '
+        '"genres": ["Fiction"], "language": "Chinese", "copies": 1}\n'
+    )
+
+    def setUp(self):
+        self.tmpdir = tempfile.TemporaryDirectory()
+        self.addCleanup(self.tmpdir.cleanup)
+
+    def write(self, name, content):
+        path = Path(self.tmpdir.name) / name
+        path.write_text(content, encoding='utf-8')
+        return str(path)
+
+    def run_import(self, *args):
+        out = StringIO()
+        call_command('import_catalog', *args, stdout=out, stderr=StringIO())
+        return out.getvalue()
+
+    def test_csv_import(self):
+        out = self.run_import(self.write('books.csv', self.CSV), '--chunk-size', '2')
+        self.assertIn('Imported 3 books and 3 copies', out)
+        self.assertIn('1 bad records', out)
+        self.assertEqual(Author.objects.count(), 3)
+        self.assertEqual(Genre.objects.count(), 3)
+        self.assertEqual(Language.objects.count(), 2)
+
+        blink = Book.objects.get(pk=9780316172325)
+        self.assertEqual(blink.display_full_names, 'Malcolm Gladwell')
+        self.assertEqual(blink.display_genres, 'Self-help, Psychology')
+        self.assertEqual(blink.language.name, 'English')
+        self.assertEqual(blink.authors.count(), 1)
+        self.assertEqual(
+            blink.bookinstance_set.filter(status=BookInstance.STATUS_AVAILABLE).count(), 2
+        )
+        inferno = Book.objects.get(pk=9780142437223)
+        self.assertEqual(inferno.display_full_names, 'Dante Alighieri, Robert L Moore')
+        self.assertEqual(
+            sorted(book.title for book in BookSearchResults('gladwell')[0:10]),
+            ['Blink', 'Outliers'],
+        )
+
+    def test_jsonl_import_with_chinese_author(self):
+        self.run_import(self.write('books.jsonl', self.JSONL))
+        author = Author.objects.get()
+        self.assertEqual((author.last_name, author.first_name), ('鲁', '迅'))
+        self.assertEqual(Book.objects.get().display_full_names, author.full_name)
+
+    def test_invalid_jsonl_lines_are_reported_and_skipped(self):
+        lines = self.JSONL.splitlines(keepends=True)
+        path = self.write('books.jsonl', '{"title": "Broken\n' + lines[0] + '[1, 2]\n')
+        err = StringIO()
+        out = StringIO()
+        call_command('import_catalog', path, stdout=out, stderr=err)
+        self.assertIn('Imported 1 books', out.getvalue())
+        self.assertIn('2 bad records', out.getvalue())
+        self.assertIn('Record 1: JSONDecodeError', err.getvalue())
+        self.assertIn('Record 3:', err.getvalue())
+        self.assertEqual(Book.objects.get().title, '呐喊')
+
+    def test_reimport_skips_existing_books(self):
+        path = self.write('books.csv', self.CSV)
+        self.run_import(path)
+        out = self.run_import(path)
+        self.assertIn('Imported 0 books', out)
+        self.assertIn('skipped 3 existing books', out)
+        self.assertEqual(BookInstance.objects.count(), 3)
+
+    def test_resume_from_checkpoint(self):
+        path = self.write('books.csv', self.CSV)
+        checkpoint = self.write('import.checkpoint', json.dumps({
+            'source': str(Path(path).resolve()), 'records': 2,
+        }))
+        out = self.run_import(path, '--checkpoint', checkpoint)
+        self.assertIn('Resuming after record 2', out)
+        self.assertEqual(list(Book.objects.values_list('title', flat=True)), ['Inferno'])
+        self.assertEqual(json.loads(Path(checkpoint).read_text())['records'], 4)
+
+
+class TestExportCatalog(TestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        for num in range(1, 4):
+            book = Book.objects.create(title=f'Test Book {num}', isbn=num)
+            BookInstance.objects.create(book=book)
+
+    def test_export_copies_to_file(self):
+        with tempfile.TemporaryDirectory() as tmpdir:
+            path = Path(tmpdir) / 'copies.jsonl'
+            call_command('export_catalog', 'copies', '--format', 'jsonl', '--output', str(path))
+            rows = [json.loads(line) for line in path.read_text().splitlines()]
+        self.assertEqual(len(rows), 3)
+        self.assertEqual({row['book__title'] for row in rows}, {'Test Book 1', 'Test Book 2', 'Test Book 3'})
+
+    def test_export_books_to_stdout(self):
+        out = StringIO()
+        call_command('export_catalog', 'books', stdout=out)
+        lines = out.getvalue().splitlines()
+        self.assertEqual(lines[0].split(',')[:2], ['isbn', 'title'])
+        self.assertEqual(len(lines), 4)
+
+
+class TestWarmUp(TestCase):
+
+    def setUp(self):
+        self.loader = engines['django'].engine.template_loaders[0]
+        self.loader.reset()
+
+    def compiled(self):
+        return set(self.loader.get_template_cache)
+
+    def test_templates_are_loaded_through_cached_loader(self):
+        self.assertIsInstance(self.loader, CachedLoader)
+
+    def test_command_compiles_every_project_template(self):
+        out = StringIO()
+        call_command('warm_up', stdout=out)
+        self.assertIn(f'Compiled {len(template_names())} templates', out.getvalue())
+        for name in ('catalog/base_generic.html', 'catalog/side_navbar.html', 'polls/results.html',
+                     'registration/login.html', 'main_base.html'):
+            self.assertIn(name, template_names())
+            self.assertIn(name, self.compiled())
+
+    def test_startup_warm_up_follows_setting(self):
+        with self.settings(WARM_UP_ON_STARTUP=False):
+            warm_up_on_startup()
+        self.assertEqual(self.compiled(), set())
+        with self.settings(WARM_UP_ON_STARTUP=True):
+            warm_up_on_startup()
+        self.assertIn('catalog/books.html', self.compiled())
+
+    def test_entry_points_warm_up_before_the_first_request(self):
+        for module in (wsgi, asgi):
+            self.loader.reset()
+            clear_url_caches()
+            with self.settings(WARM_UP_ON_STARTUP=True):
+                importlib.reload(module)
+            self.assertIn('catalog/books.html', self.compiled())
+
+        # The URLconf was built with the admin's models registered.
+        self.client.force_login(User.objects.create_superuser('admin', password='admin'))
+        response = self.client.get('/admin/catalog/book/')
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(resolve('/admin/catalog/book/').url_name, 'catalog_book_changelist')
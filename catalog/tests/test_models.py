@@ -214,6 +214,93 @@ class TestBookModel(TestCase):
         self.assertEqual(book.language, lang)
 
 
+class TestBookDisplayColumns(TestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.author1 = Author.objects.create(
+            first_name = 'First',
+            last_name = 'Author',
+        )
+        cls.author2 = Author.objects.create(
+            first_name = 'Second',
+            last_name = 'Writer',
+        )
+        cls.genre = Genre.objects.create(
+            name = 'Test Genre',
+        )
+        cls.book = Book.objects.create(
+            title = 'Test Book',
+            summary = 'Test case for display columns',
+            isbn = 123456789,
+        )
+
+    def test_columns_empty_without_relations(self):
+        book = Book.objects.get(isbn=123456789)
+        self.assertEqual(book.display_full_names, '')
+        self.assertEqual(book.display_genres, '')
+        self.assertEqual(str(book), 'Test Book')
+
+    def test_adding_authors_and_genres_updates_columns(self):
+        self.book.authors.add(self.author1, self.author2)
+        self.book.genre.add(self.genre)
+        book = Book.objects.get(isbn=123456789)
+        self.assertEqual(book.display_full_names, 'First Author, Second Writer')
+        self.assertEqual(book.display_genres, 'Test Genre')
+        self.assertEqual(str(book), 'Test Book by First Author, Second Writer')
+        self.assertEqual(book.display_authors, [
+            (self.author1.get_absolute_url(), 'First Author'),
+            (self.author2.get_absolute_url(), 'Second Writer'),
+        ])
+
+    def test_reverse_add_and_clear_updates_columns(self):
+        self.author1.books.add(self.book)
+        self.assertEqual(
+            Book.objects.get(isbn=123456789).display_full_names, 'First Author'
+        )
+        self.author1.books.clear()
+        self.assertEqual(
+            Book.objects.get(isbn=123456789).display_full_names, ''
+        )
+
+    def test_stale_instance_save_does_not_clobber_columns(self):
+        book = Book.objects.get(isbn=123456789)
+        self.author1.books.add(self.book)
+        book.save()
+        self.assertEqual(
+            Book.objects.get(isbn=123456789).display_full_names, 'First Author'
+        )
+
+    def test_renaming_author_and_genre_updates_columns(self):
+        self.book.authors.add(self.author1)
+        self.book.genre.add(self.genre)
+        self.author1.first_name = 'Renamed'
+        self.author1.save()
+        self.genre.name = 'Renamed Genre'
+        self.genre.save()
+        book = Book.objects.get(isbn=123456789)
+        self.assertEqual(book.display_full_names, 'Renamed Author')
+        self.assertEqual(book.display_genres, 'Renamed Genre')
+
+    def test_deleting_author_updates_columns(self):
+        self.book.authors.add(self.author1, self.author2)
+        self.author2.delete()
+        self.assertEqual(
+            Book.objects.get(isbn=123456789).display_full_names, 'First Author'
+        )
+        self.assertEqual(
+            Book.objects.get(isbn=123456789).authors_links, [[self.author1.pk, 'First Author']]
+        )
+
+    def test_bulk_refresh(self):
+        self.book.authors.add(self.author1)
+        Book.objects.update(authors_display='', genres_display='')
+        self.assertEqual(Book.objects.all().refresh_display_columns(), 1)
+        self.assertEqual(
+            Book.objects.get(isbn=123456789).display_full_names, 'First Author'
+        )
+
+
 class TestBookInstanceModel(TestCase):
 
     @classmethod
@@ -318,6 +405,47 @@ class TestBookInstanceModel(TestCase):
         self.assertFalse(self.book_instance.is_overdue)
     
 
+class TestBookInstanceOverdue(TestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        book = Book.objects.create(title='Test Book', isbn=1)
+        cls.borrower = User.objects.create(username='testuser')
+        now = timezone.localtime()
+        cls.late = BookInstance.objects.create(
+            book=book, borrower=cls.borrower, status='o', due_back=now - timedelta(days=3))
+        cls.due_today = BookInstance.objects.create(
+            book=book, borrower=cls.borrower, status='o', due_back=now)
+        cls.returned_late = BookInstance.objects.create(
+            book=book, status='a', due_back=now - timedelta(days=10))
+        cls.no_due_date = BookInstance.objects.create(book=book, status='a')
+
+    def test_overdue_only_lists_loans_due_before_today(self):
+        self.assertEqual(list(BookInstance.objects.overdue()), [self.late])
+
+    def test_annotation_matches_property(self):
+        for copy in BookInstance.objects.with_overdue():
+            fresh = BookInstance.objects.get(pk=copy.pk)
+            self.assertEqual(copy.is_overdue, fresh.is_overdue)
+            self.assertEqual(copy.days_overdue, fresh.days_overdue)
+
+    def test_days_overdue(self):
+        annotated = BookInstance.objects.with_overdue().in_bulk()
+        self.assertEqual(annotated[self.late.pk].days_overdue, 3)
+        self.assertEqual(annotated[self.late.pk].overdue_by, timedelta(days=3))
+        self.assertEqual(annotated[self.due_today.pk].days_overdue, 0)
+        self.assertIsNone(annotated[self.no_due_date.pk].overdue_by)
+        self.assertFalse(annotated[self.no_due_date.pk].overdue)
+
+    def test_overdue_loans_can_be_counted_in_sql(self):
+        self.assertEqual(BookInstance.objects.with_overdue().filter(overdue=True).count(), 2)
+        with self.assertNumQueries(1):
+            members = list(BookInstance.objects.overdue_by_member())
+        self.assertEqual(len(members), 1)
+        self.assertEqual(members[0]['borrower__username'], 'testuser')
+        self.assertEqual(members[0]['num_overdue'], 1)
+
+
 class TestGenreModel(TestCase):
 
     @classmethod
@@ -0,0 +1,70 @@
+from django.test import TestCase
+
+from catalog.models import *
+from catalog.search import *
+
+
+def search_titles(text):
+    results = BookSearchResults(text)
+    return [book.title for book in results[0:results.count()]]
+
+
+class TestBuildMatchQuery(TestCase):
+
+    def test_words_are_quoted_and_last_is_prefix(self):
+        self.assertEqual(build_match_query('dragon king'), '"dragon" "king"*')
+
+    def test_operators_and_quotes_are_inert(self):
+        self.assertEqual(build_match_query('"NOT" OR (x'), '"NOT" "OR" "x"*')
+
+    def test_empty_query(self):
+        self.assertEqual(build_match_query('  "*  '), '')
+
+
+class TestSearchIndex(TestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.author = Author.objects.create(first_name='Malcolm', last_name='Gladwell')
+        cls.blink = Book.objects.create(
+            isbn=1, title='Blink',
+            summary='The power of thinking without thinking',
+        )
+        cls.blink.authors.add(cls.author)
+        cls.outliers = Book.objects.create(
+            isbn=2, title='Outliers',
+            summary='The story of success, and a blink of luck',
+        )
+
+    def test_matches_title_summary_and_author(self):
+        self.assertEqual(search_titles('thinking'), ['Blink'])
+        self.assertEqual(search_titles('gladwell'), ['Blink'])
+        self.assertEqual(search_titles('success'), ['Outliers'])
+
+    def test_title_match_ranks_first(self):
+        self.assertEqual(search_titles('blink'), ['Blink', 'Outliers'])
+
+    def test_prefix_match_on_last_word(self):
+        self.assertEqual(search_titles('outl'), ['Outliers'])
+
+    def test_book_updates_are_indexed(self):
+        self.outliers.title = 'Tipping Point'
+        self.outliers.save()
+        self.assertEqual(search_titles('tipping'), ['Tipping Point'])
+        self.assertEqual(search_titles('outliers'), [])
+
+    def test_author_changes_are_indexed(self):
+        self.outliers.authors.add(self.author)
+        self.assertEqual(search_titles('gladwell'), ['Blink', 'Outliers'])
+        self.author.last_name = 'Renamed'
+        self.author.save()
+        self.assertEqual(search_titles('gladwell'), [])
+        self.assertEqual(len(search_titles('renamed')), 2)
+
+    def test_deleted_books_are_removed(self):
+        self.outliers.delete()
+        self.assertEqual(search_titles('success'), [])
+
+    def test_rebuild_index(self):
+        self.assertEqual(rebuild_index(batch_size=1), 2)
+        self.assertEqual(search_titles('gladwell'), ['Blink'])
@@ -0,0 +1,72 @@
+from django.core.cache import cache
+from django.test import TestCase
+
+from catalog.models import *
+from catalog.stats import *
+from catalog.stats import _lock_key
+
+
+class TestLibraryStats(TestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        Author.objects.create(first_name='Test', last_name='Author')
+        Genre.objects.create(name='Test Genre')
+        Book.objects.create(isbn=1, title='Test Book')
+
+    def setUp(self):
+        cache.clear()
+
+    def test_counts_in_single_query(self):
+        with self.assertNumQueries(1):
+            stats = count_library()
+        self.assertEqual(stats, {
+            'num_books': 1,
+            'num_authors': 1,
+            'num_genres': 1,
+            'num_language': 0,
+        })
+
+    def test_cached_stats_skip_counting(self):
+        get_library_stats()
+        with self.assertNumQueries(0):
+            stats = get_library_stats()
+        self.assertEqual(stats['num_books'], 1)
+
+    def test_create_and_delete_invalidate(self):
+        self.assertEqual(get_library_stats()['num_language'], 0)
+        with self.captureOnCommitCallbacks(execute=True):
+            language = Language.objects.create(name='Test Language')
+        self.assertEqual(get_library_stats()['num_language'], 1)
+        with self.captureOnCommitCallbacks(execute=True):
+            language.delete()
+        self.assertEqual(get_library_stats()['num_language'], 0)
+
+    def test_invalidation_waits_for_commit(self):
+        get_library_stats()
+        with self.captureOnCommitCallbacks() as callbacks:
+            Language.objects.create(name='Test Language')
+            # Until the transaction commits, other requests can't see the
+            # new row, so the cached counts must stay.
+            self.assertEqual(get_library_stats()['num_language'], 0)
+        for callback in callbacks:
+            callback()
+        self.assertEqual(get_library_stats()['num_language'], 1)
+
+    def test_update_does_not_invalidate(self):
+        get_library_stats()
+        genre = Genre.objects.get(name='Test Genre')
+        genre.name = 'Renamed Genre'
+        genre.save()
+        with self.assertNumQueries(0):
+            get_library_stats()
+
+    def test_concurrent_miss_is_served_stale_counts(self):
+        get_library_stats()
+        with self.captureOnCommitCallbacks(execute=True):
+            Genre.objects.create(name='Another Genre')
+        # Another request is already recomputing the new version.
+        cache.add(_lock_key(cache.get(VERSION_KEY)), True)
+        with self.assertNumQueries(0):
+            stats = get_library_stats()
+        self.assertEqual(stats['num_genres'], 1)
@@ -1,10 +1,18 @@
+import json
+
+from django.core.cache import cache
+from django.db import connection
 from django.test import TestCase, Client
+from django.test.utils import CaptureQueriesContext
 from django.urls import reverse
 
 from catalog.models import *
-from django.contrib.auth.models import Permission
+from django.contrib.auth.models import Group, Permission
 
 class TestIndexView(TestCase):
+
+    def setUp(self):
+        cache.clear()
     
     def test_empty_library(self):
         resp = self.client.get(reverse('catalog:index'))
@@ -15,7 +23,27 @@ class TestIndexView(TestCase):
         self.assertEqual(resp.context['num_genres'], 0)
         self.assertEqual(resp.context['num_language'], 0)
 
-    #TODO: add populated library test
+    def test_populated_library(self):
+        author = Author.objects.create(first_name='Test', last_name='Author')
+        Genre.objects.create(name='Test Genre')
+        Language.objects.create(name='Test Language')
+        for num in range(3):
+            book = Book.objects.create(isbn=num, title=f'Test Book {num}')
+            book.authors.add(author)
+        resp = self.client.get(reverse('catalog:index'))
+        self.assertEqual(resp.status_code, 200)
+        self.assertEqual(resp.context['num_books'], 3)
+        self.assertEqual(resp.context['num_authors'], 1)
+        self.assertEqual(resp.context['num_genres'], 1)
+        self.assertEqual(resp.context['num_language'], 1)
+
+    def test_counts_refresh_after_new_book(self):
+        resp = self.client.get(reverse('catalog:index'))
+        self.assertEqual(resp.context['num_books'], 0)
+        with self.captureOnCommitCallbacks(execute=True):
+            Book.objects.create(isbn=1, title='Test Book')
+        resp = self.client.get(reverse('catalog:index'))
+        self.assertEqual(resp.context['num_books'], 1)
 
 
 class TestLoginRedirect(TestCase):
@@ -79,6 +107,7 @@ class TestAuthorListView(TestCase):
         """Set up test data for each test in the class.
         Runs once for every test method in the class.
         """
+        cache.clear()
         self.client.login(
             username = 'test_user',
             password = 'fortesting',
@@ -115,6 +144,32 @@ class TestAuthorListView(TestCase):
             len(resp.context['list_of_all_authors']), 3
         )
 
+    def test_cursor_pages_break_ties_on_nullable_columns(self):
+        # Same names, some without a birth date, spread over a page break.
+        for num in range(8):
+            Author.objects.create(
+                first_name='Test',
+                last_name='Author1',
+                birth_date=date(1900, 1, num + 1) if num % 2 else None,
+            )
+        expected = list(Author.objects.values_list('pk', flat=True))
+        seen = []
+        resp = self.client.get(reverse('catalog:authors'))
+        while True:
+            seen += [author.pk for author in resp.context['list_of_all_authors']]
+            page = resp.context['page_obj']
+            if not page.has_next():
+                break
+            resp = self.client.get(reverse('catalog:authors'), {'cursor': page.next_cursor})
+        self.assertEqual(sorted(seen), sorted(expected))
+        self.assertEqual(len(seen), len(set(seen)))
+        authors = Author.objects.in_bulk(seen)
+        keys = [
+            (a.last_name, a.first_name, a.birth_date is not None, a.birth_date or date.min)
+            for a in (authors[pk] for pk in seen)
+        ]
+        self.assertEqual(keys, sorted(keys))
+
 
 class TestBookListView(TestCase):
 
@@ -151,6 +206,7 @@ class TestBookListView(TestCase):
         test_user.save()
 
     def setUp(self):
+        cache.clear()
         self.client.login(
             username='test_user',
             password='fortesting'
@@ -189,6 +245,274 @@ class TestBookListView(TestCase):
             5
         )
 
+    # Session, user, the two navbar permission lookups and books. Keyset
+    # pagination needs no page count, and authors and genres come from
+    # the cached display columns.
+    PAGE_QUERY_BUDGET = 5
+    # Once the user's navbar fragment is cached, its permission lookups go.
+    CACHED_PAGE_QUERY_BUDGET = 3
+
+    def test_page_query_count_is_fixed(self):
+        with self.assertNumQueries(self.PAGE_QUERY_BUDGET):
+            resp = self.client.get(reverse('catalog:books'))
+        self.assertEqual(resp.status_code, 200)
+        with self.assertNumQueries(self.CACHED_PAGE_QUERY_BUDGET):
+            resp = self.client.get(reverse('catalog:books'))
+        self.assertEqual(resp.status_code, 200)
+
+    def test_page_query_count_independent_of_authors_and_genres(self):
+        for num in range(5):
+            author = Author.objects.create(
+                first_name='Extra',
+                last_name=f'Author{num}',
+            )
+            genre = Genre.objects.create(
+                name=f'Extra Genre {num}',
+            )
+            for book in Book.objects.all():
+                book.authors.add(author)
+                book.genre.add(genre)
+
+        with self.assertNumQueries(self.PAGE_QUERY_BUDGET):
+            resp = self.client.get(reverse('catalog:books'))
+        self.assertEqual(resp.status_code, 200)
+        author = Author.objects.get(last_name='Author4')
+        self.assertContains(resp, f'<a href="{author.get_absolute_url()}">Extra Author4</a>', html=True)
+        self.assertContains(resp, 'Extra Genre 4')
+
+        cursor = resp.context['page_obj'].next_cursor
+        with self.assertNumQueries(self.CACHED_PAGE_QUERY_BUDGET):
+            resp = self.client.get(reverse('catalog:books'), {'cursor': cursor})
+        self.assertEqual(resp.status_code, 200)
+        self.assertEqual(len(resp.context['list_of_all_books']), 5)
+
+    def test_cursor_pages_walk_all_books_in_order(self):
+        titles = []
+        resp = self.client.get(reverse('catalog:books'))
+        while True:
+            titles += [book.title for book in resp.context['list_of_all_books']]
+            page = resp.context['page_obj']
+            if not page.has_next():
+                break
+            resp = self.client.get(reverse('catalog:books'), {'cursor': page.next_cursor})
+        self.assertEqual(
+            titles, list(Book.objects.order_by('title').values_list('title', flat=True))
+        )
+
+    def test_previous_cursor_returns_previous_page(self):
+        first = self.client.get(reverse('catalog:books'))
+        second = self.client.get(
+            reverse('catalog:books'), {'cursor': first.context['page_obj'].next_cursor}
+        )
+        self.assertTrue(second.context['page_obj'].has_previous())
+        self.assertContains(second, '?cursor=')
+        back = self.client.get(
+            reverse('catalog:books'), {'cursor': second.context['page_obj'].previous_cursor}
+        )
+        self.assertEqual(
+            list(back.context['list_of_all_books']),
+            list(first.context['list_of_all_books'])
+        )
+        self.assertFalse(back.context['page_obj'].has_previous())
+        self.assertTrue(back.context['page_obj'].has_next())
+
+    def test_invalid_cursor_is_404(self):
+        resp = self.client.get(reverse('catalog:books'), {'cursor': 'not-a-cursor'})
+        self.assertEqual(resp.status_code, 404)
+
+
+class TestFragmentCaching(TestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = User.objects.create_user(username='test_user', password='fortesting')
+        cls.author = Author.objects.create(first_name='John', last_name='Doe')
+        cls.book = Book.objects.create(title='Test Title', isbn=1)
+        cls.book.authors.add(cls.author)
+
+    def setUp(self):
+        cache.clear()
+        self.client.login(username='test_user', password='fortesting')
+
+    def test_navbar_follows_permission_changes(self):
+        self.assertNotContains(self.client.get(reverse('catalog:books')), 'Books on Loan')
+        permission = Permission.objects.get(codename='can_mark_returned')
+        with self.captureOnCommitCallbacks(execute=True):
+            self.user.user_permissions.add(permission)
+        self.assertContains(self.client.get(reverse('catalog:books')), 'Books on Loan')
+        with self.captureOnCommitCallbacks(execute=True):
+            permission.user_set.remove(self.user)
+        self.assertNotContains(self.client.get(reverse('catalog:books')), 'Books on Loan')
+
+    def test_navbar_follows_group_permission_changes(self):
+        group = Group.objects.create(name='Librarians')
+        with self.captureOnCommitCallbacks(execute=True):
+            self.user.groups.add(group)
+        self.assertNotContains(self.client.get(reverse('catalog:books')), 'Books on Loan')
+        with self.captureOnCommitCallbacks(execute=True):
+            group.permissions.add(Permission.objects.get(codename='can_mark_returned'))
+        self.assertContains(self.client.get(reverse('catalog:books')), 'Books on Loan')
+
+    def test_navbar_login_links_are_not_cached(self):
+        self.client.get(reverse('catalog:books'))
+        resp = self.client.get(reverse('catalog:authors'))
+        self.assertContains(resp, 'User: test_user')
+        self.assertContains(resp, f"?next={reverse('catalog:authors')}")
+
+    def test_rows_follow_model_changes(self):
+        self.assertContains(self.client.get(reverse('catalog:books')), 'John Doe')
+        self.author.first_name = 'Jane'
+        self.book.title = 'Renamed Title'
+        with self.captureOnCommitCallbacks(execute=True):
+            self.author.save()
+            self.book.save()
+        resp = self.client.get(reverse('catalog:books'))
+        self.assertContains(resp, 'Jane Doe')
+        self.assertContains(resp, 'Renamed Title')
+        self.assertContains(self.client.get(reverse('catalog:authors')), 'Jane Doe')
+
+    def test_rows_are_served_from_cache(self):
+        self.client.get(reverse('catalog:books'))
+        # update() sends no signals, so the cached row is not invalidated.
+        Book.objects.filter(pk=self.book.pk).update(title='Changed Behind The Cache')
+        self.assertContains(self.client.get(reverse('catalog:books')), 'Test Title')
+
+    def test_fragments_are_dropped_on_commit(self):
+        self.client.get(reverse('catalog:books'))
+        self.book.title = 'Renamed Title'
+        with self.captureOnCommitCallbacks() as callbacks:
+            self.book.save()
+        # The cached row is kept until the commit.
+        self.assertNotContains(self.client.get(reverse('catalog:books')), 'Renamed Title')
+        for callback in callbacks:
+            callback()
+        self.assertContains(self.client.get(reverse('catalog:books')), 'Renamed Title')
+
+        permission = Permission.objects.get(codename='can_mark_returned')
+        with self.captureOnCommitCallbacks() as callbacks:
+            self.user.user_permissions.add(permission)
+        self.assertNotContains(self.client.get(reverse('catalog:books')), 'Books on Loan')
+        for callback in callbacks:
+            callback()
+        self.assertContains(self.client.get(reverse('catalog:books')), 'Books on Loan')
+
+
+class TestCachedListPages(TestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        User.objects.create_user(username='test_user', password='fortesting')
+        Genre.objects.create(name='Fantasy')
+        Language.objects.create(name='English')
+
+    def setUp(self):
+        cache.clear()
+
+    def test_anonymous_pages_are_served_from_cache(self):
+        for name in ('genres', 'languages'):
+            first = self.client.get(reverse(f'catalog:{name}'))
+            with self.assertNumQueries(0):
+                resp = self.client.get(reverse(f'catalog:{name}'))
+            self.assertEqual(resp.status_code, 200)
+            self.assertEqual(resp.content, first.content)
+            self.assertIn('public', resp['Cache-Control'])
+            self.assertIn('max-age=600', resp['Cache-Control'])
+            self.assertIn('Cookie', resp['Vary'])
+
+    def test_saving_or_deleting_rows_retires_the_page(self):
+        self.client.get(reverse('catalog:genres'))
+        with self.captureOnCommitCallbacks(execute=True):
+            genre = Genre.objects.create(name='Poetry')
+        self.assertContains(self.client.get(reverse('catalog:genres')), 'Poetry')
+        genre.name = 'Epic Poetry'
+        with self.captureOnCommitCallbacks(execute=True):
+            genre.save()
+        self.assertContains(self.client.get(reverse('catalog:genres')), 'Epic Poetry')
+        with self.captureOnCommitCallbacks(execute=True):
+            genre.delete()
+        self.assertNotContains(self.client.get(reverse('catalog:genres')), 'Poetry')
+
+        self.client.get(reverse('catalog:languages'))
+        with self.captureOnCommitCallbacks(execute=True):
+            Language.objects.create(name='Italian')
+        self.assertContains(self.client.get(reverse('catalog:languages')), 'Italian')
+
+    def test_pages_are_retired_on_commit(self):
+        self.client.get(reverse('catalog:genres'))
+        with self.captureOnCommitCallbacks() as callbacks:
+            Genre.objects.create(name='Poetry')
+            # Other requests can't see the new row before the commit.
+            self.assertNotContains(self.client.get(reverse('catalog:genres')), 'Poetry')
+        for callback in callbacks:
+            callback()
+        self.assertContains(self.client.get(reverse('catalog:genres')), 'Poetry')
+
+    def test_signed_in_users_get_their_own_page(self):
+        self.client.get(reverse('catalog:genres'))
+        self.client.login(username='test_user', password='fortesting')
+        resp = self.client.get(reverse('catalog:genres'))
+        self.assertContains(resp, 'User: test_user')
+        self.assertIn('private', resp['Cache-Control'])
+        self.assertNotIn('public', resp['Cache-Control'])
+
+        # Rows come from the cache: only the session and the user are read.
+        Genre.objects.filter(name='Fantasy').update(name='Renamed behind the cache')
+        with self.assertNumQueries(2):
+            resp = self.client.get(reverse('catalog:genres'))
+        self.assertContains(resp, 'Fantasy')
+
+
+class TestSearchView(TestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        author = Author.objects.create(first_name='Dante', last_name='Alighieri')
+        for num in range(12):
+            book = Book.objects.create(
+                isbn=num,
+                title=f'Inferno Volume {num}',
+                summary='A journey through the nine circles of hell',
+            )
+            book.authors.add(author)
+        Book.objects.create(isbn=100, title='Paradiso', summary='Heaven')
+
+        User.objects.create_user(username='test_user', password='fortesting')
+
+    def setUp(self):
+        self.client.login(username='test_user', password='fortesting')
+
+    def test_page_redirects_when_not_logged_in(self):
+        self.client.logout()
+        resp = self.client.get(reverse('catalog:search'))
+        self.assertEqual(resp.status_code, 302)
+
+    def test_page_template_is_correct(self):
+        resp = self.client.get(reverse('catalog:search'))
+        self.assertEqual(resp.status_code, 200)
+        self.assertTemplateUsed(resp, 'catalog/search.html')
+
+    def test_results_are_paginated(self):
+        resp = self.client.get(reverse('catalog:search'), {'q': 'alighieri'})
+        self.assertEqual(resp.status_code, 200)
+        self.assertTrue(resp.context['is_paginated'])
+        self.assertEqual(resp.context['page_obj'].paginator.count, 12)
+        self.assertEqual(len(resp.context['search_results']), 10)
+        resp = self.client.get(reverse('catalog:search'), {'q': 'alighieri', 'page': 2})
+        self.assertEqual(len(resp.context['search_results']), 2)
+
+    def test_no_matches(self):
+        resp = self.client.get(reverse('catalog:search'), {'q': 'purgatorio'})
+        self.assertEqual(resp.status_code, 200)
+        self.assertContains(resp, 'No books matched')
+
+    def test_query_syntax_does_not_error(self):
+        resp = self.client.get(reverse('catalog:search'), {'q': '"heaven ('})
+        self.assertEqual(resp.status_code, 200)
+        self.assertEqual(
+            [book.title for book in resp.context['search_results']], ['Paradiso']
+        )
+
+
 class TestBookDetailView(TestCase):
 
     @classmethod
@@ -211,6 +535,89 @@ class TestBookDetailView(TestCase):
         self.fail('Test note yet written.')
 
 
+class TestConditionalDetailViews(TestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        User.objects.create_user(username='test_user', password='fortesting')
+        User.objects.create_user(username='other_user', password='fortesting')
+        cls.language = Language.objects.create(name='English')
+        cls.author = Author.objects.create(first_name='Dante', last_name='Alighieri')
+        cls.book = Book.objects.create(title='Inferno', isbn=1, language=cls.language)
+        cls.book.authors.add(cls.author)
+        cls.copy = BookInstance.objects.create(book=cls.book, status='a')
+
+    def setUp(self):
+        self.client.login(username='test_user', password='fortesting')
+
+    def book_url(self):
+        return reverse('catalog:book-detail-view', args=[self.book.pk])
+
+    def author_url(self):
+        return reverse('catalog:author-detail-view', args=[self.author.pk])
+
+    def etag(self, url):
+        return self.client.get(url)['ETag']
+
+    def test_validators_and_cache_headers(self):
+        for url in (self.book_url(), self.author_url()):
+            resp = self.client.get(url)
+            self.assertEqual(resp.status_code, 200)
+            self.assertTrue(resp.has_header('ETag'))
+            self.assertTrue(resp.has_header('Last-Modified'))
+            self.assertIn('private', resp['Cache-Control'])
+            self.assertIn('no-cache', resp['Cache-Control'])
+            self.assertIn('Cookie', resp['Vary'])
+
+    def test_matching_etag_gets_not_modified(self):
+        for url in (self.book_url(), self.author_url()):
+            etag = self.etag(url)
+            # session, user, then `updated_at` alone: no related rows, no rendering.
+            with self.assertNumQueries(3):
+                resp = self.client.get(url, HTTP_IF_NONE_MATCH=etag)
+            self.assertEqual(resp.status_code, 304)
+            self.assertEqual(resp.content, b'')
+            self.assertEqual(resp['ETag'], etag)
+
+    def test_matching_last_modified_gets_not_modified(self):
+        last_modified = self.client.get(self.book_url())['Last-Modified']
+        resp = self.client.get(self.book_url(), HTTP_IF_MODIFIED_SINCE=last_modified)
+        self.assertEqual(resp.status_code, 304)
+
+    def test_etag_is_per_user(self):
+        etag = self.etag(self.book_url())
+        self.client.login(username='other_user', password='fortesting')
+        resp = self.client.get(self.book_url(), HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(resp.status_code, 200)
+
+    def test_changes_shown_on_the_book_page_change_its_etag(self):
+        changes = [
+            lambda: BookInstance.objects.filter(pk=self.copy.pk).check_out(User.objects.first()),
+            lambda: BookInstance.objects.create(book=self.book, status='m'),
+            lambda: Language.objects.filter(pk=self.language.pk).get().save(),
+            lambda: Author.objects.get(pk=self.author.pk).save(),
+            lambda: self.book.genre.add(Genre.objects.create(name='Poetry')),
+        ]
+        for change in changes:
+            etag = self.etag(self.book_url())
+            change()
+            resp = self.client.get(self.book_url(), HTTP_IF_NONE_MATCH=etag)
+            self.assertEqual(resp.status_code, 200)
+
+    def test_changes_to_an_authors_books_change_their_etag(self):
+        changes = [
+            lambda: Book.objects.get(pk=self.book.pk).save(),
+            lambda: Book.objects.create(title='Purgatorio', isbn=2).authors.add(self.author),
+            lambda: Book.objects.get(pk=2).delete(),
+            lambda: self.book.authors.clear(),
+        ]
+        for change in changes:
+            etag = self.etag(self.author_url())
+            change()
+            resp = self.client.get(self.author_url(), HTTP_IF_NONE_MATCH=etag)
+            self.assertEqual(resp.status_code, 200)
+
+
 class TestLoanedBooksByUserListView(TestCase):
 
     @classmethod
@@ -333,6 +740,17 @@ class TestLoanedBooksByUserListView(TestCase):
         user_1_books = resp.context['bookinstance_list']
         self.assertTrue(user_2_book not in user_1_books)  
 
+    def test_rows_do_not_query_their_book(self):
+        queries = []
+        for username, loans in (('test_user1', 2), ('test_user2', 1)):
+            self.client.login(username=username, password='fortesting')
+            self.client.get(reverse('catalog:my-borrowed'))  # fills the navbar cache
+            with CaptureQueriesContext(connection) as page:
+                resp = self.client.get(reverse('catalog:my-borrowed'))
+            self.assertEqual(len(resp.context['bookinstance_list']), loans)
+            queries.append(len(page))
+        self.assertEqual(queries[0], queries[1])
+
 
 class TestAllLoandedBooksLibrarianListView(TestCase):
 
@@ -452,7 +870,7 @@ class TestAllLoandedBooksLibrarianListView(TestCase):
                                + '?page=2')
         self.assertEqual(resp.status_code, 200)
         self.assertEqual(str(resp.context['user']), 'test_librarian')
-        bookinstance_list = bookinstance_list | resp.context['bookinstance_list']
+        bookinstance_list = list(bookinstance_list) + list(resp.context['bookinstance_list'])
         last_date = 0
         for bookinstance in bookinstance_list:
             if last_date == 0:
@@ -461,6 +879,217 @@ class TestAllLoandedBooksLibrarianListView(TestCase):
                 self.assertTrue(last_date <= bookinstance.due_back)
                 last_date = bookinstance.due_back
 
+    def test_rows_do_not_query_their_book_or_borrower(self):
+        self.client.get(reverse('catalog:books-on-loan'))  # fills the navbar cache
+        with CaptureQueriesContext(connection) as full_page:
+            resp = self.client.get(reverse('catalog:books-on-loan'))
+        self.assertEqual(len(resp.context['bookinstance_list']), 20)
+        BookInstance.objects.filter(due_back__gt=timezone.localtime() + timedelta(days=2)).delete()
+        with CaptureQueriesContext(connection) as short_page:
+            resp = self.client.get(reverse('catalog:books-on-loan'))
+        self.assertEqual(len(resp.context['bookinstance_list']), 2)
+        self.assertEqual(len(full_page), len(short_page))
+
+
+class TestOverdueReportView(TestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        members = [
+            User.objects.create_user(username=f'member{num}', password='fortesting')
+            for num in range(3)
+        ]
+        librarian = User.objects.create_user(username='librarian', password='fortesting')
+        librarian.user_permissions.add(Permission.objects.get(codename='can_mark_returned'))
+
+        now = timezone.localtime()
+        overdue = {'member0': [2], 'member1': [5, 1, 1], 'member2': []}
+        isbn = 0
+        for member in members:
+            for days in overdue[member.username]:
+                isbn += 1
+                book = Book.objects.create(title=f'Late Book {isbn}', isbn=isbn)
+                BookInstance.objects.create(
+                    book=book, status='o', borrower=member, due_back=now - timedelta(days=days))
+            isbn += 1
+            book = Book.objects.create(title=f'Current Book {isbn}', isbn=isbn)
+            BookInstance.objects.create(
+                book=book, status='o', borrower=member, due_back=now + timedelta(days=7))
+
+    def setUp(self):
+        self.client.login(username='librarian', password='fortesting')
+
+    def test_counts_overdue_books_per_member(self):
+        resp = self.client.get(reverse('catalog:librarian-overdue'))
+        self.assertEqual(resp.status_code, 200)
+        self.assertTemplateUsed(resp, 'catalog/librarian_overdue_report.html')
+        self.assertEqual(resp.context['total_overdue'], 4)
+        rows = [
+            (member['borrower__username'], member['num_overdue'], member['days_overdue'])
+            for member in resp.context['overdue_members']
+        ]
+        self.assertEqual(rows, [('member1', 3, 5), ('member0', 1, 2)])
+
+    def test_forbidden_to_regular_members(self):
+        self.client.login(username='member0', password='fortesting')
+        resp = self.client.get(reverse('catalog:librarian-overdue'))
+        self.assertEqual(resp.status_code, 403)
+
+    def test_on_loan_list_is_annotated(self):
+        resp = self.client.get(reverse('catalog:books-on-loan'))
+        overdue = [copy for copy in resp.context['bookinstance_list'] if copy.overdue]
+        self.assertEqual(len(overdue), 4)
+        self.assertContains(resp, 'text-danger', count=4)
+
+
+class TestCirculationViews(TestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.member = User.objects.create_user(username='member', password='fortesting')
+        librarian = User.objects.create_user(username='librarian', password='fortesting')
+        librarian.user_permissions.add(Permission.objects.get(codename='can_mark_returned'))
+        book = Book.objects.create(title='Test Book', isbn=1)
+        cls.available = [BookInstance.objects.create(book=book, status='a') for _ in range(10)]
+        cls.reserved = BookInstance.objects.create(book=book, status='r')
+
+    def setUp(self):
+        self.client.login(username='librarian', password='fortesting')
+
+    def post(self, name, payload):
+        return self.client.post(reverse(name), json.dumps(payload), content_type='application/json')
+
+    def copy_ids(self, copies):
+        return [str(copy.copy_id) for copy in copies]
+
+    def test_checkout_loans_available_copies(self):
+        missing = '00000000-0000-0000-0000-000000000000'
+        copy_ids = self.copy_ids(self.available[:3] + [self.reserved]) + [missing]
+        resp = self.post('catalog:librarian-checkout', {
+            'copy_ids': copy_ids, 'borrower': 'member', 'period': 7,
+        })
+        self.assertEqual(resp.status_code, 200)
+        data = resp.json()
+        self.assertEqual(data['checked_out'], 3)
+        self.assertEqual(
+            [result['result'] for result in data['results']],
+            ['checked_out'] * 3 + ['unavailable', 'not_found'],
+        )
+        self.assertEqual([result['copy_id'] for result in data['results']], copy_ids)
+
+        loaned = BookInstance.objects.borrowed_by(self.member)
+        self.assertEqual(loaned.count(), 3)
+        for copy in loaned:
+            self.assertEqual(copy.due_back - copy.loaned_on, timedelta(days=7))
+
+    def test_checkout_is_not_repeated(self):
+        payload = {'copy_ids': self.copy_ids(self.available[:2]), 'borrower': 'member'}
+        self.post('catalog:librarian-checkout', payload)
+        data = self.post('catalog:librarian-checkout', payload).json()
+        self.assertEqual(data['checked_out'], 0)
+        self.assertEqual({result['status'] for result in data['results']}, {'o'})
+
+    def test_checkin_returns_loaned_copies(self):
+        self.post('catalog:librarian-checkout', {
+            'copy_ids': self.copy_ids(self.available[:4]), 'borrower': 'member',
+        })
+        resp = self.post('catalog:librarian-checkin', {
+            'copy_ids': self.copy_ids(self.available[2:6]),
+        })
+        data = resp.json()
+        self.assertEqual(data['checked_in'], 2)
+        self.assertEqual(
+            [result['result'] for result in data['results']],
+            ['checked_in', 'checked_in', 'not_on_loan', 'not_on_loan'],
+        )
+        self.assertEqual(BookInstance.objects.borrowed_by(self.member).count(), 2)
+        returned = BookInstance.objects.get(pk=self.available[2].pk)
+        self.assertEqual(returned.status, 'a')
+        self.assertIsNone(returned.borrower)
+        self.assertIsNone(returned.due_back)
+
+    def test_query_count_does_not_grow_with_batch_size(self):
+        # session, user, 2 permission queries, then the borrower plus an UPDATE,
+        # the books' `updated_at` and a read-back (a locking UPDATE, a read and
+        # two UPDATEs for check-in) inside a savepoint.
+        for size in (1, 10):
+            copy_ids = self.copy_ids(self.available[:size])
+            with self.assertNumQueries(10):
+                self.post('catalog:librarian-checkout', {'copy_ids': copy_ids, 'borrower': 'member'})
+            with self.assertNumQueries(10):
+                self.post('catalog:librarian-checkin', {'copy_ids': copy_ids})
+
+    def test_bad_requests(self):
+        cases = [
+            {'copy_ids': 'not a list', 'borrower': 'member'},
+            {'copy_ids': [], 'borrower': 'member'},
+            {'copy_ids': ['not-a-uuid'], 'borrower': 'member'},
+            {'copy_ids': self.copy_ids(self.available[:1]), 'borrower': 'nobody'},
+            {'copy_ids': self.copy_ids(self.available[:1]), 'borrower': 'member', 'period': 0},
+        ]
+        for payload in cases:
+            resp = self.post('catalog:librarian-checkout', payload)
+            self.assertEqual(resp.status_code, 400, payload)
+            self.assertIn('error', resp.json())
+        self.assertFalse(BookInstance.objects.on_loan().exists())
+
+    def test_only_post_by_librarians(self):
+        resp = self.client.get(reverse('catalog:librarian-checkin'))
+        self.assertEqual(resp.status_code, 405)
+        self.client.login(username='member', password='fortesting')
+        resp = self.post('catalog:librarian-checkin', {'copy_ids': self.copy_ids(self.available[:1])})
+        self.assertEqual(resp.status_code, 403)
+
+
+class TestExportView(TestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        member = User.objects.create_user(username='member', password='fortesting')
+        librarian = User.objects.create_user(username='librarian', password='fortesting')
+        librarian.user_permissions.add(Permission.objects.get(codename='can_mark_returned'))
+
+        for num in range(1, 4):
+            book = Book.objects.create(title=f'Test Book {num}', isbn=num)
+            BookInstance.objects.create(
+                book=book,
+                status='o' if num < 3 else 'a',
+                due_back=timezone.localtime() + timedelta(days=num),
+                borrower=member if num < 3 else None,
+            )
+
+    def setUp(self):
+        self.client.login(username='librarian', password='fortesting')
+
+    def test_loans_csv_is_streamed(self):
+        resp = self.client.get(reverse('catalog:librarian-export', args=['loans', 'csv']))
+        self.assertEqual(resp.status_code, 200)
+        self.assertTrue(resp.streaming)
+        self.assertEqual(resp['Content-Type'], 'text/csv')
+        self.assertIn('attachment; filename="loans.csv"', resp['Content-Disposition'])
+        lines = b''.join(resp.streaming_content).decode().splitlines()
+        self.assertEqual(lines[0], 'copy_id,book_id,book__title,borrower__username,loaned_on,due_back')
+        self.assertEqual(len(lines), 3)
+        self.assertIn('Test Book 1', lines[1])
+        self.assertIn('member', lines[1])
+
+    def test_books_jsonl(self):
+        resp = self.client.get(reverse('catalog:librarian-export', args=['books', 'jsonl']))
+        self.assertEqual(resp.status_code, 200)
+        rows = [json.loads(line) for line in b''.join(resp.streaming_content).decode().splitlines()]
+        self.assertEqual([row['title'] for row in rows], ['Test Book 1', 'Test Book 2', 'Test Book 3'])
+
+    def test_unknown_export_is_404(self):
+        resp = self.client.get(reverse('catalog:librarian-export', args=['users', 'csv']))
+        self.assertEqual(resp.status_code, 404)
+        resp = self.client.get(reverse('catalog:librarian-export', args=['loans', 'xml']))
+        self.assertEqual(resp.status_code, 404)
+
+    def test_forbidden_to_regular_members(self):
+        self.client.login(username='member', password='fortesting')
+        resp = self.client.get(reverse('catalog:librarian-export', args=['loans', 'csv']))
+        self.assertEqual(resp.status_code, 403)
+
 
 class TestLibrarianManageUserView(TestCase):
 
@@ -524,6 +1153,19 @@ class TestLibrarianManageUserView(TestCase):
                 args=['test_librarian']))
         self.assertEqual(resp.status_code, 403)
 
+    def test_rows_do_not_query_their_book(self):
+        url = reverse('catalog:librarian-manage-member', args=['regular_user'])
+        self.client.get(url)  # fills the navbar cache
+        with CaptureQueriesContext(connection) as three_loans:
+            self.client.get(url)
+        for num in range(4, 7):
+            book = Book.objects.create(title=f'Test Book {num}', isbn=num)
+            BookInstance.objects.create(book=book, status='o', borrower=User.objects.get(username='regular_user'))
+        with CaptureQueriesContext(connection) as six_loans:
+            resp = self.client.get(url)
+        self.assertContains(resp, 'Test Book 6')
+        self.assertEqual(len(three_loans), len(six_loans))
+
     def test_page_uses_correct_template(self):
         self.fail('Test not yet written.')
 
@@ -0,0 +1,113 @@
+import time
+from unittest import mock
+
+from django.contrib.sessions.backends.base import UpdateError
+from django.contrib.sessions.backends.db import SessionStore
+from django.contrib.sessions.models import Session
+from django.test import TestCase, TransactionTestCase
+from django.urls import reverse
+
+from catalog.visits import SESSION_KEY, VisitCounter
+
+
+class FakeClock:
+
+    def __init__(self):
+        self.now = 0.0
+
+    def __call__(self):
+        return self.now
+
+
+class TestVisitCounter(TestCase):
+
+    def setUp(self):
+        self.clock = FakeClock()
+        self.counter = VisitCounter(flush_interval=60, clock=self.clock, background=False)
+        self.session = SessionStore()
+        self.session[SESSION_KEY] = 1
+        self.session.save()
+        self.session = SessionStore(session_key=self.session.session_key)
+
+    def test_new_session_is_written_immediately(self):
+        session = SessionStore()
+        self.assertEqual(self.counter.visit(session), 0)
+        self.assertTrue(session.modified)
+        self.assertEqual(session[SESSION_KEY], 1)
+
+    def test_visits_are_buffered_within_interval(self):
+        for expected in range(1, 6):
+            self.clock.now += 1
+            self.assertEqual(self.counter.visit(self.session), expected)
+        self.assertFalse(self.session.modified)
+        self.assertEqual(self.counter.pending(), 1)
+
+    def test_buffered_visits_flush_after_interval(self):
+        self.counter.visit(self.session)
+        self.counter.visit(self.session)
+        self.clock.now += 60
+        self.assertEqual(self.counter.visit(self.session), 3)
+        self.assertTrue(self.session.modified)
+        self.assertEqual(self.session[SESSION_KEY], 4)
+        self.assertEqual(self.counter.pending(), 0)
+
+    def test_idle_visitors_are_flushed_to_the_session_store(self):
+        self.counter.visit(self.session)
+        self.counter.visit(self.session)
+        self.clock.now += 60
+        self.assertEqual(self.counter.flush_idle(), 1)
+        self.assertEqual(self.counter.pending(), 0)
+        stored = SessionStore(session_key=self.session.session_key)
+        self.assertEqual(stored[SESSION_KEY], 3)
+
+    def test_force_flushes_every_visitor(self):
+        self.counter.visit(self.session)
+        self.assertEqual(self.counter.flush_idle(), 0)
+        self.assertEqual(self.counter.flush_idle(force=True), 1)
+        stored = SessionStore(session_key=self.session.session_key)
+        self.assertEqual(stored[SESSION_KEY], 2)
+
+    def test_ended_sessions_are_not_written(self):
+        self.counter.visit(self.session)
+        self.session.delete()
+        self.assertEqual(self.counter.flush_idle(force=True), 1)
+        # Not brought back, under this key or a new one.
+        self.assertFalse(Session.objects.exists())
+
+    def test_session_ending_during_the_flush_is_skipped(self):
+        self.counter.visit(self.session)
+        with mock.patch.object(SessionStore, 'save', side_effect=UpdateError):
+            self.assertEqual(self.counter.flush_idle(force=True), 1)
+        self.assertEqual(self.counter.pending(), 0)
+
+
+class TestVisitCounterFlusher(TransactionTestCase):
+
+    def test_idle_visitors_are_flushed_without_further_visits(self):
+        session = SessionStore()
+        session[SESSION_KEY] = 1
+        session.save()
+        counter = VisitCounter(flush_interval=0.05)
+        counter.visit(SessionStore(session_key=session.session_key))
+        self.assertEqual(counter.pending(), 1)
+
+        deadline = time.monotonic() + 5
+        while counter.pending() and time.monotonic() < deadline:
+            time.sleep(0.01)
+        self.assertEqual(counter.pending(), 0)
+        deadline = time.monotonic() + 5
+        while SessionStore(session_key=session.session_key)[SESSION_KEY] != 2 and time.monotonic() < deadline:
+            time.sleep(0.01)
+        self.assertEqual(SessionStore(session_key=session.session_key)[SESSION_KEY], 2)
+
+
+class TestIndexViewVisits(TestCase):
+
+    def test_repeat_visits_do_not_write_the_session(self):
+        resp = self.client.get(reverse('catalog:index'))
+        self.assertEqual(resp.context['num_visits'], 0)
+        for expected in range(1, 4):
+            resp = self.client.get(reverse('catalog:index'))
+            self.assertEqual(resp.context['num_visits'], expected)
+        # Only the first visit, which created the session, was written.
+        self.assertEqual(self.client.session[SESSION_KEY], 1)
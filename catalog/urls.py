@@ -1,5 +1,5 @@
 from django.urls import path
-from . import views
+from . import async_views, views
 
 
 app_name = 'catalog'
@@ -11,10 +11,26 @@ urlpatterns = [
     path('authors/<int:pk>', views.AuthorDetailView.as_view(), name='author-detail-view'),
     path('genres/', views.genres, name='genres'),
     path('languages/', views.languages, name='languages'),
+    path('search/', views.search, name='search'),
     path('mybooks/', views.LoanedBooksByUserListView.as_view(), name='my-borrowed'),  # TODO: change to `member/mybooks`.
     path('librarian/booksloaned/', views.AllLoanedBooksLibrarianListView.as_view(), name='books-on-loan'),
+    path('librarian/checkout/', views.checkout_books, name='librarian-checkout'),
+    path('librarian/checkin/', views.checkin_books, name='librarian-checkin'),
+    path('librarian/overdue/', views.overdue_report, name='librarian-overdue'),
     path('librarian/user/<str:username>', views.manage_member, name='librarian-manage-member'),
     path('librarian/book/<uuid:copy_id>/renew/', views.renew_book_librarian, name='librarian-renew-book'),
     path('librarian/add/user', views.librarian_add_user, name='librarian-add-user'),
+    path('librarian/export/<slug:dataset>.<slug:fmt>', views.export_data, name='librarian-export'),
     # path('librarian/books/add', ) # TODO: add librarian add book
 ]
+
+# Async versions of the read-only views, for serving under ASGI.
+urlpatterns += [
+    path('async/', async_views.index, name='async-index'),
+    path('async/books/', async_views.BookListView.as_view(), name='async-books'),
+    path('async/books/<int:pk>', async_views.BookDetailView.as_view(), name='async-book-detail-view'),
+    path('async/authors/', async_views.AuthorListView.as_view(), name='async-authors'),
+    path('async/authors/<int:pk>', async_views.AuthorDetailView.as_view(), name='async-author-detail-view'),
+    path('async/genres/', async_views.genres, name='async-genres'),
+    path('async/languages/', async_views.languages, name='async-languages'),
+]
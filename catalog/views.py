@@ -1,9 +1,13 @@
+import json
+import uuid
 from datetime import datetime, timezone, timedelta
 
-from django.http import HttpResponse, HttpResponseRedirect
+from django.core.paginator import Paginator
+from django.http import Http404, HttpResponse, HttpResponseRedirect, JsonResponse, StreamingHttpResponse
 from django.shortcuts import render, get_object_or_404
 from django.template import loader
 from django.views import generic
+from django.views.decorators.http import require_POST
 
 from django.contrib import messages
 from django.contrib.auth import authenticate, login, logout
@@ -12,25 +16,30 @@ from django.contrib.auth.decorators import login_required, permission_required
 # from django.contrib.auth.forms import UserCreationForm
 
 from .models import *
+from . import caching
+from .caching import cached_page, cached_rows
+from .conditional import ConditionalDetailMixin
+from .circulation import CHECKED_IN, CHECKED_OUT, MAX_BATCH_SIZE, MAX_LOAN_DAYS, check_in_copies, check_out_copies
+from .export import DATASETS, FORMATS, stream_export
 from .forms import RenewBookForm, UserRegistrationForm
+from .pagination import KeysetPaginationMixin
+from .search import BookSearchResults
+from .stats import get_library_stats
+from .visits import visit_counter
 
 # Create your views here.
 # TODO: refactor to generic views to reduce redundancy
 def index(request):
-    num_books = Book.objects.all().count()
-    num_authors = Author.objects.all().count()
-    num_genres = Genre.objects.all().count()
-    num_language = Language.objects.all().count()
+    stats = get_library_stats()
     template = loader.get_template('catalog/index.html')
     
-    num_visits = request.session.get('num_visits', 0)
-    request.session['num_visits'] = num_visits + 1
+    num_visits = visit_counter.visit(request.session)
 
     context = {
-        'num_books': num_books,
-        'num_authors': num_authors,
-        'num_genres': num_genres,
-        'num_language': num_language,
+        'num_books': stats['num_books'],
+        'num_authors': stats['num_authors'],
+        'num_genres': stats['num_genres'],
+        'num_language': stats['num_language'],
         'num_visits': num_visits,
     }
     return HttpResponse(template.render(context, request))
@@ -45,41 +54,37 @@ def index(request):
 #     }
 #     return HttpResponse(template.render(context, request))
 
-class BookListView(LoginRequiredMixin, generic.ListView):
+class BookListView(LoginRequiredMixin, KeysetPaginationMixin, generic.ListView):
     model = Book
     template_name = 'catalog/books.html'
     context_object_name = 'list_of_all_books'
     paginate_by = 10
 
-class BookDetailView(LoginRequiredMixin, generic.DetailView):
+class BookDetailView(LoginRequiredMixin, ConditionalDetailMixin, generic.DetailView):
     model = Book
     template_name = 'catalog/book_details.html'
     context_object_name = 'book_detail_info'
 
-class AuthorListView(LoginRequiredMixin, generic.ListView):
+class AuthorListView(LoginRequiredMixin, KeysetPaginationMixin, generic.ListView):
     model = Author
     template_name = 'catalog/authors.html'
     context_object_name = 'list_of_all_authors'
     paginate_by = 10
 
-class AuthorDetailView(LoginRequiredMixin, generic.DetailView):
+class AuthorDetailView(LoginRequiredMixin, ConditionalDetailMixin, generic.DetailView):
     model = Author
     template_name = 'catalog/author_details.html'
     context_object_name = 'author'
 
-class LoanedBooksByUserListView(LoginRequiredMixin, generic.ListView):
+class LoanedBooksByUserListView(LoginRequiredMixin, KeysetPaginationMixin, generic.ListView):
     model = BookInstance
     template_name = 'catalog/bookinstance_list_borrowed_user.html'
     paginate_by = 10
 
     def get_queryset(self):
-        return BookInstance.objects.filter(
-                borrower=self.request.user
-            ).filter(
-                status__exact='o'
-            ).order_by('due_back')
+        return BookInstance.objects.borrowed_by(self.request.user).with_overdue().select_related('book')
 
-class AllLoanedBooksLibrarianListView(PermissionRequiredMixin, generic.ListView):
+class AllLoanedBooksLibrarianListView(PermissionRequiredMixin, KeysetPaginationMixin, generic.ListView):
     permission_required = ('catalog.can_mark_returned',)
 
     model = BookInstance
@@ -87,20 +92,90 @@ class AllLoanedBooksLibrarianListView(PermissionRequiredMixin, generic.ListView)
     paginate_by = 20
 
     def get_queryset(self):
-        return BookInstance.objects.filter(
-            status__exact='o'
-        ).order_by('due_back')
+        return BookInstance.objects.on_loan().with_overdue().select_related('book', 'borrower')
     
 @login_required
 @permission_required('catalog.can_mark_returned', raise_exception=True)
 def manage_member(request, username):
     member = get_object_or_404(User, username=username)
-    books_loaned = member.bookinstance_set.all()
+    books_loaned = member.bookinstance_set.with_overdue().select_related('book').order_by('status', 'due_back')
     return render(request, 'catalog/librarian_view_member.html', {
         'member': member,
         'books_loaned_to_member': books_loaned,
     })
 
+@login_required
+@permission_required('catalog.can_mark_returned', raise_exception=True)
+def overdue_report(request):
+    """Overdue loans counted per member, members with the most overdue books first."""
+    members = BookInstance.objects.overdue_by_member()
+    today = timezone.localdate()
+    for member in members:
+        member['days_overdue'] = (today - timezone.localdate(member['oldest_due_back'])).days
+    return render(request, 'catalog/librarian_overdue_report.html', {
+        'overdue_members': members,
+        'total_overdue': sum(member['num_overdue'] for member in members),
+    })
+
+def _batch_payload(request):
+    """
+    Parse a circulation batch request body. Returns `(payload, copy_ids)`,
+    or raises ValueError with a message for the client.
+    """
+    try:
+        payload = json.loads(request.body)
+    except ValueError:
+        raise ValueError('Request body must be JSON.')
+    if not isinstance(payload, dict) or not isinstance(payload.get('copy_ids'), list):
+        raise ValueError('Expected an object with a "copy_ids" list.')
+    copy_ids = payload['copy_ids']
+    if not copy_ids or len(copy_ids) > MAX_BATCH_SIZE:
+        raise ValueError(f'Send between 1 and {MAX_BATCH_SIZE} copy IDs.')
+    try:
+        copy_ids = [uuid.UUID(str(copy_id)) for copy_id in copy_ids]
+    except ValueError:
+        raise ValueError('Copy IDs must be UUIDs.')
+    return payload, copy_ids
+
+@require_POST
+@login_required
+@permission_required('catalog.can_mark_returned', raise_exception=True)
+def checkout_books(request):
+    """Loan a batch of copies to one member: `{"copy_ids": [...], "borrower": username, "period": days}`."""
+    try:
+        payload, copy_ids = _batch_payload(request)
+        period = payload.get('period')
+        if period is not None and (type(period) is not int or not 1 <= period <= MAX_LOAN_DAYS):
+            raise ValueError(f'"period" must be a number of days between 1 and {MAX_LOAN_DAYS}.')
+    except ValueError as error:
+        return JsonResponse({'error': str(error)}, status=400)
+    borrower = User.objects.filter(username=payload.get('borrower')).first()
+    if borrower is None:
+        return JsonResponse({'error': 'Unknown borrower.'}, status=400)
+
+    results = check_out_copies(copy_ids, borrower, period)
+    return JsonResponse({
+        'borrower': borrower.username,
+        'checked_out': sum(result['result'] == CHECKED_OUT for result in results),
+        'results': results,
+    })
+
+@require_POST
+@login_required
+@permission_required('catalog.can_mark_returned', raise_exception=True)
+def checkin_books(request):
+    """Return a batch of copies: `{"copy_ids": [...]}`."""
+    try:
+        _, copy_ids = _batch_payload(request)
+    except ValueError as error:
+        return JsonResponse({'error': str(error)}, status=400)
+
+    results = check_in_copies(copy_ids)
+    return JsonResponse({
+        'checked_in': sum(result['result'] == CHECKED_IN for result in results),
+        'results': results,
+    })
+
 @login_required
 @permission_required('catalog.can_mark_returned', raise_exception=True)
 def renew_book_librarian(request, copy_id):
@@ -136,16 +211,43 @@ def renew_book_librarian(request, copy_id):
         context,
     )
 
+@login_required
+def search(request):
+    """Ranked full-text search over book titles, summaries and authors."""
+    query = request.GET.get('q', '').strip()
+    paginator = Paginator(BookSearchResults(query), 10)
+    page_obj = paginator.get_page(request.GET.get('page'))
+
+    context = {
+        'query': query,
+        'page_obj': page_obj,
+        'is_paginated': page_obj.has_other_pages(),
+        'search_results': page_obj.object_list,
+    }
+    return render(request, 'catalog/search.html', context)
+
+@login_required
+@permission_required('catalog.can_mark_returned', raise_exception=True)
+def export_data(request, dataset, fmt):
+    """Stream a catalog export as a CSV or JSONL download."""
+    if dataset not in DATASETS or fmt not in FORMATS:
+        raise Http404('No such export.')
+    response = StreamingHttpResponse(stream_export(dataset, fmt), content_type=FORMATS[fmt])
+    response['Content-Disposition'] = f'attachment; filename="{dataset}.{fmt}"'
+    return response
+
+@cached_page(caching.GENRES)
 def genres(request):
-    list_of_all_genres = Genre.objects.all()
+    list_of_all_genres = cached_rows(caching.GENRES, Genre.objects.all())
     template = loader.get_template('catalog/genres.html')
     context = {
         'list_of_all_genres': list_of_all_genres,
     }
     return HttpResponse(template.render(context, request))
 
+@cached_page(caching.LANGUAGES)
 def languages(request):
-    list_of_all_languages = Language.objects.all()
+    list_of_all_languages = cached_rows(caching.LANGUAGES, Language.objects.all())
     template = loader.get_template('catalog/languages.html')
     context = {
         'list_of_all_languages': list_of_all_languages,
@@ -0,0 +1,128 @@
+"""
+Buffered visit counter for the catalog index page.
+
+Incrementing `request.session['num_visits']` on every request makes the
+session middleware write the session row on every page view. Instead, each
+process keeps the increments for a visitor in memory and writes them to the
+session at most once per flush interval. The count shown to the visitor
+includes the buffered visits, so it stays right within a process and close
+to right across several processes.
+
+The visits of visitors who don't come back within the interval are written
+by a background thread, rather than by whichever request comes next, and
+what is still buffered when the process exits is written then.
+"""
+import atexit
+import logging
+import threading
+import time
+from importlib import import_module
+
+from django.conf import settings
+from django.contrib.sessions.backends.base import UpdateError
+from django.db import connections
+
+SESSION_KEY = 'num_visits'
+FLUSH_INTERVAL = 60
+
+logger = logging.getLogger(__name__)
+
+
+class VisitCounter:
+
+    def __init__(self, flush_interval=FLUSH_INTERVAL, clock=time.monotonic, background=True):
+        self.flush_interval = flush_interval
+        self.clock = clock
+        # Whether idle visitors are flushed by a thread of their own, which
+        # runs while there are buffered visits.
+        self.background = background
+        # session_key -> (buffered visits, time of the first buffered visit)
+        self._pending = {}
+        self._lock = threading.Lock()
+        self._flusher = None
+
+    def visit(self, session):
+        """
+        Record a visit for the owner of `session` and return the number of
+        visits before this one.
+        """
+        stored = session.get(SESSION_KEY, 0)
+        session_key = session.session_key
+        if session_key is None:
+            # A first visit has to write, so that the session gets created.
+            session[SESSION_KEY] = stored + 1
+            return stored
+
+        now = self.clock()
+        with self._lock:
+            count, since = self._pending.pop(session_key, (0, now))
+            previous = stored + count
+            count += 1
+            due = now - since >= self.flush_interval
+            if not due:
+                self._pending[session_key] = (count, since)
+                if self.background and self._flusher is None:
+                    self._start_flusher()
+
+        if due:
+            session[SESSION_KEY] = stored + count
+        return previous
+
+    def pending(self):
+        """Return the number of visitors with buffered visits."""
+        return len(self._pending)
+
+    def flush_idle(self, force=False):
+        """
+        Write out the buffered visits of visitors that have not come back
+        within a flush interval, or of every visitor if `force` is set.
+        Returns the number of visitors whose visits were taken out of the
+        buffer.
+        """
+        now = self.clock()
+        with self._lock:
+            idle = {
+                key: count for key, (count, since) in self._pending.items()
+                if force or now - since >= self.flush_interval
+            }
+            for key in idle:
+                del self._pending[key]
+
+        store_class = import_module(settings.SESSION_ENGINE).SessionStore
+        for session_key, count in idle.items():
+            store = store_class(session_key=session_key)
+            visits = store.get(SESSION_KEY, 0)
+            if store.session_key is None:
+                # The session has ended, e.g. by logging out.
+                continue
+            store[SESSION_KEY] = visits + count
+            try:
+                store.save()
+            except UpdateError:
+                # It ended, or got a new key, since it was read.
+                continue
+        return len(idle)
+
+    def _start_flusher(self):
+        self._flusher = threading.Thread(target=self._flush_periodically, name='visit-counter', daemon=True)
+        self._flusher.start()
+
+    def _flush_periodically(self):
+        while True:
+            time.sleep(self.flush_interval)
+            try:
+                self.flush_idle()
+            except Exception:
+                logger.exception('Could not write the buffered visits.')
+            finally:
+                # This thread's own connections; nothing closes them otherwise.
+                connections.close_all()
+            with self._lock:
+                if not self._pending:
+                    # The next buffered visit starts another.
+                    self._flusher = None
+                    return
+
+
+visit_counter = VisitCounter()
+atexit.register(visit_counter.flush_idle, force=True)
@@ -0,0 +1,112 @@
+"""
+Warm-up of the per-process template and URL caches.
+
+With the cached template loader, each template is read and compiled the
+first time a process renders it, and the URL resolvers compile their
+patterns and build their reverse lookup tables on first use. `warm_up()`
+does all of that up front, so that the requests a new worker serves while
+it warms up are as fast as the rest. With the `WARM_UP_ON_STARTUP`
+setting on, the WSGI and ASGI entry points (`demosite.wsgi`,
+`demosite.asgi`) run it as the worker loads the application, before it
+serves a request, and the `warm_up` command runs it too.
+
+It can't run from an `AppConfig.ready()`: that would import the URLconf
+before the admin has discovered the apps' `ModelAdmin`s, and
+`admin.site.urls` would be built, and cached for good, without them.
+`get_wsgi_application()` and `get_asgi_application()` have run every
+`ready()` by the time they return.
+"""
+import os
+from pathlib import Path
+
+from django.apps import apps
+from django.conf import settings
+from django.core.cache import caches
+from django.template import engines
+from django.urls import NoReverseMatch, URLResolver, get_resolver, reverse
+
+# Apps whose own templates are compiled; Django's contrib apps are left out.
+TEMPLATE_APPS = ['catalog', 'polls']
+
+
+def template_dirs():
+    """Return the project template directories and those of `TEMPLATE_APPS`."""
+    dirs = [Path(path) for path in engines['django'].engine.dirs]
+    dirs += [Path(apps.get_app_config(label).path) / 'templates' for label in TEMPLATE_APPS]
+    return [path for path in dirs if path.is_dir()]
+
+
+def template_names():
+    """Return the name of every template under `template_dirs()`."""
+    names = set()
+    for directory in template_dirs():
+        for root, _, files in os.walk(directory):
+            for filename in files:
+                if filename.endswith(('.html', '.txt')):
+                    names.add((Path(root) / filename).relative_to(directory).as_posix())
+    return sorted(names)
+
+
+def warm_templates():
+    """
+    Load and compile every project template, and import the context
+    processors and the cache backends the templates use. Returns how many
+    templates there were.
+    """
+    engine = engines['django']
+    names = template_names()
+    for name in names:
+        engine.get_template(name)
+    engine.engine.template_context_processors
+    for alias in settings.CACHES:
+        caches[alias]
+    return len(names)
+
+
+def _warm_resolver(resolver):
+    count = 0
+    # Building the reverse dict compiles the patterns' regexes and indexes
+    # the names, for this resolver and, below, every included one.
+    resolver.reverse_dict
+    for pattern in resolver.url_patterns:
+        pattern.pattern.regex
+        if isinstance(pattern, URLResolver):
+            count += _warm_resolver(pattern)
+        else:
+            count += 1
+    return count
+
+
+def _route_names(resolver, namespace=''):
+    for pattern in resolver.url_patterns:
+        if isinstance(pattern, URLResolver):
+            prefix = f'{namespace}{pattern.namespace}:' if pattern.namespace else namespace
+            yield from _route_names(pattern, prefix)
+        elif pattern.name:
+            yield namespace + pattern.name
+
+
+def warm_urls():
+    """
+    Compile and index every URL pattern, and reverse each named route that
+    takes no arguments. Returns how many patterns there were.
+    """
+    resolver = get_resolver()
+    count = _warm_resolver(resolver)
+    for name in _route_names(resolver):
+        try:
+            reverse(name)
+        except NoReverseMatch:
+            pass
+    return count
+
+
+def warm_up():
+    """Warm the template and URL caches. Returns `(templates, url_patterns)`."""
+    return warm_templates(), warm_urls()
+
+
+def warm_up_on_startup():
+    """Warm up if the `WARM_UP_ON_STARTUP` setting is on. Call once every app is ready."""
+    if getattr(settings, 'WARM_UP_ON_STARTUP', False):
+        warm_up()
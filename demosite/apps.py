@@ -0,0 +1,9 @@
+from django.apps import AppConfig
+
+
+class DemositeConfig(AppConfig):
+    default_auto_field = 'django.db.models.BigAutoField'
+    name = 'demosite'
+
+    def ready(self):
+        from . import metrics, slowlog, sqlite  # connect the connection setup handlers
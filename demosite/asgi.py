@@ -11,6 +11,11 @@ import os
 
 from django.core.asgi import get_asgi_application
 
+from catalog.warmup import warm_up_on_startup
+
 os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'demosite.settings')
 
 application = get_asgi_application()
+
+# Every app is ready, the admin's included, so the URLconf is complete.
+warm_up_on_startup()
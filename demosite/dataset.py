@@ -0,0 +1,432 @@
+"""
+Deterministic synthetic data for scaling tests.
+
+`generate_library()` fills an empty database with a catalog, its readers
+and librarians, and polls. Every row is derived from a seed, so the same
+seed, sizes and reference date give the same database.
+
+Authors, users and polls are comparatively few, and are bulk-created in
+this process. Books, their author and genre links and their copies are
+the bulk of the rows. A pool of worker processes builds them,
+`batch_size` books at a time, and this process writes each batch with one
+`executemany()` per table, in batch order. The database takes one writer
+at a time, so the workers build the next batches while this process
+writes. Each book draws from its own random generator, seeded with the
+seed and the book's number, so the rows don't depend on the number of
+workers or on the batch size.
+
+No models are imported at the top of this module, so that workers started
+with "spawn" can import it before they set Django up.
+"""
+import os
+import random
+import re
+import string
+import uuid
+from collections import Counter
+from datetime import date, datetime, time, timedelta
+from functools import partial
+from multiprocessing import Pool
+
+import django
+from django.apps import apps
+from django.db import DEFAULT_DB_ALIAS, connection, connections, transaction
+from django.utils import timezone
+
+FIRST_NAMES = [
+    'Ada', 'Alan', 'Amara', 'Anna', 'Carlos', 'Clara', 'Daniel', 'Elena', 'Emma', 'Farah',
+    'George', 'Grace', 'Hannah', 'Ivan', 'James', 'Julia', 'Kofi', 'Laura', 'Leo', 'Lucia',
+    'Maria', 'Mark', 'Nadia', 'Oliver', 'Omar', 'Priya', 'Rosa', 'Samuel', 'Sofia', 'Thomas',
+]
+MIDDLE_NAMES = ['A', 'J', 'L', 'R', 'Anne', 'Lee', 'Marie', 'Rose']
+LAST_NAMES = [
+    'Adams', 'Alvarez', 'Brown', 'Chen', 'Costa', 'Dubois', 'Evans', 'Fischer', 'Garcia', 'Hughes',
+    'Ibrahim', 'Jensen', 'Kowalski', 'Lopez', 'Martin', 'Meyer', 'Novak', "O'Brien", 'Okafor', 'Patel',
+    'Petrov', 'Rossi', 'Santos', 'Schmidt', 'Silva', 'Smith', 'Suzuki', 'Taylor', 'Walker', 'Young',
+]
+# Chinese names, which `Author.full_name` writes family name first.
+CJK_SURNAMES = ['王', '李', '张', '刘', '陈', '杨', '黄', '赵', '吴', '周', '徐', '孙', '马', '朱', '胡', '郭', '林', '罗']
+CJK_GIVEN_NAMES = ['伟', '芳', '娜', '敏', '静', '丽', '强', '磊', '军', '洋', '勇', '艳', '杰', '涛', '明', '超', '华', '迅']
+CJK_SHARE = 0.15
+CJK_PATTERN = re.compile(r'[\u4e00-\u9fff]')
+
+TITLE_ADJECTIVES = [
+    'Silent', 'Broken', 'Hidden', 'Last', 'Golden', 'Endless', 'Distant', 'Burning', 'Quiet', 'Lost',
+    'Northern', 'Secret', 'Winter', 'Little', 'Invisible', 'Final', 'Crimson', 'Wandering',
+]
+TITLE_NOUNS = [
+    'River', 'Garden', 'Empire', 'Machine', 'Kingdom', 'Harbour', 'Mountain', 'Library', 'Promise',
+    'Orchard', 'Station', 'Letters', 'Island', 'Country', 'Mirror', 'Storm', 'Bridge', 'Tide',
+]
+CJK_TITLE_WORDS = ['春', '秋', '风', '雨', '山', '河', '月', '夜', '城', '梦', '海', '家', '路', '花', '雪', '故乡']
+
+# Most popular first; books pick from the front of the list more often.
+GENRES = [
+    'Fiction', 'Mystery', 'Science Fiction', 'Fantasy', 'Romance', 'History', 'Biography',
+    'Thriller', 'Self-help', 'Science', 'Poetry', 'Philosophy', 'Travel', 'Cookery', 'Art',
+    'Psychology', 'Economics', 'Children', 'Drama', 'Religion',
+]
+# name: weight. Books by Chinese authors are mostly in Chinese.
+LANGUAGES = {
+    'English': 60, 'Chinese': 8, 'Spanish': 8, 'French': 7, 'German': 6,
+    'Japanese': 5, 'Italian': 3, 'Portuguese': 2, 'Russian': 1,
+}
+PUBLISHERS = ['Penguin', 'Vintage', 'HarperCollins', 'Faber', 'Gallimard', 'Anagrama', 'Suhrkamp', '人民文学出版社']
+
+# number: weight
+AUTHORS_PER_BOOK = {1: 80, 2: 14, 3: 4, 4: 2}
+GENRES_PER_BOOK = {1: 50, 2: 35, 3: 15}
+# The `BookInstance` status codes and the share of copies in each.
+COPY_STATUSES = {'a': 55, 'o': 25, 'r': 10, 'm': 10}
+LOAN_PERIODS = [14, 14, 14, 28]
+# Mean age of a loan in days; with 14-day loans about a quarter are overdue.
+MEAN_LOAN_AGE = 10
+
+QUESTION_TEMPLATES = [
+    'Which {genre} book should the reading group read next?',
+    'Should we stock more {genre} titles?',
+    'How many {genre} books do you read a year?',
+    'When should the {genre} book club meet?',
+]
+CHOICE_TEXTS = [
+    'Yes', 'No', 'Not sure', 'Monday evening', 'Saturday morning', 'Sunday afternoon',
+    'None', 'One or two', 'Three to ten', 'More than ten', 'The newest one', 'A classic',
+]
+
+READER_PREFIX = 'reader'
+LIBRARIAN_PREFIX = 'librarian'
+
+# Set in each worker by `_init_worker()`.
+_state = {}
+
+
+def default_sizes(books):
+    """Return the default number of authors, users and questions for `books` books."""
+    return {'authors': max(1, books // 4), 'users': max(1, books // 20), 'questions': 100}
+
+
+def isbn13(number):
+    """Return a valid ISBN-13 in the 978 range for `number`, as an int."""
+    digits = f'978{number:09}'
+    check = -sum(int(digit) * (3 if index % 2 else 1) for index, digit in enumerate(digits)) % 10
+    return int(digits + str(check))
+
+
+def _skewed(rng, size, power):
+    """An index below `size`, the lower ones more likely the higher `power` is."""
+    return int(size * rng.random() ** power)
+
+
+def _pick(rng, weights):
+    return rng.choices(list(weights), list(weights.values()))[0]
+
+
+def _cjk_name(rng):
+    return ''.join(rng.choices(CJK_GIVEN_NAMES, k=rng.choice((1, 2)))), rng.choice(CJK_SURNAMES)
+
+
+def _person_name(rng):
+    """Return `(first_name, middle_names, last_name)`."""
+    if rng.random() < CJK_SHARE:
+        first_name, last_name = _cjk_name(rng)
+        return first_name, None, last_name
+    middle_names = rng.choice(MIDDLE_NAMES) if rng.random() < 0.3 else None
+    return rng.choice(FIRST_NAMES), middle_names, rng.choice(LAST_NAMES)
+
+
+def _aware(day):
+    return timezone.make_aware(datetime.combine(day, time()))
+
+
+def make_authors(count, seed, today):
+    from catalog.models import Author
+
+    rng = random.Random(f'{seed}:authors')
+    max_length = Author._meta.get_field('name').max_length
+    authors = []
+    for _ in range(count):
+        first_name, middle_names, last_name = _person_name(rng)
+        author = Author(first_name=first_name, middle_names=middle_names, last_name=last_name)
+        if rng.random() < 0.8:
+            author.birth_date = date(1800, 1, 1) + timedelta(days=rng.randrange(200 * 365))
+            death_date = author.birth_date + timedelta(days=rng.randrange(30 * 365, 95 * 365))
+            if death_date < today:
+                author.death_date = death_date
+        author.name = author.full_name[:max_length]
+        authors.append(author)
+    return authors
+
+
+def make_users(readers, librarians, seed, today, password):
+    from django.contrib.auth.hashers import make_password
+    from django.contrib.auth.models import User
+
+    rng = random.Random(f'{seed}:users')
+    # One hash for everyone, with a seeded salt, as hashing is slow on purpose.
+    salt = ''.join(rng.choices(string.ascii_letters + string.digits, k=22))
+    password = make_password(password, salt=salt)
+    users = []
+    for prefix, count in [(READER_PREFIX, readers), (LIBRARIAN_PREFIX, librarians)]:
+        for number in range(1, count + 1):
+            first_name, _, last_name = _person_name(rng)
+            username = f'{prefix}{number:06}'
+            users.append(User(
+                username=username,
+                first_name=first_name,
+                last_name=last_name,
+                email=f'{username}@example.com',
+                password=password,
+                is_staff=prefix == LIBRARIAN_PREFIX,
+                date_joined=_aware(today - timedelta(days=rng.randrange(5 * 365))),
+            ))
+    return users
+
+
+def make_polls(count, seed, today):
+    from polls.models import Choice, Question
+
+    rng = random.Random(f'{seed}:polls')
+    questions, choices = [], []
+    for _ in range(count):
+        days = rng.uniform(-30, -1) if rng.random() < 0.05 else rng.uniform(0, 365)
+        questions.append(Question(
+            question_text=rng.choice(QUESTION_TEMPLATES).format(genre=rng.choice(GENRES).lower()),
+            pub_date=_aware(today) - timedelta(days=days),
+        ))
+        choices.append([
+            Choice(choice_text=text, votes=_skewed(rng, 500, 2))
+            for text in rng.sample(CHOICE_TEXTS, rng.randint(2, 6))
+        ])
+    return questions, choices
+
+
+def _init_worker(state):
+    if not apps.ready:
+        django.setup()
+    _state.update(state)
+
+
+def _batch_models():
+    """The models `make_batch()` makes rows for, in the order they are written."""
+    from catalog.models import Book, BookInstance
+
+    return [Book, Book.authors.through, Book.genre.through, BookInstance]
+
+
+def _insert_fields(model):
+    return [field for field in model._meta.concrete_fields if field is not model._meta.auto_field]
+
+
+def _preparers(model):
+    """Return `(attname, function)` pairs turning values into database values for an insert."""
+    # The connection itself rather than the `connection` proxy, which
+    # would look it up for every value.
+    database = connections[DEFAULT_DB_ALIAS]
+    return [(field.attname, partial(field.get_db_prep_save, connection=database)) for field in _insert_fields(model)]
+
+
+def _row(preparers, values):
+    return tuple(
+        None if values[attname] is None else prepare(values[attname]) for attname, prepare in preparers
+    )
+
+
+def _title(rng, cjk):
+    if cjk:
+        return ''.join(rng.sample(CJK_TITLE_WORDS, rng.randint(2, 4)))
+    title = f'The {rng.choice(TITLE_ADJECTIVES)} {rng.choice(TITLE_NOUNS)}'
+    if rng.random() < 0.3:
+        title += f' of {rng.choice(TITLE_NOUNS)}s'
+    return title
+
+
+def make_batch(numbers):
+    """
+    Build the rows for the books numbered `numbers`, a `(first, stop)` pair:
+    `(tables, statuses)`, where `tables` maps each table name to its rows, ready
+    for `executemany()`, and `statuses` counts the copies in each status.
+    """
+    from catalog.models import Book, BookInstance
+
+    seed, authors, genres, languages, readers, now = (
+        _state[key] for key in ('seed', 'authors', 'genres', 'languages', 'readers', 'now')
+    )
+    copies_per_book = _state['copies']
+    author_links, genre_links = Book.authors.through._meta.db_table, Book.genre.through._meta.db_table
+    tables = {model._meta.db_table: [] for model in _batch_models()}
+    preparers = {model: _preparers(model) for model in (Book, BookInstance)}
+    statuses = Counter()
+    for number in range(*numbers):
+        rng = random.Random(f'{seed}:book:{number}')
+        isbn = isbn13(number)
+        # A few prolific authors write many of the books; ordered as
+        # `Author.Meta.ordering`, like the display column.
+        book_authors = sorted(
+            {authors[_skewed(rng, len(authors), 2)] for _ in range(_pick(rng, AUTHORS_PER_BOOK))},
+            key=lambda author: author[1],
+        )
+        book_genres = sorted({_skewed(rng, len(genres), 1.5) for _ in range(_pick(rng, GENRES_PER_BOOK))})
+        cjk = book_authors[0][3]
+        language = 'Chinese' if cjk and rng.random() < 0.9 else _pick(rng, LANGUAGES)
+        title = _title(rng, cjk)
+        authors_display = ', '.join(author[2] for author in book_authors)
+        genres_display = ', '.join(genres[index][1] for index in book_genres)
+        pub_date = now.date() - timedelta(days=min(int(rng.expovariate(1 / (15 * 365))), 150 * 365))
+        tables[Book._meta.db_table].append(_row(preparers[Book], {
+            'isbn': isbn,
+            'title': title,
+            'pub_date': pub_date,
+            'summary': f'{title}, a {genres_display.lower()} book by {authors_display}.',
+            'language_id': languages[language],
+            'authors_display': authors_display,
+            'authors_links': [[author[0], author[2]] for author in book_authors],
+            'genres_display': genres_display,
+            'updated_at': now,
+        }))
+        tables[author_links] += [(isbn, author[0]) for author in book_authors]
+        tables[genre_links] += [(isbn, genres[index][0]) for index in book_genres]
+
+        publisher = rng.choice(PUBLISHERS)
+        for _ in range(round(rng.expovariate(1 / copies_per_book)) if copies_per_book else 0):
+            copy = {
+                'copy_id': uuid.UUID(int=rng.getrandbits(128), version=4),
+                'book_id': isbn,
+                'imprint': f'{publisher}, {pub_date.year + rng.randrange(10)}',
+                'status': _pick(rng, COPY_STATUSES),
+                'borrower_id': None, 'loaned_on': None, 'due_back': None,
+                'updated_at': now,
+            }
+            if copy['status'] == BookInstance.STATUS_LOANED:
+                if not readers:
+                    copy['status'] = BookInstance.STATUS_AVAILABLE
+                else:
+                    # Some readers borrow a lot more than others.
+                    copy['borrower_id'] = readers[_skewed(rng, len(readers), 3)]
+                    copy['loaned_on'] = now - timedelta(seconds=int(rng.expovariate(1 / MEAN_LOAN_AGE) * 86400))
+                    copy['due_back'] = copy['loaned_on'] + timedelta(days=rng.choice(LOAN_PERIODS))
+            statuses[copy['status']] += 1
+            tables[BookInstance._meta.db_table].append(_row(preparers[BookInstance], copy))
+    return tables, statuses
+
+
+def _insert_sql(model):
+    quote = connection.ops.quote_name
+    columns = [quote(field.column) for field in _insert_fields(model)]
+    return (
+        f'INSERT INTO {quote(model._meta.db_table)} ({", ".join(columns)}) '
+        f'VALUES ({", ".join(["%s"] * len(columns))})'
+    )
+
+
+def generate_library(books, copies=10, authors=None, users=None, librarians=2, questions=None,
+                     seed=0, today=None, workers=None, batch_size=2000, password='library', progress=None):
+    """
+    Fill the database with `books` books and about `copies` copies of each,
+    and return the number of rows made, by kind, and of copies by status.
+
+    Arguments:
+        authors, users, questions [int]: default to `default_sizes(books)`.
+        librarians [int]: staff users allowed to mark books returned.
+        today [date]: the date the loans and polls are relative to.
+        workers [int]: worker processes building books (default: one per CPU).
+        progress [callable]: called with the number of books written after each batch.
+    """
+    from django.contrib.auth.models import Permission, User
+
+    from catalog import search
+    from catalog.caching import GENRES as GENRES_PAGE, LANGUAGES as LANGUAGES_PAGE, invalidate_pages
+    from catalog.models import Author, Book, BookInstance, Genre, Language
+    from catalog.stats import invalidate_library_stats
+    from polls.models import Choice, Question
+
+    sizes = default_sizes(books)
+    authors = sizes['authors'] if authors is None else authors
+    users = sizes['users'] if users is None else users
+    questions = sizes['questions'] if questions is None else questions
+    today = today or timezone.localdate()
+    now = _aware(today)
+    workers = workers or os.cpu_count() or 1
+
+    with transaction.atomic():
+        Author.objects.bulk_create(make_authors(authors, seed, today), batch_size=batch_size)
+        # bulk_create() stamps the time of the run.
+        Author.objects.update(updated_at=now)
+        Genre.objects.bulk_create(Genre(name=name) for name in GENRES)
+        Language.objects.bulk_create(Language(name=name) for name in LANGUAGES)
+        User.objects.bulk_create(make_users(users, librarians, seed, today, password), batch_size=batch_size)
+        staff = User.objects.filter(username__startswith=LIBRARIAN_PREFIX, is_staff=True)
+        can_mark_returned = Permission.objects.get(codename='can_mark_returned')
+        User.user_permissions.through.objects.bulk_create(
+            User.user_permissions.through(user_id=pk, permission=can_mark_returned)
+            for pk in staff.values_list('pk', flat=True)
+        )
+        poll_questions, poll_choices = make_polls(questions, seed, today)
+        Question.objects.bulk_create(poll_questions)
+        question_ids = Question.objects.order_by('pk').values_list('pk', flat=True)
+        for question_id, choices in zip(question_ids, poll_choices):
+            for choice in choices:
+                choice.question_id = question_id
+        Choice.objects.bulk_create(choice for choices in poll_choices for choice in choices)
+        Question.objects.refresh_choice_counts()
+
+    # What the workers pick from, in creation order: authors as `(pk,
+    # ordering key, full name, is Chinese)`.
+    author_rows = Author.objects.order_by('pk').values_list(
+        'pk', 'first_name', 'middle_names', 'last_name', 'birth_date',
+    )
+    state = {
+        'seed': seed,
+        'copies': copies,
+        'now': now,
+        'authors': [
+            (pk, (last_name, first_name, birth_date is not None, birth_date or date.min),
+             Author(first_name=first_name, middle_names=middle_names, last_name=last_name).full_name,
+             bool(CJK_PATTERN.search(last_name)))
+            for pk, first_name, middle_names, last_name, birth_date in author_rows
+        ],
+        'genres': list(Genre.objects.order_by('pk').values_list('pk', 'name')),
+        'languages': dict(Language.objects.values_list('name', 'pk')),
+        'readers': list(
+            User.objects.filter(username__startswith=READER_PREFIX).order_by('pk').values_list('pk', flat=True)
+        ),
+    }
+
+    counts = {'authors': authors, 'users': users + librarians, 'questions': questions, 'books': 0}
+    statuses = Counter()
+    batches = [(first, min(first + batch_size, books + 1)) for first in range(1, books + 1, batch_size)]
+    inserts = {model._meta.db_table: _insert_sql(model) for model in _batch_models()}
+    with Pool(workers, _init_worker, (state,)) if workers > 1 else _InProcess(state) as pool:
+        with connection.cursor() as cursor:
+            for tables, batch_statuses in pool.imap(make_batch, batches):
+                with transaction.atomic():
+                    for table, rows in tables.items():
+                        if rows:
+                            cursor.executemany(inserts[table], rows)
+                counts['books'] += len(tables[Book._meta.db_table])
+                statuses.update(batch_statuses)
+                if progress is not None:
+                    progress(counts['books'])
+
+    search.rebuild_index()
+    invalidate_pages(GENRES_PAGE)
+    invalidate_pages(LANGUAGES_PAGE)
+    invalidate_library_stats()
+    counts['copies'] = sum(statuses.values())
+    counts['choices'] = Choice.objects.count()
+    return counts, dict(statuses)
+
+
+class _InProcess:
+    """Builds the batches in this process, for a single worker."""
+
+    def __init__(self, state):
+        _init_worker(state)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        _state.clear()
+
+    def imap(self, function, iterable):
+        return map(function, iterable)
@@ -0,0 +1,86 @@
+import time
+from datetime import date
+
+from django.contrib.auth.models import User
+from django.core.management.base import BaseCommand, CommandError
+
+from catalog.models import Author, Book, BookInstance
+from demosite.dataset import LIBRARIAN_PREFIX, READER_PREFIX, generate_library
+from polls.models import Question
+
+
+class Command(BaseCommand):
+    help = (
+        'Fill an empty database with a deterministic synthetic library: authors '
+        '(some with Chinese names), books, copies in every loan status, readers '
+        'with loans, librarians and polls. The same --seed, sizes and --date give '
+        'the same data. About 10 million rows: --books 800000 --copies 8.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--books', type=int, default=10000, help='Number of books (default: 10000).')
+        parser.add_argument(
+            '--copies', type=float, default=10,
+            help='Average number of copies of each book (default: 10).',
+        )
+        parser.add_argument('--authors', type=int, help='Number of authors (default: a quarter of --books).')
+        parser.add_argument('--users', type=int, help='Number of readers (default: a twentieth of --books).')
+        parser.add_argument('--librarians', type=int, default=2, help='Number of librarians (default: 2).')
+        parser.add_argument('--questions', type=int, help='Number of poll questions (default: 100).')
+        parser.add_argument('--seed', type=int, default=0, help='Random seed (default: 0).')
+        parser.add_argument(
+            '--date', type=date.fromisoformat,
+            help='Date, as YYYY-MM-DD, that loans and polls are relative to (default: today).',
+        )
+        parser.add_argument(
+            '--password', default='library',
+            help='Password of every generated user (default: "library").',
+        )
+        parser.add_argument(
+            '--workers', type=int,
+            help='Worker processes building the books and copies (default: one per CPU).',
+        )
+        parser.add_argument(
+            '--batch-size', type=int, default=2000,
+            help='Number of books built and written per transaction (default: 2000).',
+        )
+
+    def handle(self, *args, **options):
+        if (
+            Book.objects.exists() or Author.objects.exists() or BookInstance.objects.exists()
+            or Question.objects.exists()
+            or User.objects.filter(username__startswith=READER_PREFIX).exists()
+            or User.objects.filter(username__startswith=LIBRARIAN_PREFIX).exists()
+        ):
+            raise CommandError(
+                'The database already holds a catalog, polls or generated users; '
+                'generate the library into an empty database, e.g. after "flush".'
+            )
+
+        def progress(books):
+            if options['verbosity'] > 1:
+                self.stdout.write(f'{books} books written.')
+
+        start = time.perf_counter()
+        counts, statuses = generate_library(
+            options['books'],
+            copies=options['copies'],
+            authors=options['authors'],
+            users=options['users'],
+            librarians=options['librarians'],
+            questions=options['questions'],
+            seed=options['seed'],
+            today=options['date'],
+            workers=options['workers'],
+            batch_size=options['batch_size'],
+            password=options['password'],
+            progress=progress,
+        )
+        elapsed = time.perf_counter() - start
+        labels = dict(BookInstance.LOAN_STATUS)
+        by_status = ', '.join(f'{statuses.get(status, 0)} {labels[status].lower()}' for status in labels)
+        self.stdout.write(self.style.SUCCESS(
+            f'Generated {counts["books"]} books, {counts["copies"]} copies ({by_status}), '
+            f'{counts["authors"]} authors, {counts["users"]} users and {counts["questions"]} polls '
+            f'with {counts["choices"]} choices in {elapsed:.1f} s.'
+        ))
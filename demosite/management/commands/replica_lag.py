@@ -0,0 +1,27 @@
+from django.core.management.base import BaseCommand, CommandError
+
+from demosite.replicas import replica_aliases, replica_lag
+
+
+class Command(BaseCommand):
+    help = (
+        'Show how far each read replica is behind the default database, and fail if one '
+        'has never been synced or is behind by more than --max-lag seconds.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--max-lag', type=float, help='Most seconds a replica may be behind.')
+
+    def handle(self, *args, **options):
+        behind = []
+        for alias in replica_aliases():
+            lag = replica_lag(alias)
+            if lag is None:
+                self.stdout.write(f'{alias}: never synced')
+                behind.append(alias)
+                continue
+            self.stdout.write(f'{alias}: {lag.total_seconds():.1f} s behind')
+            if options['max_lag'] is not None and lag.total_seconds() > options['max_lag']:
+                behind.append(alias)
+        if behind:
+            raise CommandError(f'Replicas behind: {", ".join(behind)}')
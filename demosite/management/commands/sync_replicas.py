@@ -0,0 +1,28 @@
+import time
+
+from django.core.management.base import BaseCommand, CommandError
+
+from demosite.replicas import replica_aliases, sync_replicas
+
+
+class Command(BaseCommand):
+    help = (
+        'Copy the default database over each read replica (all of DATABASE_REPLICAS '
+        'unless aliases are given), stamping the heartbeat the lag is measured from.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('aliases', nargs='*', help='Replicas to sync (default: all).')
+
+    def handle(self, *args, **options):
+        aliases = options['aliases'] or replica_aliases()
+        unknown = set(aliases) - set(replica_aliases())
+        if unknown:
+            raise CommandError(f'Not in DATABASE_REPLICAS: {", ".join(sorted(unknown))}')
+        if not aliases:
+            raise CommandError('No replicas are configured in DATABASE_REPLICAS.')
+
+        start = time.perf_counter()
+        sync_replicas(aliases)
+        elapsed = (time.perf_counter() - start) * 1000
+        self.stdout.write(self.style.SUCCESS(f'Synced {len(aliases)} replica(s) in {elapsed:.0f} ms.'))
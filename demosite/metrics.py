@@ -0,0 +1,322 @@
+"""
+Per-view request metrics in the Prometheus text format.
+
+`MetricsMiddleware` times every request and counts the database queries it
+runs (on every database, through the wrapper `install_wrapper()` puts on
+each connection) and the time they take. It runs in sync and in async
+mode, so it leaves ASGI requests async. `TimedDjangoTemplates`, the
+template backend in the settings, adds the time spent rendering
+templates. Every sample is labelled with the URL name of the view that
+served the request, such as `catalog:books` or `polls:vote`.
+
+Each worker process adds up its samples in memory and, at most once per
+`METRICS_FLUSH_INTERVAL` seconds, adds them to the SQLite file named by
+`METRICS_STORE`, which every worker on the host shares. The `/metrics`
+view flushes its own process and then reports the totals in that file, so
+whichever worker Prometheus scrapes, it sees the whole host.
+"""
+import atexit
+import json
+import logging
+import math
+import sqlite3
+import threading
+import time
+from collections import defaultdict
+from contextlib import closing
+from contextvars import ContextVar
+
+from asgiref.sync import iscoroutinefunction, markcoroutinefunction, sync_to_async
+from django.conf import settings
+from django.db.backends.signals import connection_created
+from django.dispatch import receiver
+from django.http import HttpResponse
+from django.template.backends.django import DjangoTemplates, Template, reraise
+from django.template.exceptions import TemplateDoesNotExist
+
+REQUESTS = 'demosite_http_requests_total'
+REQUEST_DURATION = 'demosite_http_request_duration_seconds'
+DB_QUERIES = 'demosite_db_queries_total'
+DB_QUERIES_PER_REQUEST = 'demosite_db_queries_per_request'
+DB_DURATION = 'demosite_db_query_duration_seconds_total'
+TEMPLATE_DURATION = 'demosite_template_render_duration_seconds_total'
+
+# name: (type, help, histogram buckets)
+FAMILIES = {
+    REQUESTS: ('counter', 'Requests served, by view, method and status.', None),
+    REQUEST_DURATION: (
+        'histogram', 'Time taken to serve a request, by view.',
+        (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0),
+    ),
+    DB_QUERIES: ('counter', 'Database queries run while serving requests, by view.', None),
+    DB_QUERIES_PER_REQUEST: (
+        'histogram', 'Database queries run per request, by view.',
+        (0, 1, 2, 5, 10, 20, 50, 100),
+    ),
+    DB_DURATION: ('counter', 'Time spent in database queries while serving requests, by view.', None),
+    TEMPLATE_DURATION: ('counter', 'Time spent rendering templates while serving requests, by view.', None),
+}
+
+METHODS = {'GET', 'HEAD', 'POST', 'PUT', 'PATCH', 'DELETE', 'OPTIONS'}
+UNRESOLVED = '<unresolved>'
+
+logger = logging.getLogger(__name__)
+
+_current = ContextVar('request_metrics', default=None)
+
+
+class _RequestMetrics:
+    __slots__ = ('queries', 'db_time', 'template_time', 'rendering')
+
+    def __init__(self):
+        self.queries = 0
+        self.db_time = 0.0
+        self.template_time = 0.0
+        self.rendering = False
+
+
+def store_path():
+    return getattr(settings, 'METRICS_STORE', None)
+
+
+def flush_interval():
+    return getattr(settings, 'METRICS_FLUSH_INTERVAL', 5)
+
+
+def _connect(path):
+    conn = sqlite3.connect(path, timeout=5)
+    conn.execute('PRAGMA journal_mode = wal')
+    conn.execute(
+        'CREATE TABLE IF NOT EXISTS samples ('
+        'name TEXT NOT NULL, labels TEXT NOT NULL, value REAL NOT NULL, PRIMARY KEY (name, labels))'
+    )
+    return conn
+
+
+def add_samples(path, samples):
+    """Add `{(name, labels): value}` to the totals in the store at `path`."""
+    with closing(_connect(path)) as conn, conn:
+        conn.executemany(
+            'INSERT INTO samples (name, labels, value) VALUES (?, ?, ?) '
+            'ON CONFLICT (name, labels) DO UPDATE SET value = value + excluded.value',
+            [(name, json.dumps(labels), value) for (name, labels), value in samples.items()],
+        )
+
+
+def read_samples(path):
+    """Return the totals in the store at `path` as `{(name, labels): value}`."""
+    with closing(_connect(path)) as conn:
+        rows = conn.execute('SELECT name, labels, value FROM samples').fetchall()
+    return {(name, tuple(map(tuple, json.loads(labels)))): value for name, labels, value in rows}
+
+
+class MetricsBuffer:
+
+    def __init__(self, clock=time.monotonic):
+        self.clock = clock
+        self._pending = defaultdict(float)
+        self._totals = defaultdict(float)
+        self._lock = threading.Lock()
+        self._last_flush = clock()
+
+    def inc(self, name, labels, value=1):
+        """Add `value` to the counter `name` with `labels`, a tuple of pairs."""
+        with self._lock:
+            self._pending[name, labels] += value
+
+    def observe(self, name, labels, value):
+        """Record `value` in the histogram `name`."""
+        buckets = FAMILIES[name][2]
+        with self._lock:
+            for le in buckets:
+                if value <= le:
+                    self._pending[f'{name}_bucket', labels + (('le', _format(le)),)] += 1
+            self._pending[f'{name}_bucket', labels + (('le', '+Inf'),)] += 1
+            self._pending[f'{name}_sum', labels] += value
+            self._pending[f'{name}_count', labels] += 1
+
+    def pending(self):
+        return dict(self._pending)
+
+    def totals(self):
+        """Return this process's totals, kept when there is no `METRICS_STORE`."""
+        return dict(self._totals)
+
+    def flush(self):
+        """
+        Add the buffered samples to the shared store. If the store can't be
+        written, the error is logged and the samples are kept for the next
+        flush, so that a request that happens to flush still gets served.
+        """
+        path = store_path()
+        with self._lock:
+            samples, self._pending = self._pending, defaultdict(float)
+            self._last_flush = self.clock()
+            if path is None:
+                for key, value in samples.items():
+                    self._totals[key] += value
+                return
+        if not samples:
+            return
+        try:
+            add_samples(path, samples)
+        except Exception:
+            logger.exception('Could not add the metrics to %s', path)
+            with self._lock:
+                for key, value in samples.items():
+                    self._pending[key] += value
+
+    def is_due(self, interval):
+        return self.clock() - self._last_flush >= interval
+
+    def flush_if_due(self, interval):
+        if self.is_due(interval):
+            self.flush()
+
+
+metrics_buffer = MetricsBuffer()
+atexit.register(metrics_buffer.flush)
+
+
+def _time_query(execute, sql, params, many, context):
+    request_metrics = _current.get()
+    if request_metrics is None:
+        return execute(sql, params, many, context)
+    start = time.perf_counter()
+    try:
+        return execute(sql, params, many, context)
+    finally:
+        request_metrics.queries += 1
+        request_metrics.db_time += time.perf_counter() - start
+
+
+@receiver(connection_created)
+def install_wrapper(sender, connection, **kwargs):
+    """
+    Count the queries on a new connection towards the request being served.
+    On every connection rather than around each request, as under ASGI the
+    views run their queries on the connections of other threads.
+    """
+    if _time_query not in connection.execute_wrappers:
+        # First, so that the `execute_wrapper()` blocks open around it
+        # still pop their own.
+        connection.execute_wrappers.insert(0, _time_query)
+
+
+class MetricsMiddleware:
+    """Record the metrics of each request. Goes first in `MIDDLEWARE`."""
+
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        if iscoroutinefunction(get_response):
+            markcoroutinefunction(self)
+
+    def __call__(self, request):
+        if iscoroutinefunction(self):
+            return self.__acall__(request)
+        request_metrics = _RequestMetrics()
+        token = _current.set(request_metrics)
+        start = time.perf_counter()
+        try:
+            response = self.get_response(request)
+        finally:
+            _current.reset(token)
+        self.record(request, response, request_metrics, time.perf_counter() - start)
+        metrics_buffer.flush_if_due(flush_interval())
+        return response
+
+    async def __acall__(self, request):
+        request_metrics = _RequestMetrics()
+        token = _current.set(request_metrics)
+        start = time.perf_counter()
+        try:
+            response = await self.get_response(request)
+        finally:
+            _current.reset(token)
+        self.record(request, response, request_metrics, time.perf_counter() - start)
+        if metrics_buffer.is_due(flush_interval()):
+            # Writes to the store, off the event loop.
+            await sync_to_async(metrics_buffer.flush)()
+        return response
+
+    def record(self, request, response, request_metrics, duration):
+        match = getattr(request, 'resolver_match', None)
+        view = (('view', match.view_name if match else UNRESOLVED),)
+        method = request.method if request.method in METHODS else 'other'
+        metrics_buffer.inc(REQUESTS, view + (('method', method), ('status', str(response.status_code))))
+        metrics_buffer.observe(REQUEST_DURATION, view, duration)
+        metrics_buffer.inc(DB_QUERIES, view, request_metrics.queries)
+        metrics_buffer.observe(DB_QUERIES_PER_REQUEST, view, request_metrics.queries)
+        metrics_buffer.inc(DB_DURATION, view, request_metrics.db_time)
+        metrics_buffer.inc(TEMPLATE_DURATION, view, request_metrics.template_time)
+
+
+class TimedTemplate(Template):
+
+    def render(self, context=None, request=None):
+        request_metrics = _current.get()
+        if request_metrics is None or request_metrics.rendering:
+            return super().render(context, request)
+        # Templates rendered from within another one count towards it.
+        request_metrics.rendering = True
+        start = time.perf_counter()
+        try:
+            return super().render(context, request)
+        finally:
+            request_metrics.template_time += time.perf_counter() - start
+            request_metrics.rendering = False
+
+
+class TimedDjangoTemplates(DjangoTemplates):
+    """The Django template backend, timing each render for `MetricsMiddleware`."""
+
+    def from_string(self, template_code):
+        return TimedTemplate(self.engine.from_string(template_code), self)
+
+    def get_template(self, template_name):
+        try:
+            return TimedTemplate(self.engine.get_template(template_name), self)
+        except TemplateDoesNotExist as exc:
+            reraise(exc, self)
+
+
+def _format(value):
+    if value == math.inf:
+        return '+Inf'
+    return repr(float(value))
+
+
+def _escape(value):
+    return str(value).replace('\\', r'\\').replace('\n', r'\n').replace('"', r'\"')
+
+
+def _sample_key(item):
+    (name, labels), _ = item
+    # Order a histogram's buckets by their bound rather than as text.
+    return name, [(key, float(value) if key == 'le' else 0, value) for key, value in labels]
+
+
+def render_metrics(samples):
+    """Return `{(name, labels): value}` in the Prometheus text format."""
+    lines = []
+    for family, (kind, help_text, _) in FAMILIES.items():
+        names = {family} if kind == 'counter' else {f'{family}_bucket', f'{family}_sum', f'{family}_count'}
+        lines += [f'# HELP {family} {help_text}', f'# TYPE {family} {kind}']
+        for (name, labels), value in sorted(
+            ((key, value) for key, value in samples.items() if key[0] in names), key=_sample_key,
+        ):
+            label_text = ','.join(f'{key}="{_escape(label)}"' for key, label in labels)
+            value = int(value) if value.is_integer() else value
+            lines.append(f'{name}{{{label_text}}} {value}' if labels else f'{name} {value}')
+    return '\n'.join(lines) + '\n'
+
+
+def metrics(request):
+    """Serve the metrics of every worker sharing the store."""
+    metrics_buffer.flush()
+    path = store_path()
+    samples = read_samples(path) if path is not None else metrics_buffer.totals()
+    return HttpResponse(render_metrics(samples), content_type='text/plain; version=0.0.4; charset=utf-8')
@@ -0,0 +1,9 @@
+from django.db import models
+
+
+class ReplicaHeartbeat(models.Model):
+    """
+    A single row stamped on the default database each time the replicas
+    are synced; the copy a replica holds tells how old its data is.
+    """
+    beat = models.DateTimeField()
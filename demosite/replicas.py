@@ -0,0 +1,59 @@
+"""
+Read replicas of the default database.
+
+A replica is another SQLite database in `DATABASES` whose alias is listed
+in the `DATABASE_REPLICAS` setting; `demosite.routers` sends catalog and
+polls reads to them. `sync_replica()` refreshes a replica with a copy of
+the default database made through SQLite's online backup API. Each sync
+first stamps the `ReplicaHeartbeat` row, so a replica's lag is the time
+since the heartbeat it holds was stamped: nothing written to the default
+database after that is in it yet.
+"""
+from django.conf import settings
+from django.db import DEFAULT_DB_ALIAS, DatabaseError, connections
+from django.utils import timezone
+
+from .models import ReplicaHeartbeat
+
+
+def replica_aliases():
+    """Return the aliases of the configured replicas."""
+    return list(getattr(settings, 'DATABASE_REPLICAS', []))
+
+
+def stamp_heartbeat():
+    """Stamp the heartbeat on the default database and return its time."""
+    beat = timezone.now()
+    ReplicaHeartbeat.objects.using(DEFAULT_DB_ALIAS).update_or_create(pk=1, defaults={'beat': beat})
+    return beat
+
+
+def sync_replica(alias):
+    """Overwrite replica `alias` with a copy of the default database."""
+    source, target = connections[DEFAULT_DB_ALIAS], connections[alias]
+    source.ensure_connection()
+    target.ensure_connection()
+    source.connection.backup(target.connection)
+
+
+def sync_replicas(aliases=None):
+    """Stamp the heartbeat and sync each replica. Returns the heartbeat time."""
+    beat = stamp_heartbeat()
+    for alias in replica_aliases() if aliases is None else aliases:
+        sync_replica(alias)
+    return beat
+
+
+def replica_lag(alias):
+    """
+    Return how far replica `alias` is behind as a timedelta, or None if it
+    has never been synced.
+    """
+    try:
+        beat = ReplicaHeartbeat.objects.using(alias).values_list('beat', flat=True).first()
+    except DatabaseError:
+        # The heartbeat table only exists once the replica has been synced.
+        return None
+    if beat is None:
+        return None
+    return timezone.now() - beat
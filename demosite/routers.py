@@ -0,0 +1,139 @@
+"""
+Routing of catalog and polls reads to the read replicas.
+
+Reads made while handling a request go to one replica, picked at random
+per request (see `demosite.replicas`). Everything else uses the default
+database: writes, reads inside a transaction on it, reads made by
+management commands and other code outside a request, and every read of
+apps other than catalog and polls.
+
+Replicas trail the default database until their next sync, so a user
+who has just written would not see their own change. Once a request
+writes to a routed app, its remaining reads go to the default database,
+and `ReplicaPinningMiddleware` sets a short-lived cookie that keeps that
+user's requests on the default database for `REPLICA_PIN_SECONDS`. It
+runs in sync and in async mode, so it leaves ASGI requests async.
+"""
+import random
+import time
+from contextvars import ContextVar
+from dataclasses import dataclass
+
+from asgiref.sync import iscoroutinefunction, markcoroutinefunction
+from django.conf import settings
+from django.db import DEFAULT_DB_ALIAS, connections
+
+from .replicas import replica_aliases
+
+ROUTED_APPS = {'catalog', 'polls'}
+PIN_COOKIE = 'replica_pin'
+
+
+@dataclass
+class _RequestState:
+    replica: str = None
+    wrote: bool = False
+
+
+_request_state = ContextVar('replica_request_state', default=None)
+
+
+def pin_seconds():
+    return getattr(settings, 'REPLICA_PIN_SECONDS', 60)
+
+
+class ReplicaRouter:
+
+    def db_for_read(self, model, **hints):
+        state = _request_state.get()
+        if state is None or state.replica is None or state.wrote:
+            return None
+        if model._meta.app_label not in ROUTED_APPS:
+            return None
+        if connections[DEFAULT_DB_ALIAS].in_atomic_block:
+            # Reads in a transaction must see its own writes.
+            return None
+        return state.replica
+
+    def db_for_write(self, model, **hints):
+        state = _request_state.get()
+        if state is not None and model._meta.app_label in ROUTED_APPS:
+            state.wrote = True
+        return None
+
+    def allow_relation(self, obj1, obj2, **hints):
+        # The replicas hold the same rows as the default database.
+        databases = {DEFAULT_DB_ALIAS, *replica_aliases()}
+        if obj1._state.db in databases and obj2._state.db in databases:
+            return True
+        return None
+
+    def allow_migrate(self, db, app_label, model_name=None, **hints):
+        # Replicas get their schema along with the data when synced.
+        if db in replica_aliases():
+            return False
+        return None
+
+
+class ReplicaPinningMiddleware:
+    """
+    Route the reads of each request through `ReplicaRouter`, unless the
+    user wrote recently, and pin users who write to the default database.
+    """
+
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        if iscoroutinefunction(get_response):
+            markcoroutinefunction(self)
+
+    def __call__(self, request):
+        if iscoroutinefunction(self):
+            return self.__acall__(request)
+        state = self.request_state(request)
+        if state is None:
+            return self.get_response(request)
+        token = _request_state.set(state)
+        try:
+            response = self.get_response(request)
+        finally:
+            _request_state.reset(token)
+        return self.pin(response, state)
+
+    async def __acall__(self, request):
+        state = self.request_state(request)
+        if state is None:
+            return await self.get_response(request)
+        # Copied into the threads that run the sync code, which route
+        # through this same state object.
+        token = _request_state.set(state)
+        try:
+            response = await self.get_response(request)
+        finally:
+            _request_state.reset(token)
+        return self.pin(response, state)
+
+    def request_state(self, request):
+        """Return the routing state for `request`, or None without replicas."""
+        aliases = replica_aliases()
+        if not aliases:
+            return None
+        state = _RequestState()
+        try:
+            pinned = float(request.COOKIES.get(PIN_COOKIE, 0)) > time.time()
+        except ValueError:
+            pinned = False
+        if not pinned:
+            state.replica = random.choice(aliases)
+        return state
+
+    def pin(self, response, state):
+        """Pin the user to the default database if the request wrote."""
+        if state.wrote:
+            seconds = pin_seconds()
+            response.set_cookie(
+                PIN_COOKIE, str(int(time.time() + seconds)), max_age=seconds, httponly=True, samesite='Lax',
+            )
+        return response
@@ -10,6 +10,7 @@ For the full list of settings and their values, see
 https://docs.djangoproject.com/en/4.1/ref/settings/
 """
 
+import tempfile
 from pathlib import Path
 
 # Build paths inside the project like this: BASE_DIR / 'subdir'.
@@ -31,6 +32,7 @@ ALLOWED_HOSTS = []
 # Application definition
 
 INSTALLED_APPS = [
+    'demosite.apps.DemositeConfig',
     'catalog.apps.CatalogConfig',
     'polls.apps.PollsConfig',
     'django.contrib.admin',
@@ -42,7 +44,10 @@ INSTALLED_APPS = [
 ]
 
 MIDDLEWARE = [
+    'demosite.metrics.MetricsMiddleware',
+    'demosite.slowlog.SlowQueryLogMiddleware',
     'django.middleware.security.SecurityMiddleware',
+    'demosite.routers.ReplicaPinningMiddleware',
     'django.contrib.sessions.middleware.SessionMiddleware',
     'django.middleware.common.CommonMiddleware',
     'django.middleware.csrf.CsrfViewMiddleware',
@@ -55,9 +60,10 @@ ROOT_URLCONF = 'demosite.urls'
 
 TEMPLATES = [
     {
-        'BACKEND': 'django.template.backends.django.DjangoTemplates',
+        # Django's backend, also timing renders for demosite.metrics
+        'BACKEND': 'demosite.metrics.TimedDjangoTemplates',
+        'NAME': 'django',
         'DIRS': [BASE_DIR / 'templates'],  # this is a search path for root templates
-        'APP_DIRS': True,
         'OPTIONS': {
             'context_processors': [
                 'django.template.context_processors.debug',
@@ -65,10 +71,23 @@ TEMPLATES = [
                 'django.contrib.auth.context_processors.auth',
                 'django.contrib.messages.context_processors.messages',
             ],
+            # Compiled templates are kept for the life of the process (the
+            # dev server's autoreloader still resets them when a file changes).
+            'loaders': [
+                ('django.template.loaders.cached.Loader', [
+                    'django.template.loaders.filesystem.Loader',
+                    'django.template.loaders.app_directories.Loader',
+                ]),
+            ],
         },
     },
 ]
 
+# Setting to have each process compile the templates and URL patterns all
+# at once as it loads the WSGI or ASGI application, before it serves a
+# request, instead of as each is first used (see catalog.warmup)
+WARM_UP_ON_STARTUP = not DEBUG
+
 WSGI_APPLICATION = 'demosite.wsgi.application'
 
 
@@ -79,6 +98,58 @@ DATABASES = {
     'default': {
         'ENGINE': 'django.db.backends.sqlite3',
         'NAME': BASE_DIR / 'db.sqlite3',
+        # Keep each thread's connection open across requests, so the
+        # pragmas below are set once per connection rather than per request
+        'CONN_MAX_AGE': 600,
+        'CONN_HEALTH_CHECKS': True,
+    }
+}
+
+# A copy of the default database that catalog and polls reads can be sent
+# to; refreshed with `python manage.py sync_replicas`
+DATABASES['replica'] = {
+    **DATABASES['default'],
+    'NAME': BASE_DIR / 'db.replica.sqlite3',
+}
+
+# Setting to have catalog and polls reads made by views spread over these
+# databases (see demosite.routers); empty sends everything to 'default'
+DATABASE_REPLICAS = []
+
+DATABASE_ROUTERS = ['demosite.routers.ReplicaRouter']
+
+# Setting to have users who just wrote read from 'default' for this many
+# seconds, so that they see their change before the replicas are synced
+REPLICA_PIN_SECONDS = 60
+
+# Setting to have every new SQLite connection configured with these pragmas
+# (see demosite.sqlite). WAL lets readers run alongside the one writer, and
+# writers wait up to busy_timeout ms for each other instead of failing.
+SQLITE_PRAGMAS = {
+    'synchronous': 'normal',
+    'busy_timeout': 5000,
+    'cache_size': -64 * 1024,
+    'mmap_size': 256 * 1024 * 1024,
+}
+# WAL is written into the database file itself, and adds -wal and -shm files
+# next to it, so the development db.sqlite3 kept in git stays as committed
+if not DEBUG:
+    SQLITE_PRAGMAS['journal_mode'] = 'wal'
+
+
+# Cache
+# https://docs.djangoproject.com/en/4.1/topics/cache/
+
+# Shared by every worker process on the host, like METRICS_STORE: the
+# cached statistics, pages, poll results and fragments are retired by the
+# process that writes, and every other worker must see that too
+CACHES = {
+    'default': {
+        'BACKEND': 'django.core.cache.backends.filebased.FileBasedCache',
+        'LOCATION': Path(tempfile.gettempdir()) / 'demosite-cache',
+        'OPTIONS': {
+            'MAX_ENTRIES': 10000,
+        },
     }
 }
 
@@ -128,4 +199,59 @@ DEFAULT_AUTO_FIELD = 'django.db.models.BigAutoField'
 LOGIN_REDIRECT_URL = ''
 
 # Setting to have demo reset emails sent to the console
-EMAIL_BACKEND = 'django.core.mail.backends.console.EmailBackend'
\ No newline at end of file
+EMAIL_BACKEND = 'django.core.mail.backends.console.EmailBackend'
+
+# Setting to have poll votes buffered per process for this many seconds
+# before being written; 0 writes each vote as it is cast (see polls.votes)
+POLLS_VOTE_FLUSH_INTERVAL = 0
+
+# Setting to have the per-view request metrics of every worker process on
+# the host added up in this file, and served at /metrics (see demosite.metrics)
+METRICS_STORE = Path(tempfile.gettempdir()) / 'demosite-metrics.sqlite3'
+
+# Setting to have each worker add its metrics to METRICS_STORE at most this
+# often, in seconds
+METRICS_FLUSH_INTERVAL = 5
+
+# Setting to have the tests run without METRICS_STORE, so that test client
+# requests are never served at /metrics as real traffic, and with a cache of
+# their own rather than the one the host's workers share
+TEST_RUNNER = 'demosite.test_runner.TestRunner'
+
+# Setting to have database queries that take longer than this many seconds
+# logged, with the view and line of code that ran them (see demosite.slowlog)
+SLOW_QUERY_THRESHOLD = 0.2
+
+# Setting to have only this share of the slow queries logged
+SLOW_QUERY_SAMPLE_RATE = 1.0
+
+
+# Logging
+# https://docs.djangoproject.com/en/4.1/topics/logging/
+
+LOGGING = {
+    'version': 1,
+    'disable_existing_loggers': False,
+    'formatters': {
+        'message': {'format': '%(message)s'},
+    },
+    'handlers': {
+        # One JSON object per line, appended to by every worker process.
+        # Rotate it from outside, e.g. with logrotate: each worker reopens
+        # the file once it has been moved away, whereas a worker rotating
+        # it itself would leave the others writing to the old file.
+        'slow_queries': {
+            'class': 'logging.handlers.WatchedFileHandler',
+            'filename': BASE_DIR / 'slow_queries.jsonl',
+            'delay': True,
+            'formatter': 'message',
+        },
+    },
+    'loggers': {
+        'demosite.slow_queries': {
+            'handlers': ['slow_queries'],
+            'level': 'INFO',
+            'propagate': False,
+        },
+    },
+}
@@ -0,0 +1,160 @@
+"""
+Slow-query log.
+
+Every database connection runs its queries through `log_slow_query()`,
+which only times them: a query that takes longer than
+`SLOW_QUERY_THRESHOLD` seconds is logged, for a `SLOW_QUERY_SAMPLE_RATE`
+share of them, as one JSON object per line to the `demosite.slow_queries`
+logger (a file that every worker process appends to, see `LOGGING` in the
+settings). Fast queries cost two clock reads.
+
+Each entry names the view serving the request (set by
+`SlowQueryLogMiddleware`), the project line of code the query came from
+(the innermost frame in the project's own files, e.g.
+`catalog/views.py:manage_member`), and the SQL with its literals and
+placeholders replaced by `?`, so that entries for the same query group
+together.
+"""
+import json
+import logging
+import random
+import re
+import sys
+import time
+from contextvars import ContextVar
+from pathlib import Path
+
+from asgiref.sync import iscoroutinefunction, markcoroutinefunction
+from django.conf import settings
+from django.db.backends.signals import connection_created
+from django.dispatch import receiver
+from django.utils import timezone
+
+logger = logging.getLogger('demosite.slow_queries')
+
+_current_request = ContextVar('slow_query_request', default=None)
+
+# Middleware and wrappers that every query passes through; the call site
+# is the code that ran the query, below them.
+_SKIPPED_FILES = {str(Path(__file__).with_name(name)) for name in ('metrics.py', 'routers.py', 'slowlog.py')}
+
+_STRING = re.compile(r"'(?:[^']|'')*'")
+_NUMBER = re.compile(r'(?<![\w."])-?\b\d+(?:\.\d+)?\b')
+_PLACEHOLDER = re.compile(r'%s|\?')
+_IN_LIST = re.compile(r'\(\s*\?(?:\s*,\s*\?)+\s*\)')
+_SPACE = re.compile(r'\s+')
+
+
+def threshold():
+    return getattr(settings, 'SLOW_QUERY_THRESHOLD', 0.2)
+
+
+def sample_rate():
+    return getattr(settings, 'SLOW_QUERY_SAMPLE_RATE', 1.0)
+
+
+def normalize_sql(sql):
+    """Replace the literals and placeholders in `sql` with `?`, and lists of them with `(...)`."""
+    sql = _STRING.sub('?', sql)
+    sql = _NUMBER.sub('?', sql)
+    sql = _PLACEHOLDER.sub('?', sql)
+    sql = _IN_LIST.sub('(...)', sql)
+    return _SPACE.sub(' ', sql).strip()
+
+
+def call_site():
+    """
+    Return `(path, function, line)` of the innermost frame in the project's
+    own code, or None if the query came from Django alone, as in generic
+    views.
+    """
+    base_dir = str(Path(settings.BASE_DIR).resolve()) + '/'
+    frame = sys._getframe(1)
+    while frame is not None:
+        filename = frame.f_code.co_filename
+        if (
+            filename.startswith(base_dir)
+            and filename not in _SKIPPED_FILES
+            and 'site-packages' not in filename
+        ):
+            return filename[len(base_dir):], frame.f_code.co_name, frame.f_lineno
+        frame = frame.f_back
+    return None
+
+
+def _params_count(params, many):
+    if not params:
+        return 0
+    if many:
+        params = list(params)
+        return len(params[0]) if params else 0
+    return len(params)
+
+
+def log_slow_query(execute, sql, params, many, context):
+    start = time.perf_counter()
+    try:
+        return execute(sql, params, many, context)
+    finally:
+        duration = time.perf_counter() - start
+        if duration >= threshold() and random.random() < sample_rate():
+            _log(duration, sql, params, many, context)
+
+
+def _log(duration, sql, params, many, context):
+    request = _current_request.get()
+    match = getattr(request, 'resolver_match', None)
+    site = call_site()
+    entry = {
+        'time': timezone.now().isoformat(),
+        'duration_ms': round(duration * 1000, 3),
+        'database': context['connection'].alias,
+        'view': match.view_name if match else None,
+        'path': request.path if request is not None else None,
+        'call_site': f'{site[0]}:{site[1]}' if site else None,
+        'line': site[2] if site else None,
+        'sql': normalize_sql(sql),
+        'params': _params_count(params, many),
+        'many': many,
+    }
+    logger.info(json.dumps(entry))
+
+
+@receiver(connection_created)
+def install_wrapper(sender, connection, **kwargs):
+    """Time every query on a new connection."""
+    if log_slow_query not in connection.execute_wrappers:
+        # First, so that it times the query alone, and so that the
+        # `execute_wrapper()` blocks open around it still pop their own.
+        connection.execute_wrappers.insert(0, log_slow_query)
+
+
+class SlowQueryLogMiddleware:
+    """
+    Make the request known to the slow-query log, for its view name. Runs
+    in sync and in async mode, so it leaves ASGI requests async.
+    """
+
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        if iscoroutinefunction(get_response):
+            markcoroutinefunction(self)
+
+    def __call__(self, request):
+        if iscoroutinefunction(self):
+            return self.__acall__(request)
+        token = _current_request.set(request)
+        try:
+            return self.get_response(request)
+        finally:
+            _current_request.reset(token)
+
+    async def __acall__(self, request):
+        token = _current_request.set(request)
+        try:
+            return await self.get_response(request)
+        finally:
+            _current_request.reset(token)
@@ -0,0 +1,33 @@
+"""
+Per-connection SQLite tuning.
+
+SQLite keeps most of its settings per connection, so they are applied as
+each connection is opened, from the `SQLITE_PRAGMAS` setting. With the
+`CONN_MAX_AGE` setting the connections, and so this setup, are reused
+across requests.
+
+`journal_mode = wal` is stored in the database file itself; the other
+pragmas only last for the connection. The settings only turn it on with
+`DEBUG` off, so that running the project from a checkout leaves the
+committed database file alone. In-memory databases, such as the test
+database, ignore WAL and keep their own journal mode.
+"""
+from django.conf import settings
+from django.db.backends.signals import connection_created
+from django.dispatch import receiver
+
+
+def pragmas():
+    """Return the configured `{pragma: value}` pairs."""
+    return getattr(settings, 'SQLITE_PRAGMAS', {})
+
+
+@receiver(connection_created)
+def configure_connection(sender, connection, **kwargs):
+    """Apply `pragmas()` to a new SQLite connection."""
+    if connection.vendor != 'sqlite':
+        return
+    for name, value in pragmas().items():
+        # Straight on the DB-API connection: pragma values can't be
+        # parameters, and this shouldn't show up as a query of its own.
+        connection.connection.execute(f'PRAGMA {name} = {value}')
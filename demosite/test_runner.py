@@ -0,0 +1,43 @@
+"""
+Test runner for the project.
+
+Like Django's own, but for the whole run with no `METRICS_STORE` and with
+a cache in the test process's own memory: the requests made by the test
+client are no host's traffic, and must not be added to the store that
+`/metrics` serves, and the tests clear and fill the cache as they go,
+which must not reach the cache the host's workers share. Tests that
+exercise the store point `METRICS_STORE` at a file of their own. The
+index page visits left buffered are written out while the test databases
+still exist, rather than at exit to the database the settings name.
+"""
+from django.test.runner import DiscoverRunner
+from django.test.utils import override_settings
+
+from catalog.visits import visit_counter
+
+from .metrics import metrics_buffer
+
+TEST_CACHES = {
+    'default': {
+        'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+    }
+}
+
+
+class TestRunner(DiscoverRunner):
+
+    def setup_test_environment(self, **kwargs):
+        super().setup_test_environment(**kwargs)
+        self._test_settings = override_settings(METRICS_STORE=None, CACHES=TEST_CACHES)
+        self._test_settings.enable()
+
+    def teardown_databases(self, old_config, **kwargs):
+        visit_counter.flush_idle(force=True)
+        super().teardown_databases(old_config, **kwargs)
+
+    def teardown_test_environment(self, **kwargs):
+        # Keep what is left in memory, rather than flush it at exit to the
+        # store the setting names again after this.
+        metrics_buffer.flush()
+        self._test_settings.disable()
+        super().teardown_test_environment(**kwargs)
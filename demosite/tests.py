@@ -0,0 +1,371 @@
+import json
+import tempfile
+from datetime import date, timedelta
+from io import StringIO
+from pathlib import Path
+from unittest import mock
+
+from asgiref.sync import iscoroutinefunction, sync_to_async
+from django.conf import settings
+from django.contrib.auth.models import User
+from django.core.cache import cache, caches
+from django.core.cache.backends.locmem import LocMemCache
+from django.core.handlers.asgi import ASGIHandler
+from django.core.management import CommandError, call_command
+from django.db import connection, transaction
+from django.db.models import F
+from django.http import HttpResponse
+from django.test import RequestFactory, SimpleTestCase, TestCase, TransactionTestCase, override_settings
+from django.urls import reverse
+from django.utils import timezone
+
+from catalog.models import Author, Book, BookInstance, Genre
+from catalog.search import BookSearchResults
+from demosite import metrics
+from demosite.dataset import CJK_SURNAMES, generate_library
+from demosite.metrics import DB_QUERIES, REQUESTS, MetricsBuffer, read_samples
+from demosite.replicas import replica_lag
+from demosite.routers import PIN_COOKIE, ReplicaPinningMiddleware
+from demosite.slowlog import normalize_sql
+from demosite.sqlite import configure_connection
+from demosite.test_runner import TEST_CACHES
+from polls.models import Choice, Question
+
+
+class FakeClock:
+
+    def __init__(self):
+        self.now = 0.0
+
+    def __call__(self):
+        return self.now
+
+
+class SQLitePragmaTests(TestCase):
+
+    def pragma(self, name):
+        with connection.cursor() as cursor:
+            cursor.execute(f'PRAGMA {name}')
+            return cursor.fetchone()[0]
+
+    def test_configured_pragmas_are_applied(self):
+        # set on the test database's connection as it was opened
+        self.assertEqual(self.pragma('busy_timeout'), 5000)
+        self.assertEqual(self.pragma('cache_size'), -64 * 1024)
+        self.assertEqual(self.pragma('synchronous'), 1)  # NORMAL
+
+    def test_pragmas_follow_the_setting(self):
+        # Only pragmas that can change inside the test's transaction.
+        changed = {'busy_timeout': 1234, 'cache_size': -1000}
+        original = {name: settings.SQLITE_PRAGMAS[name] for name in changed}
+        try:
+            with self.settings(SQLITE_PRAGMAS=changed):
+                configure_connection(sender=connection.__class__, connection=connection)
+            self.assertEqual(self.pragma('busy_timeout'), 1234)
+            self.assertEqual(self.pragma('cache_size'), -1000)
+        finally:
+            with self.settings(SQLITE_PRAGMAS=original):
+                configure_connection(sender=connection.__class__, connection=connection)
+
+
+@override_settings(DATABASE_REPLICAS=['replica'])
+class ReplicaRoutingTests(TransactionTestCase):
+    # The 'replica' test database is a second SQLite database, refreshed
+    # from the default one by `sync_replicas` like the real replica.
+    databases = {'default', 'replica'}
+
+    def setUp(self):
+        cache.clear()
+        self.question = Question.objects.create(question_text='Original?', pub_date=timezone.now())
+        self.choice = self.question.choice_set.create(choice_text='Yes')
+        call_command('sync_replicas', stdout=StringIO())
+        # A change the replica doesn't have yet.
+        Question.objects.filter(pk=self.question.pk).update(question_text='Changed?')
+
+    def get_detail(self):
+        return self.client.get(reverse('polls:detail', args=[self.question.pk]))
+
+    def test_view_reads_go_to_the_replica(self):
+        self.assertContains(self.get_detail(), 'Original?')
+
+    def test_reads_outside_requests_go_to_default(self):
+        self.assertEqual(Question.objects.get().question_text, 'Changed?')
+
+    def test_writer_is_pinned_to_default(self):
+        resp = self.client.post(reverse('polls:vote', args=[self.question.pk]), {'choice': self.choice.pk})
+        self.assertIn(PIN_COOKIE, resp.cookies)
+        self.assertContains(self.get_detail(), 'Changed?')
+
+        self.client.cookies.pop(PIN_COOKIE)
+        self.assertContains(self.get_detail(), 'Original?')
+
+    def test_reads_after_a_write_or_in_a_transaction_go_to_default(self):
+        def view(request):
+            dbs = [Question.objects.all().db]
+            with transaction.atomic():
+                dbs.append(Question.objects.all().db)
+            Choice.objects.filter(pk=self.choice.pk).update(votes=1)
+            dbs.append(Question.objects.all().db)
+            return HttpResponse(' '.join(dbs))
+
+        resp = ReplicaPinningMiddleware(view)(RequestFactory().get('/'))
+        self.assertEqual(resp.content.decode(), 'replica default default')
+
+    async def test_async_requests_are_routed_and_pinned(self):
+        async def view(request):
+            db = Question.objects.all().db
+            await Choice.objects.filter(pk=self.choice.pk).aupdate(votes=1)
+            return HttpResponse(db)
+
+        middleware = ReplicaPinningMiddleware(view)
+        self.assertTrue(iscoroutinefunction(middleware))
+        resp = await middleware(RequestFactory().get('/'))
+        self.assertEqual(resp.content.decode(), 'replica')
+        self.assertIn(PIN_COOKIE, resp.cookies)
+
+    def test_cached_results_are_filled_from_default(self):
+        Choice.objects.filter(pk=self.choice.pk).update(votes=1)
+        resp = self.client.get(reverse('polls:results', args=[self.question.pk]))
+        self.assertContains(resp, 'Changed?')
+        self.assertContains(resp, 'Yes -- 1 vote')
+
+    def test_cached_rows_are_filled_from_default(self):
+        # Retires the cached genres page and rows once committed.
+        Genre.objects.create(name='Poetry')
+        self.assertContains(self.client.get(reverse('catalog:genres')), 'Poetry')
+
+    def test_lag(self):
+        out = StringIO()
+        call_command('replica_lag', '--max-lag', '60', stdout=out)
+        self.assertIn('replica:', out.getvalue())
+        with self.assertRaisesMessage(CommandError, 'Replicas behind: replica'):
+            call_command('replica_lag', '--max-lag', '0', stdout=StringIO())
+        self.assertLess(replica_lag('replica'), timedelta(seconds=60))
+
+
+class MiddlewareTests(SimpleTestCase):
+
+    @override_settings(DEBUG=True)
+    def test_asgi_requests_stay_async(self):
+        # With DEBUG on, Django logs each middleware it has to adapt to the
+        # other mode, which would have it run in a thread of its own.
+        with self.assertNoLogs('django.request', 'DEBUG'):
+            handler = ASGIHandler()
+        self.assertTrue(iscoroutinefunction(handler._middleware_chain))
+
+
+class TestRunnerTests(SimpleTestCase):
+
+    def test_test_run_has_no_metrics_store(self):
+        # Set by `demosite.test_runner`; the metrics tests use stores of their own.
+        self.assertIsNone(settings.METRICS_STORE)
+
+    def test_test_run_has_a_cache_of_its_own(self):
+        # The tests clear the cache, which must not be the host's shared one.
+        self.assertEqual(settings.CACHES, TEST_CACHES)
+        self.assertIsInstance(caches['default'], LocMemCache)
+
+
+class MetricsTests(TestCase):
+
+    def setUp(self):
+        cache.clear()
+        # A buffer of its own, without samples from earlier tests.
+        buffer_patch = mock.patch('demosite.metrics.metrics_buffer', MetricsBuffer())
+        buffer_patch.start()
+        self.addCleanup(buffer_patch.stop)
+        tmpdir = tempfile.TemporaryDirectory()
+        self.addCleanup(tmpdir.cleanup)
+        self.store = str(Path(tmpdir.name) / 'metrics.sqlite3')
+        settings_override = self.settings(METRICS_STORE=self.store, METRICS_FLUSH_INTERVAL=3600)
+        settings_override.enable()
+        self.addCleanup(settings_override.disable)
+
+    def scrape(self):
+        resp = self.client.get('/metrics')
+        self.assertEqual(resp.status_code, 200)
+        self.assertEqual(resp['Content-Type'], 'text/plain; version=0.0.4; charset=utf-8')
+        return resp.content.decode()
+
+    def test_requests_are_recorded_per_view(self):
+        self.client.get(reverse('catalog:genres'))
+        self.client.get(reverse('catalog:genres'))
+        self.client.get('/no/such/page/')
+        text = self.scrape()
+
+        self.assertIn('# TYPE demosite_http_request_duration_seconds histogram', text)
+        self.assertIn('demosite_http_requests_total{view="catalog:genres",method="GET",status="200"} 2', text)
+        self.assertIn('demosite_http_requests_total{view="<unresolved>",method="GET",status="404"} 1', text)
+        self.assertIn('demosite_http_request_duration_seconds_bucket{view="catalog:genres",le="+Inf"} 2', text)
+        self.assertIn('demosite_http_request_duration_seconds_count{view="catalog:genres"} 2', text)
+        # The second request was served from the page cache.
+        self.assertIn('demosite_db_queries_total{view="catalog:genres"} 1', text)
+        self.assertIn('demosite_db_queries_per_request_bucket{view="catalog:genres",le="0.0"} 1', text)
+        self.assertRegex(text, r'demosite_template_render_duration_seconds_total\{view="catalog:genres"\} 0\.\d+')
+
+        # Buckets are cumulative and in order of their bounds.
+        buckets = [
+            line for line in text.splitlines()
+            if line.startswith('demosite_http_request_duration_seconds_bucket{view="catalog:genres"')
+        ]
+        self.assertIn('le="0.005"}', buckets[0])
+        self.assertIn('le="+Inf"}', buckets[-1])
+        counts = [int(line.rsplit(' ', 1)[1]) for line in buckets]
+        self.assertEqual(counts, sorted(counts))
+
+    def test_totals_add_up_across_processes(self):
+        # Another worker's buffer flushing into the same store.
+        other_worker = MetricsBuffer()
+        other_worker.inc(REQUESTS, (('view', 'catalog:index'), ('method', 'GET'), ('status', '200')), 3)
+        other_worker.flush()
+        self.client.get(reverse('catalog:index'))
+        self.assertIn('demosite_http_requests_total{view="catalog:index",method="GET",status="200"} 4', self.scrape())
+
+    def test_buffer_flushes_once_per_interval(self):
+        clock = FakeClock()
+        buffer = MetricsBuffer(clock=clock)
+        labels = (('view', 'polls:vote'),)
+        buffer.inc(DB_QUERIES, labels, 2)
+        buffer.flush_if_due(10)
+        self.assertEqual(read_samples(self.store), {})
+        clock.now += 10
+        buffer.inc(DB_QUERIES, labels, 1)
+        buffer.flush_if_due(10)
+        self.assertEqual(read_samples(self.store), {(DB_QUERIES, labels): 3})
+        self.assertEqual(buffer.pending(), {})
+
+    async def test_async_requests_are_recorded(self):
+        await self.async_client.get(reverse('catalog:async-genres'))
+        text = await sync_to_async(self.scrape)()
+        self.assertIn('demosite_http_requests_total{view="catalog:async-genres",method="GET",status="200"} 1', text)
+        self.assertIn('demosite_db_queries_total{view="catalog:async-genres"} 1', text)
+
+    def test_unwritable_store_does_not_fail_requests(self):
+        store = str(Path(self.store).parent / 'missing' / 'metrics.sqlite3')
+        with self.settings(METRICS_STORE=store, METRICS_FLUSH_INTERVAL=0):
+            with self.assertLogs('demosite.metrics', 'ERROR'):
+                resp = self.client.get(reverse('polls:index'))
+        self.assertEqual(resp.status_code, 200)
+        # Kept for the next flush.
+        self.assertIn(
+            (REQUESTS, (('view', 'polls:index'), ('method', 'GET'), ('status', '200'))),
+            metrics.metrics_buffer.pending(),
+        )
+
+
+class SlowQueryLogTests(TestCase):
+
+    def setUp(self):
+        cache.clear()
+
+    def logged(self, callable):
+        with self.assertLogs('demosite.slow_queries') as logs:
+            callable()
+        return [json.loads(record.getMessage()) for record in logs.records]
+
+    @override_settings(SLOW_QUERY_THRESHOLD=0)
+    def test_entries_name_view_and_call_site(self):
+        entries = self.logged(lambda: self.client.get(reverse('catalog:genres')))
+        entry = entries[-1]
+        self.assertEqual(entry['view'], 'catalog:genres')
+        self.assertEqual(entry['path'], reverse('catalog:genres'))
+        self.assertEqual(entry['call_site'], 'catalog/caching.py:cached_rows')
+        self.assertEqual(entry['database'], 'default')
+        self.assertIn('FROM "catalog_genre"', entry['sql'])
+        self.assertGreaterEqual(entry['duration_ms'], 0)
+
+        entry = self.logged(lambda: Question.objects.filter(pk__in=[1, 2, 3]).count())[0]
+        self.assertIsNone(entry['view'])
+        self.assertEqual(entry['call_site'], 'demosite/tests.py:<lambda>')
+        self.assertEqual(entry['params'], 3)
+        self.assertIn('IN (...)', entry['sql'])
+
+    @override_settings(SLOW_QUERY_THRESHOLD=0)
+    async def test_async_requests_name_their_view(self):
+        with self.assertLogs('demosite.slow_queries') as logs:
+            await self.async_client.get(reverse('catalog:async-genres'))
+        entry = json.loads(logs.records[-1].getMessage())
+        self.assertEqual(entry['view'], 'catalog:async-genres')
+        self.assertEqual(entry['path'], reverse('catalog:async-genres'))
+
+    def test_fast_or_unsampled_queries_are_not_logged(self):
+        with self.assertNoLogs('demosite.slow_queries'):
+            Question.objects.count()
+        with self.settings(SLOW_QUERY_THRESHOLD=0, SLOW_QUERY_SAMPLE_RATE=0):
+            with self.assertNoLogs('demosite.slow_queries'):
+                Question.objects.count()
+
+    def test_normalize_sql(self):
+        self.assertEqual(
+            normalize_sql("""SELECT "t"."a1" FROM "t"\n WHERE "t"."b" = 'it''s' AND "t"."c" IN (%s, %s, %s) LIMIT 21"""),
+            'SELECT "t"."a1" FROM "t" WHERE "t"."b" = ? AND "t"."c" IN (...) LIMIT ?',
+        )
+
+
+class LibraryGeneratorTests(TestCase):
+
+    SIZES = {
+        'books': 60, 'copies': 4, 'users': 6, 'librarians': 1, 'questions': 4,
+        'today': date(2026, 10, 1), 'batch_size': 25, 'workers': 1,
+    }
+
+    def generate(self, **kwargs):
+        return generate_library(**{**self.SIZES, **kwargs})
+
+    def snapshot(self):
+        return (
+            list(Book.objects.order_by('isbn').values_list(
+                'isbn', 'title', 'pub_date', 'language__name', 'authors_display', 'genres_display',
+            )),
+            list(BookInstance.objects.order_by('copy_id').values_list(
+                'copy_id', 'book', 'status', 'imprint', 'borrower__username', 'loaned_on', 'due_back',
+            )),
+            list(Question.objects.order_by('pk').values_list('question_text', 'pub_date', 'num_choices')),
+        )
+
+    def test_generated_library(self):
+        counts, statuses = self.generate()
+        self.assertEqual(counts['books'], Book.objects.count())
+        self.assertEqual(counts['books'], 60)
+        self.assertEqual(counts['copies'], BookInstance.objects.count())
+        self.assertEqual(set(statuses), {status for status, label in BookInstance.LOAN_STATUS})
+
+        chinese = Author.objects.filter(last_name__in=CJK_SURNAMES)
+        self.assertTrue(chinese.exists())
+        for author in chinese:
+            self.assertEqual(author.full_name, f'{author.last_name} {author.first_name}')
+            self.assertEqual(author.name, author.full_name)
+        for book in Book.objects.prefetch_related('authors', 'genre'):
+            displays = book.authors_display, book.genres_display
+            book.refresh_display_columns(commit=False)
+            self.assertEqual((book.authors_display, book.genres_display), displays)
+        harbours = Book.objects.filter(title__contains='Harbour').count()
+        self.assertGreater(harbours, 0)
+        self.assertEqual(BookSearchResults('Harbour').count(), harbours)
+
+        loans = BookInstance.objects.on_loan()
+        self.assertTrue(loans.exists())
+        self.assertEqual(loans.filter(borrower__username__startswith='reader', due_back__gt=F('loaned_on')).count(), loans.count())
+        self.assertFalse(BookInstance.objects.exclude(status=BookInstance.STATUS_LOANED).exclude(borrower=None).exists())
+        self.assertTrue(User.objects.get(username='librarian000001').has_perm('catalog.can_mark_returned'))
+        for question in Question.objects.all():
+            self.assertEqual(question.num_choices, question.choice_set.count())
+
+    def test_same_seed_gives_the_same_library(self):
+        with transaction.atomic():
+            self.generate()
+            library = self.snapshot()
+            transaction.set_rollback(True)
+        with transaction.atomic():
+            self.generate(workers=2, batch_size=7)
+            self.assertEqual(self.snapshot(), library)
+            transaction.set_rollback(True)
+        self.generate(seed=1)
+        self.assertNotEqual(self.snapshot(), library)
+
+    def test_command_needs_an_empty_database(self):
+        out = StringIO()
+        call_command('generate_library', '--books', '5', '--workers', '1', stdout=out)
+        self.assertIn('Generated 5 books', out.getvalue())
+        with self.assertRaises(CommandError):
+            call_command('generate_library', '--books', '5', stdout=StringIO())
@@ -16,6 +16,8 @@ Including another URLconf
 from django.contrib import admin
 from django.urls import include, path
 from django.views.generic import RedirectView
+
+from demosite.metrics import metrics
 # from django.conf import settings
 # from django.conf.urls.static import static
 
@@ -25,6 +27,7 @@ urlpatterns = [
     path('polls/', include('polls.urls')),
     path('accounts/', include('django.contrib.auth.urls')),
     path('admin/', admin.site.urls),
+    path('metrics', metrics, name='metrics'),
     path('', RedirectView.as_view(url='catalog/', permanent=True)),
 ]
 
@@ -11,6 +11,11 @@ import os
 
 from django.core.wsgi import get_wsgi_application
 
+from catalog.warmup import warm_up_on_startup
+
 os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'demosite.settings')
 
 application = get_wsgi_application()
+
+# Every app is ready, the admin's included, so the URLconf is complete.
+warm_up_on_startup()
@@ -0,0 +1,74 @@
+import threading
+import time
+
+from django.core.management.base import BaseCommand
+from django.db import connection
+from django.utils import timezone
+
+from polls.models import Question
+from polls.votes import VoteBuffer, record_vote
+
+
+class Command(BaseCommand):
+    help = (
+        'Cast votes from several threads at once against a scratch question and '
+        'report votes per second, with votes written directly and buffered.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--workers', type=int, nargs='+', default=[1, 2, 4, 8],
+            help='Worker thread counts to try (default: 1 2 4 8).',
+        )
+        parser.add_argument(
+            '--votes', type=int, default=500,
+            help='Votes cast by each worker (default: 500).',
+        )
+        parser.add_argument(
+            '--flush-interval', type=float, default=0.1,
+            help='Flush interval in seconds for the buffered run (default: 0.1).',
+        )
+
+    def handle(self, *args, **options):
+        question = Question.objects.create(question_text='Vote stress test', pub_date=timezone.now())
+        choice = question.choice_set.create(choice_text='Stress')
+        try:
+            for workers in options['workers']:
+                for mode in ('direct', 'buffered'):
+                    choice.votes = 0
+                    choice.save(update_fields=['votes'])
+                    elapsed = self.run(mode, question.id, choice.id, workers, options)
+                    choice.refresh_from_db()
+                    expected = workers * options['votes']
+                    lost = expected - choice.votes
+                    self.stdout.write(
+                        f'{mode:>8}  workers={workers:<3} votes={choice.votes:<7} '
+                        f'lost={lost:<4} {expected / elapsed:10.0f} votes/s'
+                    )
+        finally:
+            question.delete()
+
+    def run(self, mode, question_id, choice_id, workers, options):
+        buffer = VoteBuffer()
+        if mode == 'direct':
+            def vote():
+                record_vote(question_id, choice_id)
+        else:
+            def vote():
+                buffer.add(question_id, choice_id, options['flush_interval'])
+
+        def worker():
+            try:
+                for _ in range(options['votes']):
+                    vote()
+            finally:
+                connection.close()
+
+        threads = [threading.Thread(target=worker) for _ in range(workers)]
+        start = time.perf_counter()
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        buffer.flush()
+        return time.perf_counter() - start
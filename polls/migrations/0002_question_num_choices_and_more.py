@@ -0,0 +1,34 @@
+# Generated by Django 4.1.13 on 2026-10-18 12:18
+
+from django.db import migrations, models
+from django.db.models.functions import Coalesce
+
+
+def count_choices(apps, schema_editor):
+    Question = apps.get_model('polls', 'Question')
+    Choice = apps.get_model('polls', 'Choice')
+    choices = Choice.objects.filter(question=models.OuterRef('pk')).order_by().values('question')
+    Question.objects.update(num_choices=Coalesce(
+        models.Subquery(choices.annotate(count=models.Count('pk')).values('count')),
+        0,
+    ))
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('polls', '0001_initial'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='question',
+            name='num_choices',
+            field=models.PositiveIntegerField(default=0, editable=False),
+        ),
+        migrations.RunPython(count_choices, migrations.RunPython.noop),
+        migrations.AddIndex(
+            model_name='question',
+            index=models.Index(condition=models.Q(('num_choices__gt', 0)), fields=['pub_date'], name='question_with_choices_pub'),
+        ),
+    ]
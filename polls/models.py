@@ -1,13 +1,39 @@
 import datetime
 
 from django.db import models
+from django.db.models.functions import Coalesce
 from django.utils import timezone
 from django.contrib import admin
 
 # Create your models here.
+class QuestionQuerySet(models.QuerySet):
+
+    def refresh_choice_counts(self):
+        """Recount `num_choices` for every question in the queryset with one UPDATE."""
+        choices = Choice.objects.filter(question=models.OuterRef('pk')).order_by().values('question')
+        return self.update(num_choices=Coalesce(
+            models.Subquery(choices.annotate(count=models.Count('pk')).values('count')),
+            0,
+        ))
+
+
 class Question(models.Model):
     question_text = models.CharField(max_length=200)
     pub_date = models.DateTimeField('date published')
+    # Kept up to date by `polls.signals` so the index page needn't join Choice.
+    num_choices = models.PositiveIntegerField(default=0, editable=False)
+
+    objects = QuestionQuerySet.as_manager()
+
+    class Meta:
+        # The index page lists the latest published questions that have choices.
+        indexes = [
+            models.Index(
+                fields=['pub_date'],
+                condition=models.Q(num_choices__gt=0),
+                name='question_with_choices_pub',
+            ),
+        ]
 
     @admin.display(
         boolean = True,
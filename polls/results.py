@@ -0,0 +1,58 @@
+"""
+Cached poll results.
+
+The rendered results fragment of each question is stored in the cache
+framework under a per-question version. Recording votes and editing the
+question or its choices bump that version (see `polls.votes` and
+`polls.signals`), so a results page is served from the cache, without
+touching the database, until something it shows has changed.
+"""
+from django.core.cache import cache
+from django.db import DEFAULT_DB_ALIAS
+from django.template.loader import render_to_string
+
+RESULTS_TIMEOUT = 60 * 60
+FRAGMENT_TEMPLATE = 'polls/results_fragment.html'
+
+
+def _version_key(question_id):
+    return f'polls:results:{question_id}:version'
+
+
+def _results_key(question_id, version):
+    return f'polls:results:{question_id}:{version}'
+
+
+def results_version(question_id):
+    return cache.get(_version_key(question_id), 0)
+
+
+def get_cached_results(question_id, version):
+    """Return the cached results fragment for `question_id`, or None."""
+    return cache.get(_results_key(question_id, version))
+
+
+def render_results(question, version):
+    """
+    Render the results fragment for `question` and cache it under `version`,
+    which must have been read before the choices were. The choices are read
+    from the default database, and `question` must come from it too, as
+    the fragment is kept until the next change and a replica may not have
+    the last one yet.
+    """
+    fragment = render_to_string(FRAGMENT_TEMPLATE, {
+        'question': question,
+        'choices': question.choice_set.using(DEFAULT_DB_ALIAS),
+    })
+    cache.set(_results_key(question.pk, version), fragment, RESULTS_TIMEOUT)
+    return fragment
+
+
+def invalidate_results(*question_ids):
+    """Make the cached results of the given questions stale."""
+    for question_id in question_ids:
+        key = _version_key(question_id)
+        try:
+            cache.incr(key)
+        except ValueError:
+            cache.set(key, results_version(question_id) + 1, None)
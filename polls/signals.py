@@ -0,0 +1,66 @@
+"""
+Signal handlers that keep `Question.num_choices` up to date and invalidate
+the cached poll results when a question or its choices are edited.
+"""
+from functools import partial
+
+from django.db import transaction
+from django.db.models import F
+from django.db.models.signals import post_delete, post_save, pre_save
+from django.dispatch import receiver
+
+from .models import Choice, Question
+from .results import invalidate_results
+
+
+def invalidate_on_commit(*question_ids):
+    # Not before, or a request could cache the old results as the new ones.
+    transaction.on_commit(partial(invalidate_results, *question_ids))
+
+
+@receiver(post_save, sender=Question)
+@receiver(post_delete, sender=Question)
+def question_changed(sender, instance, **kwargs):
+    invalidate_on_commit(instance.pk)
+
+
+@receiver(post_save, sender=Choice)
+@receiver(post_delete, sender=Choice)
+def choice_changed(sender, instance, **kwargs):
+    invalidate_on_commit(instance.question_id)
+
+
+def _add_to_count(choice, delta):
+    Question.objects.filter(pk=choice.question_id).update(num_choices=F('num_choices') + delta)
+    # Keep a question already loaded alongside the choice in step, so that
+    # saving it later doesn't write back the old count.
+    if Choice.question.is_cached(choice):
+        choice.question.num_choices += delta
+
+
+@receiver(pre_save, sender=Choice)
+def choice_moving(sender, instance, raw, **kwargs):
+    """Remember the question a choice belonged to, in case it is moved."""
+    if raw or instance._state.adding:
+        return
+    instance._previous_question_id = (
+        Choice.objects.filter(pk=instance.pk).values_list('question_id', flat=True).first()
+    )
+
+
+@receiver(post_save, sender=Choice)
+def choice_saved(sender, instance, created, raw, **kwargs):
+    if raw:
+        return
+    if created:
+        _add_to_count(instance, 1)
+        return
+    previous = getattr(instance, '_previous_question_id', None)
+    if previous is not None and previous != instance.question_id:
+        Question.objects.filter(pk__in=[previous, instance.question_id]).refresh_choice_counts()
+        invalidate_on_commit(previous)
+
+
+@receiver(post_delete, sender=Choice)
+def choice_deleted(sender, instance, **kwargs):
+    _add_to_count(instance, -1)
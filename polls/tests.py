@@ -1,10 +1,16 @@
 import datetime
+import threading
+import time
 
-from django.test import TestCase
+from django.core.cache import cache
+from django.db import connection
+from django.test import TestCase, TransactionTestCase, override_settings
 from django.utils import timezone
 from django.urls import reverse
 
-from .models import Question
+from .models import Choice, Question
+from .views import IndexView
+from .votes import VoteBuffer, record_vote, vote_buffer
 
 
 # Create your tests here.
@@ -153,3 +159,254 @@ class QuestionsWithoutChoicesIndexViewTest(TestCase):
         question_without_choices = create_question("Question without choices", -30, without_choices=True)
         response = self.client.get(reverse('polls:index'))
         self.assertQuerysetEqual(response.context['latest_question_list'], [])
+
+
+class VoteViewTests(TestCase):
+
+    def setUp(self):
+        self.question = create_question("Question", -1)
+        self.choice = self.question.choice_set.get()
+
+    def test_vote_is_counted(self):
+        response = self.client.post(reverse('polls:vote', args=(self.question.id,)), {'choice': self.choice.id})
+        self.assertRedirects(response, reverse('polls:results', args=(self.question.id,)))
+        self.choice.refresh_from_db()
+        self.assertEqual(self.choice.votes, 1)
+
+    def test_vote_is_a_single_update(self):
+        with self.assertNumQueries(1):
+            self.client.post(reverse('polls:vote', args=(self.question.id,)), {'choice': self.choice.id})
+
+    def test_no_choice_selected(self):
+        for data in ({}, {'choice': 'abc'}, {'choice': self.choice.id + 1}):
+            response = self.client.post(reverse('polls:vote', args=(self.question.id,)), data)
+            self.assertContains(response, "You didn&#x27;t select a choice.")
+        self.choice.refresh_from_db()
+        self.assertEqual(self.choice.votes, 0)
+
+    def test_choice_of_another_question(self):
+        other = create_question("Other question", -1)
+        response = self.client.post(reverse('polls:vote', args=(other.id,)), {'choice': self.choice.id})
+        self.assertEqual(response.status_code, 200)
+        self.choice.refresh_from_db()
+        self.assertEqual(self.choice.votes, 0)
+
+    def test_unknown_question(self):
+        response = self.client.post(reverse('polls:vote', args=(self.question.id + 1,)), {'choice': self.choice.id})
+        self.assertEqual(response.status_code, 404)
+
+    @override_settings(POLLS_VOTE_FLUSH_INTERVAL=60)
+    def test_buffered_votes_are_flushed(self):
+        for _ in range(3):
+            self.client.post(reverse('polls:vote', args=(self.question.id,)), {'choice': self.choice.id})
+        self.choice.refresh_from_db()
+        self.assertEqual(self.choice.votes, 0)
+        self.assertEqual(vote_buffer.flush(), 3)
+        self.choice.refresh_from_db()
+        self.assertEqual(self.choice.votes, 3)
+
+
+class ResultsCacheTests(TestCase):
+
+    def setUp(self):
+        cache.clear()
+        self.question = create_question("Question", -1)
+        self.choice = self.question.choice_set.get()
+        self.url = reverse('polls:results', args=(self.question.id,))
+
+    def vote(self):
+        self.client.post(reverse('polls:vote', args=(self.question.id,)), {'choice': self.choice.id})
+
+    def test_results_served_from_cache(self):
+        with self.assertNumQueries(2):
+            self.client.get(self.url)
+        with self.assertNumQueries(0):
+            response = self.client.get(self.url)
+        self.assertContains(response, "<li>Choice 1 -- 0 votes</li>", html=True)
+
+    def test_vote_refreshes_results(self):
+        self.client.get(self.url)
+        self.vote()
+        self.vote()
+        response = self.client.get(self.url)
+        self.assertContains(response, "<li>Choice 1 -- 2 votes</li>", html=True)
+
+    @override_settings(POLLS_VOTE_FLUSH_INTERVAL=60)
+    def test_flush_refreshes_results(self):
+        self.client.get(self.url)
+        self.vote()
+        self.assertContains(self.client.get(self.url), "0 votes")
+        vote_buffer.flush()
+        self.assertContains(self.client.get(self.url), "1 vote<")
+
+    def test_editing_choices_refreshes_results(self):
+        self.client.get(self.url)
+        with self.captureOnCommitCallbacks(execute=True):
+            self.question.choice_set.create(choice_text="Choice 2")
+        self.assertContains(self.client.get(self.url), "Choice 2")
+        self.choice.choice_text = "Renamed"
+        with self.captureOnCommitCallbacks(execute=True):
+            self.choice.save()
+        self.assertContains(self.client.get(self.url), "Renamed")
+        with self.captureOnCommitCallbacks(execute=True):
+            self.choice.delete()
+        self.assertNotContains(self.client.get(self.url), "Renamed")
+
+    def test_results_are_invalidated_on_commit(self):
+        self.client.get(self.url)
+        with self.captureOnCommitCallbacks() as callbacks:
+            self.question.choice_set.create(choice_text="Choice 2")
+            # Other requests can't see the new choice before the commit.
+            self.assertNotContains(self.client.get(self.url), "Choice 2")
+        for callback in callbacks:
+            callback()
+        self.assertContains(self.client.get(self.url), "Choice 2")
+
+    def test_unpublishing_question_hides_results(self):
+        self.client.get(self.url)
+        self.question.pub_date = timezone.now() + datetime.timedelta(days=1)
+        with self.captureOnCommitCallbacks(execute=True):
+            self.question.save()
+        self.assertEqual(self.client.get(self.url).status_code, 404)
+
+
+class FakeClock:
+
+    def __init__(self):
+        self.now = 0.0
+
+    def __call__(self):
+        return self.now
+
+
+class VoteBufferTests(TestCase):
+
+    def setUp(self):
+        self.question = create_question("Question", -1)
+        self.question.choice_set.create(choice_text="Choice 2", votes=5)
+        self.question.choice_set.create(choice_text="Choice 3", votes=0)
+        self.choices = list(self.question.choice_set.order_by('id'))
+        self.clock = FakeClock()
+        self.buffer = VoteBuffer(clock=self.clock, background=False)
+
+    def votes(self):
+        return [choice.votes for choice in Choice.objects.order_by('id')]
+
+    def test_flushes_after_interval(self):
+        self.buffer.add(self.question.id, self.choices[0].id, 10)
+        self.buffer.add(self.question.id, self.choices[1].id, 10)
+        self.assertEqual(self.buffer.pending(), 2)
+        self.assertEqual(self.votes(), [0, 5, 0])
+        self.clock.now = 10
+        self.buffer.add(self.question.id, self.choices[0].id, 10)
+        self.assertEqual(self.buffer.pending(), 0)
+        self.assertEqual(self.votes(), [2, 6, 0])
+
+    def test_one_update_per_distinct_delta(self):
+        for choice, count in zip(self.choices, (2, 2, 1)):
+            for _ in range(count):
+                self.buffer.add(self.question.id, choice.id, 10)
+        # savepoint, two UPDATEs, release
+        with self.assertNumQueries(4):
+            self.assertEqual(self.buffer.flush(), 5)
+        self.assertEqual(self.votes(), [2, 7, 1])
+
+
+class VoteConcurrencyTests(TransactionTestCase):
+    """Votes cast from many threads at once must all be counted."""
+
+    workers = 8
+    votes_per_worker = 25
+
+    def setUp(self):
+        self.question = create_question("Question", -1)
+        self.choice = self.question.choice_set.get()
+
+    def cast_votes(self, vote):
+        errors = []
+
+        def worker():
+            try:
+                for _ in range(self.votes_per_worker):
+                    vote()
+            except Exception as error:
+                errors.append(error)
+            finally:
+                connection.close()
+
+        threads = [threading.Thread(target=worker) for _ in range(self.workers)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        self.assertEqual(errors, [])
+
+    def test_no_votes_lost(self):
+        self.cast_votes(lambda: record_vote(self.question.id, self.choice.id))
+        self.choice.refresh_from_db()
+        self.assertEqual(self.choice.votes, self.workers * self.votes_per_worker)
+
+    def test_no_buffered_votes_lost(self):
+        buffer = VoteBuffer()
+        self.cast_votes(lambda: buffer.add(self.question.id, self.choice.id, 0.01))
+        buffer.flush()
+        self.choice.refresh_from_db()
+        self.assertEqual(self.choice.votes, self.workers * self.votes_per_worker)
+
+    def test_buffered_votes_are_flushed_without_further_votes(self):
+        buffer = VoteBuffer()
+        buffer.add(self.question.id, self.choice.id, 0.05)
+        deadline = time.monotonic() + 5
+        while buffer.pending() and time.monotonic() < deadline:
+            time.sleep(0.01)
+        # Nothing is left to write, once the background flush has written it.
+        self.assertEqual(buffer.flush(), 0)
+        self.choice.refresh_from_db()
+        self.assertEqual(self.choice.votes, 1)
+
+
+class QuestionChoiceCountTests(TestCase):
+
+    def test_count_follows_choices(self):
+        question = create_question("Question", -1, without_choices=True)
+        self.assertEqual(question.num_choices, 0)
+        first = question.choice_set.create(choice_text="Choice 1")
+        Choice.objects.create(question=question, choice_text="Choice 2")
+        question.refresh_from_db()
+        self.assertEqual(question.num_choices, 2)
+        first.delete()
+        question.refresh_from_db()
+        self.assertEqual(question.num_choices, 1)
+
+    def test_loaded_question_is_kept_in_step(self):
+        question = create_question("Question", -1)
+        question.question_text = "Edited"
+        question.save()
+        question.refresh_from_db()
+        self.assertEqual(question.num_choices, 1)
+
+    def test_moving_a_choice(self):
+        source = create_question("Source", -1)
+        target = create_question("Target", -1, without_choices=True)
+        choice = source.choice_set.get()
+        choice.question = target
+        choice.save()
+        counts = dict(Question.objects.values_list('question_text', 'num_choices'))
+        self.assertEqual(counts, {"Source": 0, "Target": 1})
+
+    def test_refresh_choice_counts(self):
+        question = create_question("Question", -1)
+        Question.objects.update(num_choices=5)
+        Question.objects.refresh_choice_counts()
+        question.refresh_from_db()
+        self.assertEqual(question.num_choices, 1)
+
+    def test_index_query_uses_partial_index(self):
+        if connection.vendor != 'sqlite':
+            self.skipTest('EXPLAIN QUERY PLAN is SQLite specific.')
+        sql, params = IndexView().get_queryset().query.sql_with_params()
+        with connection.cursor() as cursor:
+            cursor.execute(f'EXPLAIN QUERY PLAN {sql}', params)
+            plan = ' '.join(row[-1] for row in cursor.fetchall())
+        self.assertIn('USING INDEX question_with_choices_pub', plan)
+        self.assertNotIn('TEMP B-TREE', plan)
@@ -1,14 +1,16 @@
 from django.utils import timezone
 from django.shortcuts import render, get_object_or_404
+from django.db import DEFAULT_DB_ALIAS
 from django.http import HttpResponse, HttpResponseRedirect # Http404
 from django.urls import reverse
-from django.db.models import Count
 
 # for Django "generic view" refactoring
 from django.views import generic
 # from django.template import loader
 
 from .models import Question, Choice
+from .results import get_cached_results, render_results, results_version
+from .votes import record_vote
 
 # Switched to Django "generic view" system
 #
@@ -47,11 +49,8 @@ class IndexView(generic.ListView):  # to show a list of items
     def get_queryset(self):
         """Return the last five published questions."""
         return Question.objects.filter(
-            pub_date__lte=timezone.now()
-        ).annotate(
-            num_choices=Count('choice')
-        ).filter(
-            num_choices__gt=0
+            pub_date__lte=timezone.now(),
+            num_choices__gt=0,
         ).order_by('-pub_date')[:5]
 
 
@@ -76,18 +75,27 @@ class ResultsView(generic.DetailView):
             pub_date__lte=timezone.now()
         )
 
+    def get(self, request, *args, **kwargs):
+        """Serve the results fragment from the cache, rendering it on a miss."""
+        question_id = self.kwargs['pk']
+        version = results_version(question_id)
+        fragment = get_cached_results(question_id, version)
+        if fragment is None:
+            question = self.get_object(self.get_queryset().using(DEFAULT_DB_ALIAS))
+            fragment = render_results(question, version)
+        return render(request, self.template_name, {'results_fragment': fragment})
+
 # Django "generic views" system END
 
 def vote(request, question_id):
-    question = get_object_or_404(Question, pk=question_id)
     try:
-        selected_choice = question.choice_set.get(pk=request.POST['choice'])
-    except (KeyError, Choice.DoesNotExist):
+        counted = record_vote(question_id, int(request.POST['choice']))
+    except (KeyError, ValueError):
+        counted = False
+    if not counted:
+        question = get_object_or_404(Question, pk=question_id)
         return render(request, 'polls/detail.html', {
             'question': question,
             'error_message': "You didn't select a choice.",
         })
-    else:
-        selected_choice.votes += 1
-        selected_choice.save()
-        return HttpResponseRedirect(reverse('polls:results', args=(question.id,)))
+    return HttpResponseRedirect(reverse('polls:results', args=(question_id,)))
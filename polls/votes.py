@@ -0,0 +1,136 @@
+"""
+Vote counting for the polls app.
+
+Every vote is an `UPDATE ... SET votes = votes + 1` run by the database, so
+votes cast at the same time are never lost and only the `votes` column is
+written.
+
+Busy polls can turn on write coalescing with the `POLLS_VOTE_FLUSH_INTERVAL`
+setting (in seconds). Each process then keeps the votes it receives in
+memory and adds them to the database once per interval, with one
+UPDATE per distinct increment rather than one per vote. A background
+thread writes them when no further vote comes along to do it. Results (see
+`polls.results`) lag behind by up to one interval, and votes still
+buffered when a process is killed are lost, so it is off by default.
+"""
+import atexit
+import logging
+import threading
+import time
+from collections import defaultdict
+
+from django.conf import settings
+from django.db import connections, transaction
+from django.db.models import F
+
+from .models import Choice
+from .results import invalidate_results
+
+logger = logging.getLogger(__name__)
+
+def flush_interval():
+    """Return the configured coalescing interval, or 0 when votes are written at once."""
+    return getattr(settings, 'POLLS_VOTE_FLUSH_INTERVAL', 0) or 0
+
+
+def add_votes(deltas):
+    """
+    Add `{(question_id, choice_id): votes}` to the database atomically.
+    Choices that get the same number of votes share one UPDATE.
+    """
+    by_delta = defaultdict(list)
+    for (question_id, choice_id), delta in deltas.items():
+        by_delta[delta].append(choice_id)
+    with transaction.atomic():
+        for delta, choice_ids in by_delta.items():
+            Choice.objects.filter(pk__in=choice_ids).update(votes=F('votes') + delta)
+    invalidate_results(*{question_id for question_id, choice_id in deltas})
+
+
+class VoteBuffer:
+
+    def __init__(self, clock=time.monotonic, background=True):
+        self.clock = clock
+        # Whether a thread of its own flushes the buffer once per interval
+        # while it holds votes.
+        self.background = background
+        self._pending = defaultdict(int)
+        self._lock = threading.Lock()
+        # Held for the whole of a flush, so that a flush returns only once
+        # the votes taken out by any other one are written too.
+        self._flush_lock = threading.Lock()
+        self._last_flush = clock()
+        self._flusher = None
+
+    def add(self, question_id, choice_id, interval):
+        """Buffer a vote for `choice_id` and flush if `interval` seconds have passed."""
+        with self._lock:
+            self._pending[question_id, choice_id] += 1
+            due = self.clock() - self._last_flush >= interval
+            if self.background and self._flusher is None:
+                self._flusher = threading.Thread(
+                    target=self._flush_periodically, args=(interval,), name='vote-buffer', daemon=True,
+                )
+                self._flusher.start()
+        if due:
+            self.flush()
+
+    def pending(self):
+        """Return the number of votes waiting to be written."""
+        return sum(self._pending.values())
+
+    def flush(self):
+        """Write out the buffered votes. Returns the number of votes written."""
+        with self._flush_lock:
+            with self._lock:
+                deltas, self._pending = self._pending, defaultdict(int)
+                self._last_flush = self.clock()
+            if not deltas:
+                return 0
+            try:
+                add_votes(deltas)
+            except Exception:
+                # Put the votes back so that the next flush retries them.
+                with self._lock:
+                    for key, delta in deltas.items():
+                        self._pending[key] += delta
+                raise
+            return sum(deltas.values())
+
+    def _flush_periodically(self, interval):
+        while True:
+            time.sleep(interval)
+            try:
+                self.flush()
+            except Exception:
+                logger.exception('Could not write the buffered votes; retrying in %s s.', interval)
+            finally:
+                # This thread's own connections; nothing closes them otherwise.
+                connections.close_all()
+            with self._lock:
+                if not self._pending:
+                    # The next buffered vote starts another.
+                    self._flusher = None
+                    return
+
+
+vote_buffer = VoteBuffer()
+atexit.register(vote_buffer.flush)
+
+
+def record_vote(question_id, choice_id):
+    """
+    Count a vote for `choice_id` if it is a choice of `question_id`.
+    Returns False if it is not.
+    """
+    choices = Choice.objects.filter(pk=choice_id, question_id=question_id)
+    interval = flush_interval()
+    if not interval:
+        if choices.update(votes=F('votes') + 1) != 1:
+            return False
+        invalidate_results(question_id)
+        return True
+    if not choices.exists():
+        return False
+    vote_buffer.add(question_id, choice_id, interval)
+    return True